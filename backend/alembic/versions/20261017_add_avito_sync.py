@@ -0,0 +1,40 @@
+"""add candidates.external_id and integration_cursors for Avito sync"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20261017_add_avito_sync"
+down_revision = "20261017_add_spec_candidate_statuses"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("candidates", sa.Column("external_id", sa.String(64), nullable=True))
+    op.create_index(
+        "ix_candidates_source_external_id",
+        "candidates",
+        ["source", "external_id"],
+        unique=True,
+    )
+    op.create_table(
+        "integration_cursors",
+        sa.Column("name", sa.Text(), primary_key=True),
+        sa.Column("cursor", sa.Text(), nullable=True),
+        sa.Column("etag", sa.Text(), nullable=True),
+        sa.Column(
+            "updated_at",
+            sa.TIMESTAMP(timezone=True),
+            nullable=False,
+            server_default=sa.text("now()"),
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("integration_cursors")
+    op.drop_index("ix_candidates_source_external_id", table_name="candidates")
+    op.drop_column("candidates", "external_id")
@@ -0,0 +1,40 @@
+"""add hashed phone/email keys and duplicate links to candidates"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20261017_add_candidate_dedupe"
+down_revision = "20261017_add_avito_sync"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("candidates", sa.Column("phone_hash", sa.String(64), nullable=True))
+    op.add_column("candidates", sa.Column("email_hash", sa.String(64), nullable=True))
+    op.add_column(
+        "candidates",
+        sa.Column(
+            "duplicate_of_id",
+            sa.Integer(),
+            sa.ForeignKey("candidates.id", ondelete="SET NULL"),
+            nullable=True,
+        ),
+    )
+    op.create_index("ix_candidates_phone_hash", "candidates", ["phone_hash"])
+    op.create_index("ix_candidates_email_hash", "candidates", ["email_hash"])
+    # Без индекса удаление кандидата сканирует таблицу ради ON DELETE SET NULL
+    op.create_index("ix_candidates_duplicate_of_id", "candidates", ["duplicate_of_id"])
+    # Хеши существующих кандидатов считает POST /jobs/dedupe (нужен ключ HMAC)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_candidates_duplicate_of_id", table_name="candidates")
+    op.drop_index("ix_candidates_email_hash", table_name="candidates")
+    op.drop_index("ix_candidates_phone_hash", table_name="candidates")
+    op.drop_column("candidates", "duplicate_of_id")
+    op.drop_column("candidates", "email_hash")
+    op.drop_column("candidates", "phone_hash")
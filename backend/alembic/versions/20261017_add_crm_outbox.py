@@ -0,0 +1,57 @@
+"""add crm_outbox for batched CRM sync"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "20261017_add_crm_outbox"
+down_revision = "20261017_index_followup_tasks_updated_at"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "crm_outbox",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("provider", sa.Text(), nullable=False),
+        sa.Column("operation", sa.Text(), nullable=False),
+        sa.Column("candidate_id", sa.BigInteger(), nullable=True),
+        sa.Column("idempotency_key", sa.Text(), nullable=False),
+        sa.Column("payload", postgresql.JSONB(), nullable=False),
+        sa.Column("status", sa.Text(), nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column(
+            "available_at",
+            sa.TIMESTAMP(timezone=True),
+            nullable=False,
+            server_default=sa.text("now()"),
+        ),
+        sa.Column("locked_at", sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column(
+            "created_at",
+            sa.TIMESTAMP(timezone=True),
+            nullable=False,
+            server_default=sa.text("now()"),
+        ),
+        sa.Column("sent_at", sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.UniqueConstraint("provider", "idempotency_key"),
+    )
+    op.create_index(
+        "ix_crm_outbox_ready",
+        "crm_outbox",
+        ["provider", "status", "available_at", "id"],
+    )
+    op.create_index(
+        "ix_crm_outbox_candidate", "crm_outbox", ["provider", "candidate_id", "id"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_crm_outbox_candidate", table_name="crm_outbox")
+    op.drop_index("ix_crm_outbox_ready", table_name="crm_outbox")
+    op.drop_table("crm_outbox")
@@ -0,0 +1,130 @@
+"""add follow-up plan columns and due index; create HR tables if missing"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20261017_add_followup_engine"
+down_revision = "20261017_add_telegram_outbox"
+branch_labels = None
+depends_on = None
+
+SOURCES = ("AVITO", "YANDEX", "TELEGRAM", "OTHER")
+STATUSES = (
+    "NEW",
+    "SCREENING",
+    "INTERVIEW_SCHEDULED",
+    "OFFER",
+    "HIRED",
+    "REJECTED",
+    "NO_RESPONSE",
+    "DOCS_PENDING",
+    "ESCALATED",
+)
+
+
+def _create_hr_tables(existing: set[str]) -> None:
+    # До этой ревизии HR-таблицы создавались вне миграций (create_all)
+    if "vacancies" not in existing:
+        op.create_table(
+            "vacancies",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("title", sa.String(255), nullable=False),
+            sa.Column("description", sa.Text(), nullable=True),
+            sa.Column("is_open", sa.Boolean(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=False),
+        )
+        op.create_index("ix_vacancies_id", "vacancies", ["id"])
+    if "candidates" not in existing:
+        op.create_table(
+            "candidates",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("full_name", sa.String(255), nullable=False),
+            sa.Column("email", sa.String(255), nullable=True),
+            sa.Column("phone", sa.String(50), nullable=True),
+            sa.Column("source", sa.Enum(*SOURCES, name="source"), nullable=False),
+            sa.Column(
+                "status", sa.Enum(*STATUSES, name="candidatestatus"), nullable=False
+            ),
+            sa.Column("notes", sa.Text(), nullable=True),
+            sa.Column(
+                "vacancy_id",
+                sa.Integer(),
+                sa.ForeignKey("vacancies.id", ondelete="SET NULL"),
+                nullable=True,
+            ),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=False),
+        )
+        op.create_index("ix_candidates_id", "candidates", ["id"])
+    if "interview_slots" not in existing:
+        op.create_table(
+            "interview_slots",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column(
+                "candidate_id",
+                sa.Integer(),
+                sa.ForeignKey("candidates.id", ondelete="CASCADE"),
+                nullable=False,
+            ),
+            sa.Column(
+                "vacancy_id",
+                sa.Integer(),
+                sa.ForeignKey("vacancies.id", ondelete="SET NULL"),
+                nullable=True,
+            ),
+            sa.Column("scheduled_at", sa.DateTime(), nullable=False),
+            sa.Column("duration_minutes", sa.Integer(), nullable=False),
+            sa.Column("location", sa.String(255), nullable=True),
+            sa.Column("notes", sa.Text(), nullable=True),
+        )
+        op.create_index("ix_interview_slots_id", "interview_slots", ["id"])
+    if "followup_tasks" not in existing:
+        op.create_table(
+            "followup_tasks",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column(
+                "candidate_id",
+                sa.Integer(),
+                sa.ForeignKey("candidates.id", ondelete="CASCADE"),
+                nullable=False,
+            ),
+            sa.Column("title", sa.String(255), nullable=False),
+            sa.Column("due_at", sa.DateTime(), nullable=True),
+            sa.Column("completed", sa.Boolean(), nullable=False),
+            sa.Column("notes", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=False),
+        )
+        op.create_index("ix_followup_tasks_id", "followup_tasks", ["id"])
+
+
+def upgrade() -> None:
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    if "candidates" in existing:
+        # Тип уже есть: добавляем статус, в который переводит on_exhausted
+        op.execute("ALTER TYPE candidatestatus ADD VALUE IF NOT EXISTS 'ESCALATED'")
+    _create_hr_tables(existing)
+
+    op.add_column("followup_tasks", sa.Column("plan_id", sa.String(64), nullable=True))
+    op.add_column(
+        "followup_tasks",
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "followup_tasks", sa.Column("chat_id", sa.BigInteger(), nullable=True)
+    )
+    op.create_index(
+        "ix_followup_tasks_due", "followup_tasks", ["completed", "due_at", "id"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_followup_tasks_due", table_name="followup_tasks")
+    op.drop_column("followup_tasks", "chat_id")
+    op.drop_column("followup_tasks", "attempts")
+    op.drop_column("followup_tasks", "plan_id")
+    # Значение ESCALATED из enum-типа Postgres удалить нельзя — остаётся
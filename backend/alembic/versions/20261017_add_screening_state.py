@@ -0,0 +1,31 @@
+"""add screening_state for local knockout screening"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20261017_add_screening_state"
+down_revision = "20261017_index_processed_updates_processed_at"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "screening_state",
+        sa.Column("chat_id", sa.BigInteger(), primary_key=True),
+        sa.Column("vacancy_key", sa.Text(), nullable=False),
+        sa.Column("answered", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("passed", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("synced", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("status", sa.Text(), nullable=False, server_default="active"),
+        sa.Column(
+            "updated_at", sa.TIMESTAMP(timezone=True), server_default=sa.text("now()")
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("screening_state")
@@ -0,0 +1,22 @@
+"""add needs_clarification and qualified to candidatestatus"""
+
+from __future__ import annotations
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20261017_add_spec_candidate_statuses"
+down_revision = "20261017_add_crm_outbox"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Статусы из global.status_flow спецификации, которых не было в enum
+    for value in ("NEEDS_CLARIFICATION", "QUALIFIED"):
+        op.execute(f"ALTER TYPE candidatestatus ADD VALUE IF NOT EXISTS '{value}'")
+
+
+def downgrade() -> None:
+    # Значения enum-типа Postgres удалить нельзя — остаются
+    pass
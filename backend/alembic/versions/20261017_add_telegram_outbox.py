@@ -0,0 +1,51 @@
+"""add telegram_outbox for durable outbound replies"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20261017_add_telegram_outbox"
+down_revision = "20261017_add_screening_state"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "telegram_outbox",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("chat_id", sa.BigInteger(), nullable=False),
+        sa.Column("text", sa.Text(), nullable=False),
+        sa.Column("status", sa.Text(), nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column(
+            "available_at",
+            sa.TIMESTAMP(timezone=True),
+            nullable=False,
+            server_default=sa.text("now()"),
+        ),
+        sa.Column("locked_at", sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("message_id", sa.BigInteger(), nullable=True),
+        sa.Column(
+            "created_at",
+            sa.TIMESTAMP(timezone=True),
+            nullable=False,
+            server_default=sa.text("now()"),
+        ),
+        sa.Column("sent_at", sa.TIMESTAMP(timezone=True), nullable=True),
+    )
+    op.create_index(
+        "ix_telegram_outbox_ready",
+        "telegram_outbox",
+        ["status", "available_at", "id"],
+    )
+    op.create_index("ix_telegram_outbox_chat", "telegram_outbox", ["chat_id", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_telegram_outbox_chat", table_name="telegram_outbox")
+    op.drop_index("ix_telegram_outbox_ready", table_name="telegram_outbox")
+    op.drop_table("telegram_outbox")
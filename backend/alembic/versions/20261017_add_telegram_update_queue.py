@@ -0,0 +1,46 @@
+"""add telegram_update_queue"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "20261017_add_telegram_update_queue"
+down_revision = "20251218_add_telegram_tables"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "telegram_update_queue",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("update_id", sa.BigInteger(), nullable=False, unique=True),
+        sa.Column("chat_id", sa.BigInteger(), nullable=True),
+        sa.Column("payload", postgresql.JSONB(), nullable=False),
+        sa.Column("status", sa.Text(), nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column(
+            "available_at",
+            sa.TIMESTAMP(timezone=True),
+            nullable=False,
+            server_default=sa.text("now()"),
+        ),
+        sa.Column("locked_at", sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column(
+            "created_at", sa.TIMESTAMP(timezone=True), server_default=sa.text("now()")
+        ),
+    )
+    op.create_index(
+        "ix_telegram_update_queue_ready",
+        "telegram_update_queue",
+        ["status", "available_at", "id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_telegram_update_queue_ready", table_name="telegram_update_queue")
+    op.drop_table("telegram_update_queue")
@@ -0,0 +1,23 @@
+"""index telegram_update_queue by chat for ordered claiming"""
+
+from __future__ import annotations
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20261017_add_update_queue_chat_index"
+down_revision = "20261017_add_telegram_update_queue"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_telegram_update_queue_chat",
+        "telegram_update_queue",
+        ["chat_id", "id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_telegram_update_queue_chat", table_name="telegram_update_queue")
@@ -0,0 +1,21 @@
+"""index followup_tasks by candidate for duplicate hand-over"""
+
+from __future__ import annotations
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20261017_index_followup_tasks_candidate"
+down_revision = "20261017_add_candidate_dedupe"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_followup_tasks_candidate", "followup_tasks", ["candidate_id", "plan_id"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_followup_tasks_candidate", table_name="followup_tasks")
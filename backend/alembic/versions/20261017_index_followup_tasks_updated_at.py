@@ -0,0 +1,21 @@
+"""index followup_tasks by updated_at for scheduler resync"""
+
+from __future__ import annotations
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20261017_index_followup_tasks_updated_at"
+down_revision = "20261017_add_followup_engine"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_followup_tasks_updated_at", "followup_tasks", ["updated_at", "id"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_followup_tasks_updated_at", table_name="followup_tasks")
@@ -0,0 +1,23 @@
+"""index processed_updates by processed_at for the retention sweeper"""
+
+from __future__ import annotations
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20261017_index_processed_updates_processed_at"
+down_revision = "20261017_index_telegram_users_updated_at"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_processed_updates_processed_at",
+        "processed_updates",
+        ["processed_at"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_processed_updates_processed_at", table_name="processed_updates")
@@ -0,0 +1,24 @@
+"""index telegram_users by activity for thread cache warmup"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "20261017_index_telegram_users_updated_at"
+down_revision = "20261017_add_update_queue_chat_index"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_telegram_users_updated_at",
+        "telegram_users",
+        [sa.text("updated_at DESC")],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_telegram_users_updated_at", table_name="telegram_users")
@@ -0,0 +1,90 @@
+import time
+
+from app.core.config import settings
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with half-open probing.
+
+    After ``failure_threshold`` failures in a row calls are rejected for
+    ``recovery_time`` seconds; then up to ``half_open_probes`` calls go
+    through, and the first result closes the circuit or opens it again. A
+    probe that never reports back frees its slot after ``recovery_time``.
+    ``failure_threshold <= 0`` disables the breaker.
+    """
+
+    def __init__(
+        self, failure_threshold: int, recovery_time: float, half_open_probes: int = 1
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.half_open_probes = max(1, half_open_probes)
+        self.failures = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._state = CLOSED
+        self._probes = 0
+        self._probe_at = 0.0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self.retry_after() == 0:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def retry_after(self) -> float:
+        """Seconds until the next probe is allowed (0 if not open)."""
+        if self._state != OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.recovery_time - time.monotonic())
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; in half-open this takes a probe slot."""
+        if self.failure_threshold <= 0:
+            return True
+        state = self.state
+        now = time.monotonic()
+        if state == HALF_OPEN and now - self._probe_at >= self.recovery_time:
+            self._probes = 0  # пробы потерялись (отмена до результата)
+        if state == HALF_OPEN and self._probes < self.half_open_probes:
+            self._probes += 1
+            self._probe_at = now
+            return True
+        if state == CLOSED:
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._state = CLOSED
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failure_threshold <= 0:
+            return
+        if self._state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> dict[str, object]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "retry_after": round(self.retry_after(), 1),
+        }
+
+
+# Вызовы ассистента: при серии таймаутов/5xx отвечаем шаблоном, не дожидаясь OpenAI
+openai_breaker = CircuitBreaker(
+    failure_threshold=settings.openai_breaker_failures,
+    recovery_time=settings.openai_breaker_recovery,
+)
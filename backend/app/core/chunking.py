@@ -0,0 +1,38 @@
+import re
+
+# Границы в порядке предпочтения: абзац, строка, предложение, слово
+_SENTENCE_END = re.compile(r"[.!?…](?:[\"»)\]]*)\s")
+
+
+def _cut_position(window: str) -> int:
+    floor = len(window) // 4  # не режем на совсем короткие куски
+    for separator in ("\n\n", "\n"):
+        pos = window.rfind(separator)
+        if pos > floor:
+            return pos + len(separator)
+    ends = [m.end() for m in _SENTENCE_END.finditer(window) if m.end() > floor]
+    if ends:
+        return ends[-1]
+    pos = window.rfind(" ")
+    if pos > floor:
+        return pos + 1
+    return len(window)
+
+
+def split_text(text: str, limit: int) -> list[str]:
+    """Split text into ordered parts of at most ``limit`` characters.
+
+    Prefers paragraph, then line, then sentence, then word boundaries and
+    only cuts inside a word when nothing else fits.
+    """
+    parts: list[str] = []
+    remaining = text
+    while len(remaining) > limit:
+        cut = _cut_position(remaining[:limit])
+        part = remaining[:cut].rstrip()
+        if part:
+            parts.append(part)
+        remaining = remaining[cut:].lstrip()
+    if remaining or not parts:
+        parts.append(remaining)
+    return parts
@@ -0,0 +1,81 @@
+import asyncio
+from typing import Optional
+
+
+class Burst:
+    """Texts of one chat that will be answered in a single agent turn."""
+
+    def __init__(self, text: str, now: float) -> None:
+        self.texts = [text]
+        self.size = len(text)
+        self.opened_at = now
+        self.last_at = now
+        self.closed = False
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.texts)
+
+
+class BurstCoalescer:
+    """Merges rapid-fire messages of a chat into one agent turn.
+
+    The first message opens a burst and its caller becomes the leader; later
+    messages join the open burst and need no reply of their own. The burst
+    stays open while the leader waits for the chat's previous run and until
+    the chat has been quiet for ``window`` seconds (at most ``max_wait`` after
+    it opened), so messages sent during a run extend the next turn instead
+    of starting one each.
+    """
+
+    def __init__(self, window: float, max_wait: float, max_chars: int) -> None:
+        self.window = window
+        self.max_wait = max_wait
+        self.max_chars = max_chars
+        self._open: dict[int, Burst] = {}
+        self.merged = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def join(self, chat_id: int, text: str) -> Optional[Burst]:
+        """Add a message; return the new burst if the caller leads it."""
+        now = asyncio.get_running_loop().time()
+        burst = self._open.get(chat_id)
+        if (
+            burst is not None
+            and not burst.closed
+            and burst.size + len(text) + 1 <= self.max_chars
+        ):
+            burst.texts.append(text)
+            burst.size += len(text) + 1
+            burst.last_at = now
+            self.merged += 1
+            return None
+        burst = self._open[chat_id] = Burst(text, now)
+        return burst
+
+    async def settle(self, chat_id: int, burst: Burst) -> str:
+        """Wait until the chat goes quiet, close the burst and return its text."""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                quiet_at = min(
+                    burst.last_at + self.window, burst.opened_at + self.max_wait
+                )
+                delay = quiet_at - loop.time()
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+        finally:
+            self.close(chat_id, burst)
+        return burst.text
+
+    def close(self, chat_id: int, burst: Burst) -> None:
+        burst.closed = True
+        if self._open.get(chat_id) is burst:
+            del self._open[chat_id]
+
+    def stats(self) -> dict[str, int]:
+        return {"open": len(self._open), "merged": self.merged}
@@ -32,6 +32,132 @@ class Settings(BaseSettings):
     openai_api_key: str | None = Field(default=None, alias="OPENAI_API_KEY")
     hr_agent_id: str | None = Field(default=None, alias="HR_AGENT_ID")
     internal_api_token: str | None = Field(default=None, alias="INTERNAL_API_TOKEN")
+    # "inline" — отвечаем в рамках HTTP-запроса; "queue" — быстрый ack + воркеры
+    telegram_update_mode: str = Field(default="inline", alias="TELEGRAM_UPDATE_MODE")
+    telegram_workers: int = Field(default=4, alias="TELEGRAM_WORKERS")
+    telegram_queue_poll_interval: float = Field(
+        default=1.0, alias="TELEGRAM_QUEUE_POLL_INTERVAL"
+    )
+    telegram_queue_lock_timeout: int = Field(
+        default=300, alias="TELEGRAM_QUEUE_LOCK_TIMEOUT"
+    )
+    telegram_queue_max_attempts: int = Field(
+        default=5, alias="TELEGRAM_QUEUE_MAX_ATTEMPTS"
+    )
+    openai_max_connections: int = Field(default=50, alias="OPENAI_MAX_CONNECTIONS")
+    openai_max_keepalive: int = Field(default=20, alias="OPENAI_MAX_KEEPALIVE")
+    openai_keepalive_expiry: float = Field(
+        default=30.0, alias="OPENAI_KEEPALIVE_EXPIRY"
+    )
+    openai_timeout: float = Field(default=20.0, alias="OPENAI_TIMEOUT")
+    openai_connect_timeout: float = Field(default=5.0, alias="OPENAI_CONNECT_TIMEOUT")
+    openai_max_retries: int = Field(default=2, alias="OPENAI_MAX_RETRIES")
+    assistant_streaming: bool = Field(default=True, alias="ASSISTANT_STREAMING")
+    assistant_run_timeout: float = Field(default=20.0, alias="ASSISTANT_RUN_TIMEOUT")
+    # Bot API: ~30 сообщений/с глобально и ~1 сообщение/с в один чат
+    telegram_global_rate: float = Field(default=30.0, alias="TELEGRAM_GLOBAL_RATE")
+    telegram_per_chat_interval: float = Field(
+        default=1.0, alias="TELEGRAM_PER_CHAT_INTERVAL"
+    )
+    telegram_max_connections: int = Field(default=20, alias="TELEGRAM_MAX_CONNECTIONS")
+    telegram_http2: bool = Field(default=False, alias="TELEGRAM_HTTP2")
+    telegram_progressive_replies: bool = Field(
+        default=True, alias="TELEGRAM_PROGRESSIVE_REPLIES"
+    )
+    # Telegram режет частые editMessageText, не чаще раза в секунду на чат
+    telegram_edit_interval: float = Field(default=1.0, alias="TELEGRAM_EDIT_INTERVAL")
+    thread_cache_size: int = Field(default=50_000, alias="THREAD_CACHE_SIZE")
+    thread_cache_ttl: float = Field(default=86_400.0, alias="THREAD_CACHE_TTL")
+    thread_cache_warmup: int = Field(default=5_000, alias="THREAD_CACHE_WARMUP")
+    # Telegram передоставляет апдейты не дольше суток, дальше дедупликация не нужна
+    processed_updates_retention_hours: int = Field(
+        default=72, alias="PROCESSED_UPDATES_RETENTION_HOURS"
+    )
+    processed_updates_sweep_interval: float = Field(
+        default=600.0, alias="PROCESSED_UPDATES_SWEEP_INTERVAL"
+    )
+    recent_updates_size: int = Field(default=10_000, alias="RECENT_UPDATES_SIZE")
+    # 0 — без склейки; иначе ждём паузу в переписке перед ходом агента
+    telegram_debounce_ms: int = Field(default=0, alias="TELEGRAM_DEBOUNCE_MS")
+    telegram_debounce_max_ms: int = Field(
+        default=5_000, alias="TELEGRAM_DEBOUNCE_MAX_MS"
+    )
+    # По умолчанию docs/hr_policy_spec.json репозитория (или образа)
+    policy_spec_path: str | None = Field(default=None, alias="POLICY_SPEC_PATH")
+    # Эскалация по routing.rules спецификации без запуска ассистента
+    policy_routing_enabled: bool = Field(default=True, alias="POLICY_ROUTING_ENABLED")
+    # Knockout-скрининг по вакансиям спецификации без запуска ассистента
+    screening_enabled: bool = Field(default=False, alias="SCREENING_ENABLED")
+    # 0 — кэш ответов на типовые вопросы по вакансии выключен
+    faq_cache_size: int = Field(default=0, alias="FAQ_CACHE_SIZE")
+    faq_cache_ttl: float = Field(default=3_600.0, alias="FAQ_CACHE_TTL")
+    # Ответы кандидатам через telegram_outbox: неотправленное повторяется в фоне
+    outbox_enabled: bool = Field(default=True, alias="OUTBOX_ENABLED")
+    outbox_batch_size: int = Field(default=100, alias="OUTBOX_BATCH_SIZE")
+    outbox_max_attempts: int = Field(default=8, alias="OUTBOX_MAX_ATTEMPTS")
+    outbox_poll_interval: float = Field(default=2.0, alias="OUTBOX_POLL_INTERVAL")
+    outbox_lock_timeout: float = Field(default=60.0, alias="OUTBOX_LOCK_TIMEOUT")
+    # /jobs/followup: задачи берутся keyset-пачками, прогон ограничен по времени
+    followup_batch_size: int = Field(default=500, alias="FOLLOWUP_BATCH_SIZE")
+    followup_run_seconds: float = Field(default=120.0, alias="FOLLOWUP_RUN_SECONDS")
+    # Планировщик в процессе: задачи в пределах горизонта (сек) ждут на таймерах
+    followup_scheduler_enabled: bool = Field(
+        default=True, alias="FOLLOWUP_SCHEDULER_ENABLED"
+    )
+    followup_horizon: float = Field(default=3_600.0, alias="FOLLOWUP_HORIZON")
+    followup_resync_interval: float = Field(
+        default=30.0, alias="FOLLOWUP_RESYNC_INTERVAL"
+    )
+    # CRM-провайдеры: без URL отвечают локальной заглушкой; таймаут — на вызов
+    seller_gpt_url: str = Field(default="", alias="SELLER_GPT_URL")
+    seller_gpt_token: str = Field(default="", alias="SELLER_GPT_TOKEN")
+    seller_gpt_timeout: float = Field(default=3.0, alias="SELLER_GPT_TIMEOUT")
+    amocrm_url: str = Field(default="", alias="AMOCRM_URL")
+    amocrm_token: str = Field(default="", alias="AMOCRM_TOKEN")
+    amocrm_timeout: float = Field(default=3.0, alias="AMOCRM_TIMEOUT")
+    avito_url: str = Field(default="", alias="AVITO_URL")
+    avito_token: str = Field(default="", alias="AVITO_TOKEN")
+    avito_timeout: float = Field(default=3.0, alias="AVITO_TIMEOUT")
+    integrations_max_connections: int = Field(
+        default=20, alias="INTEGRATIONS_MAX_CONNECTIONS"
+    )
+    # Записи в CRM через crm_outbox: пишутся в транзакции, уходят пачками в фоне
+    crm_outbox_enabled: bool = Field(default=True, alias="CRM_OUTBOX_ENABLED")
+    crm_outbox_max_attempts: int = Field(default=10, alias="CRM_OUTBOX_MAX_ATTEMPTS")
+    crm_outbox_poll_interval: float = Field(
+        default=2.0, alias="CRM_OUTBOX_POLL_INTERVAL"
+    )
+    crm_outbox_lock_timeout: float = Field(
+        default=60.0, alias="CRM_OUTBOX_LOCK_TIMEOUT"
+    )
+    crm_status_coalesce_seconds: float = Field(
+        default=5.0, alias="CRM_STATUS_COALESCE_SECONDS"
+    )
+    # Забор откликов Avito по курсору; работает, только если задан AVITO_URL
+    avito_sync_enabled: bool = Field(default=True, alias="AVITO_SYNC_ENABLED")
+    avito_sync_interval: float = Field(default=60.0, alias="AVITO_SYNC_INTERVAL")
+    avito_sync_page_size: int = Field(default=100, alias="AVITO_SYNC_PAGE_SIZE")
+    avito_sync_concurrency: int = Field(default=4, alias="AVITO_SYNC_CONCURRENCY")
+    avito_sync_max_retries: int = Field(default=5, alias="AVITO_SYNC_MAX_RETRIES")
+    # Ключ HMAC для хешей телефона/email кандидатов; без него дубли не ищутся.
+    # После смены — /jobs/dedupe
+    dedupe_hash_key: str = Field(default="", alias="DEDUPE_HASH_KEY")
+    agent_max_concurrency: int = Field(default=32, alias="AGENT_MAX_CONCURRENCY")
+    # Потолок одновременных запусков ассистента; на 429 от OpenAI он снижается
+    openai_max_in_flight: int = Field(default=32, alias="OPENAI_MAX_IN_FLIGHT")
+    openai_min_in_flight: int = Field(default=2, alias="OPENAI_MIN_IN_FLIGHT")
+    # Сколько ходов может ждать своей очереди; дальше — короткий ответ (0 — без сброса)
+    agent_queue_max: int = Field(default=200, alias="AGENT_QUEUE_MAX")
+    # Сколько сбоев OpenAI подряд размыкают цепь (0 — без размыкания)
+    openai_breaker_failures: int = Field(default=5, alias="OPENAI_BREAKER_FAILURES")
+    openai_breaker_recovery: float = Field(
+        default=30.0, alias="OPENAI_BREAKER_RECOVERY"
+    )
+    # Отложенный при разомкнутой цепи ход: не больше N повторов и не дольше N секунд
+    openai_replay_max_attempts: int = Field(
+        default=20, alias="OPENAI_REPLAY_MAX_ATTEMPTS"
+    )
+    openai_replay_max_age: float = Field(default=1_800.0, alias="OPENAI_REPLAY_MAX_AGE")
     commit_sha: str | None = Field(
         default=None,
         validation_alias=AliasChoices(
@@ -29,7 +29,7 @@ async def check_database() -> None:
 
 
 async def ensure_telegram_tables() -> None:
-    """Create helper tables for Telegram idempotency and thread storage."""
+    """Create helper tables for Telegram idempotency, threads, screening and queues."""
     ddl_updates = text(
         """
         CREATE TABLE IF NOT EXISTS processed_updates (
@@ -38,6 +38,12 @@ async def ensure_telegram_tables() -> None:
         );
         """
     )
+    ddl_updates_index = text(
+        """
+        CREATE INDEX IF NOT EXISTS ix_processed_updates_processed_at
+        ON processed_updates (processed_at);
+        """
+    )
     ddl_users = text(
         """
         CREATE TABLE IF NOT EXISTS telegram_users (
@@ -47,7 +53,147 @@ async def ensure_telegram_tables() -> None:
         );
         """
     )
+    ddl_users_index = text(
+        """
+        CREATE INDEX IF NOT EXISTS ix_telegram_users_updated_at
+        ON telegram_users (updated_at DESC);
+        """
+    )
+    ddl_screening = text(
+        """
+        CREATE TABLE IF NOT EXISTS screening_state (
+            chat_id BIGINT PRIMARY KEY,
+            vacancy_key TEXT NOT NULL,
+            answered INTEGER NOT NULL DEFAULT 0,
+            passed INTEGER NOT NULL DEFAULT 0,
+            synced INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'active',
+            updated_at TIMESTAMPTZ DEFAULT NOW()
+        );
+        """
+    )
+    ddl_queue = text(
+        """
+        CREATE TABLE IF NOT EXISTS telegram_update_queue (
+            id BIGSERIAL PRIMARY KEY,
+            update_id BIGINT NOT NULL UNIQUE,
+            chat_id BIGINT,
+            payload JSONB NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            available_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            locked_at TIMESTAMPTZ,
+            last_error TEXT,
+            created_at TIMESTAMPTZ DEFAULT NOW()
+        );
+        """
+    )
+    ddl_queue_indexes = [
+        text(
+            """
+            CREATE INDEX IF NOT EXISTS ix_telegram_update_queue_ready
+            ON telegram_update_queue (status, available_at, id);
+            """
+        ),
+        text(
+            """
+            CREATE INDEX IF NOT EXISTS ix_telegram_update_queue_chat
+            ON telegram_update_queue (chat_id, id);
+            """
+        ),
+    ]
+
+    ddl_outbox = text(
+        """
+        CREATE TABLE IF NOT EXISTS telegram_outbox (
+            id BIGSERIAL PRIMARY KEY,
+            chat_id BIGINT NOT NULL,
+            text TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            available_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            locked_at TIMESTAMPTZ,
+            last_error TEXT,
+            message_id BIGINT,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            sent_at TIMESTAMPTZ
+        );
+        """
+    )
+    ddl_outbox_indexes = [
+        text(
+            """
+            CREATE INDEX IF NOT EXISTS ix_telegram_outbox_ready
+            ON telegram_outbox (status, available_at, id);
+            """
+        ),
+        text(
+            """
+            CREATE INDEX IF NOT EXISTS ix_telegram_outbox_chat
+            ON telegram_outbox (chat_id, id);
+            """
+        ),
+    ]
+
+    ddl_crm_outbox = text(
+        """
+        CREATE TABLE IF NOT EXISTS crm_outbox (
+            id BIGSERIAL PRIMARY KEY,
+            provider TEXT NOT NULL,
+            operation TEXT NOT NULL,
+            candidate_id BIGINT,
+            idempotency_key TEXT NOT NULL,
+            payload JSONB NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            available_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            locked_at TIMESTAMPTZ,
+            last_error TEXT,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            sent_at TIMESTAMPTZ,
+            UNIQUE (provider, idempotency_key)
+        );
+        """
+    )
+    ddl_crm_outbox_indexes = [
+        text(
+            """
+            CREATE INDEX IF NOT EXISTS ix_crm_outbox_ready
+            ON crm_outbox (provider, status, available_at, id);
+            """
+        ),
+        text(
+            """
+            CREATE INDEX IF NOT EXISTS ix_crm_outbox_candidate
+            ON crm_outbox (provider, candidate_id, id);
+            """
+        ),
+    ]
+
+    ddl_cursors = text(
+        """
+        CREATE TABLE IF NOT EXISTS integration_cursors (
+            name TEXT PRIMARY KEY,
+            cursor TEXT,
+            etag TEXT,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+        """
+    )
 
     async with engine.begin() as conn:
         await conn.execute(ddl_updates)
+        await conn.execute(ddl_updates_index)
         await conn.execute(ddl_users)
+        await conn.execute(ddl_users_index)
+        await conn.execute(ddl_screening)
+        await conn.execute(ddl_queue)
+        for ddl in ddl_queue_indexes:
+            await conn.execute(ddl)
+        await conn.execute(ddl_outbox)
+        for ddl in ddl_outbox_indexes:
+            await conn.execute(ddl)
+        await conn.execute(ddl_crm_outbox)
+        for ddl in ddl_crm_outbox_indexes:
+            await conn.execute(ddl)
+        await conn.execute(ddl_cursors)
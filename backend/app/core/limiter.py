@@ -0,0 +1,102 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from app.core.config import settings
+
+
+class AimdLimiter:
+    """Concurrency limit for assistant runs that adapts to OpenAI 429s.
+
+    Each run reported as completed (``on_success``) raises the limit by
+    ``1/limit`` (about +1 per full window); leaving a slot alone does not,
+    so timeouts and failed runs never grow it. Each 429 halves the limit,
+    at most once per ``cooldown`` seconds so one burst of 429s counts as
+    one signal. Waiters are served in FIFO order.
+    """
+
+    def __init__(
+        self,
+        min_limit: int,
+        max_limit: int,
+        decrease: float = 0.5,
+        cooldown: float = 2.0,
+    ) -> None:
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(self.max_limit)
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.rate_limited = 0
+        self._decreased_at = float("-inf")
+        self._waiters: deque[asyncio.Future[None]] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот уже выдан, но ждущего отменили — возвращаем слот
+                self.release()
+            elif future in self._waiters:
+                self._waiters.remove(future)
+            raise
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def on_success(self) -> None:
+        self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+        self._wake()
+
+    def on_rate_limited(self) -> None:
+        self.rate_limited += 1
+        now = time.monotonic()
+        if now - self._decreased_at < self.cooldown:
+            return
+        self._decreased_at = now
+        self.limit = max(float(self.min_limit), self.limit * self.decrease)
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            future = self._waiters.popleft()
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+
+    def stats(self) -> dict[str, object]:
+        return {
+            "limit": int(self.limit),
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rate_limited": self.rate_limited,
+        }
+
+
+# Общий для процесса лимит запусков ассистента; 429 сообщает клиент OpenAI
+openai_limiter = AimdLimiter(
+    min_limit=settings.openai_min_in_flight,
+    max_limit=settings.openai_max_in_flight,
+)
@@ -0,0 +1,87 @@
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+_Job = tuple[Callable[[], Awaitable[Any]], "asyncio.Future[Any]"]
+
+
+class ChatDispatcher:
+    """Per-chat FIFO mailboxes processed concurrently under one global limit.
+
+    Jobs of the same chat run strictly one after another in submit order,
+    different chats run in parallel. A mailbox lives only while it has work,
+    so idle chats cost nothing.
+    """
+
+    def __init__(self, max_concurrency: int) -> None:
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._mailboxes: dict[int, deque[_Job]] = {}
+        self._drainers: set[asyncio.Task] = set()
+        self._queued = 0
+        self._in_flight = 0
+
+    async def submit(self, chat_id: int, func: Callable[[], Awaitable[T]]) -> T:
+        """Run ``func`` in the chat's mailbox and return its result.
+
+        Cancelling the caller cancels the job (or drops it if not started yet).
+        """
+        future: asyncio.Future[T] = asyncio.get_running_loop().create_future()
+        mailbox = self._mailboxes.get(chat_id)
+        if mailbox is None:
+            mailbox = self._mailboxes[chat_id] = deque()
+            drainer = asyncio.create_task(self._drain(chat_id, mailbox))
+            self._drainers.add(drainer)
+            drainer.add_done_callback(self._drainers.discard)
+        mailbox.append((func, future))
+        self._queued += 1
+        return await future
+
+    def busy(self, chat_id: int) -> bool:
+        return chat_id in self._mailboxes
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "mailboxes": len(self._mailboxes),
+            "queued": self._queued,
+            "in_flight": self._in_flight,
+        }
+
+    async def _drain(self, chat_id: int, mailbox: deque[_Job]) -> None:
+        try:
+            while mailbox:
+                func, future = mailbox[0]
+                if not future.done():
+                    async with self._semaphore:
+                        await self._run(func, future)
+                mailbox.popleft()
+                self._queued -= 1
+        finally:
+            # Пустой ящик удаляем сразу — между проверкой и удалением нет await
+            if self._mailboxes.get(chat_id) is mailbox:
+                del self._mailboxes[chat_id]
+            for _, future in mailbox:
+                future.cancel()
+            self._queued -= len(mailbox)
+
+    async def _run(
+        self, func: Callable[[], Awaitable[Any]], future: "asyncio.Future[Any]"
+    ) -> None:
+        if future.done():
+            return
+        task = asyncio.ensure_future(func())
+        future.add_done_callback(lambda f: task.cancel() if f.cancelled() else None)
+        self._in_flight += 1
+        try:
+            await asyncio.wait({task})
+        finally:
+            self._in_flight -= 1
+        if future.done():
+            return
+        if task.cancelled():
+            future.cancel()
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
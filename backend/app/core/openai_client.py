@@ -0,0 +1,73 @@
+import logging
+from typing import Optional
+
+import httpx
+from app.core.config import settings
+from app.core.limiter import openai_limiter
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+logger = logging.getLogger(__name__)
+
+# Один клиент на процесс: общий пул соединений к api.openai.com
+_client: Optional[AsyncOpenAI] = None
+_http: Optional[httpx.AsyncClient] = None
+
+
+async def _watch_rate_limits(response: httpx.Response) -> None:
+    # SDK сам повторяет 429, поэтому считаем их на уровне HTTP, а не по исключениям
+    if response.status_code == 429:
+        openai_limiter.on_rate_limited()
+
+
+def get_openai_client() -> AsyncOpenAI:
+    """Return the process-wide AsyncOpenAI client, creating it on first use."""
+    global _client, _http
+    if _client is None:
+        _http = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=settings.openai_max_connections,
+                max_keepalive_connections=settings.openai_max_keepalive,
+                keepalive_expiry=settings.openai_keepalive_expiry,
+            ),
+            event_hooks={"response": [_watch_rate_limits]},
+        )
+        _client = AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            http_client=_http,
+            timeout=httpx.Timeout(
+                settings.openai_timeout, connect=settings.openai_connect_timeout
+            ),
+            max_retries=settings.openai_max_retries,
+        )
+    return _client
+
+
+async def close_openai_client() -> None:
+    global _client, _http
+    if _client is not None:
+        await _client.close()
+    _client = None
+    _http = None
+
+
+def pool_stats() -> dict[str, object]:
+    """Connection pool usage for /health; httpcore internals are best-effort."""
+    stats: dict[str, object] = {
+        "initialized": _client is not None,
+        "max_connections": settings.openai_max_connections,
+    }
+    pool = getattr(getattr(_http, "_transport", None), "_pool", None)
+    if pool is None:
+        return stats
+    try:
+        connections = list(pool.connections)
+        idle = sum(1 for conn in connections if conn.is_idle())
+        stats.update(
+            connections=len(connections),
+            idle=idle,
+            active=len(connections) - idle,
+            requests=len(getattr(pool, "_requests", [])),
+        )
+    except Exception as exc:  # pragma: no cover - httpcore internals changed
+        logger.debug("OpenAI pool stats unavailable: %s", exc)
+    return stats
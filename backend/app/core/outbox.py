@@ -0,0 +1,361 @@
+"""Durable outbound Telegram messages.
+
+Replies are written to ``telegram_outbox`` and sent right away; what could
+not be delivered (429, network error, 5xx) stays pending and is retried by
+a background sender with backoff that honours ``retry_after``. Rows of one
+chat always go out in id order; delivery is at least once.
+"""
+
+import asyncio
+import logging
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.core.telegram_client import telegram
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+# Пространство ключей pg_try_advisory_xact_lock(ns, chat) для захвата чатов
+_CHAT_LOCK_NS = 7305
+
+_INSERT_SQL = text("""
+    INSERT INTO telegram_outbox (chat_id, text)
+    SELECT :cid, part
+    FROM unnest(CAST(:parts AS TEXT[])) WITH ORDINALITY AS t(part, n)
+    ORDER BY n
+    RETURNING id
+    """)
+
+_INSERT_MANY_SQL = text("""
+    INSERT INTO telegram_outbox (chat_id, text)
+    SELECT cid, body
+    FROM unnest(CAST(:cids AS BIGINT[]), CAST(:texts AS TEXT[]))
+        WITH ORDINALITY AS t(cid, body, n)
+    ORDER BY n
+    """)
+
+# Чаты с готовыми строками, которые сейчас не захватывает другая реплика.
+# Замок держится до конца транзакции захвата: пока соседний процесс переводит
+# ранние строки чата в sending, поздние строки этого чата никто не возьмёт.
+_LOCK_CHATS_SQL = text("""
+    SELECT chat_id FROM (
+        SELECT DISTINCT o.chat_id FROM telegram_outbox o
+        WHERE ((o.status = 'pending' AND o.available_at <= NOW())
+               OR (o.status = 'sending'
+                   AND o.locked_at < NOW() - make_interval(secs => :lock_timeout)))
+          AND (CAST(:cid AS BIGINT) IS NULL OR o.chat_id = CAST(:cid AS BIGINT))
+        LIMIT :batch
+    ) AS ready
+    WHERE pg_try_advisory_xact_lock(:ns, hashtext(CAST(chat_id AS TEXT)))
+    """)
+
+# Берём готовые строки захваченных чатов, перед которыми в чате нет ждущих
+# или отправляемых
+_CLAIM_SQL = text("""
+    UPDATE telegram_outbox
+    SET status = 'sending', locked_at = NOW(), attempts = attempts + 1
+    WHERE id IN (
+        SELECT o.id FROM telegram_outbox o
+        WHERE ((o.status = 'pending' AND o.available_at <= NOW())
+               OR (o.status = 'sending'
+                   AND o.locked_at < NOW() - make_interval(secs => :lock_timeout)))
+          AND o.chat_id = ANY(CAST(:cids AS BIGINT[]))
+          AND NOT EXISTS (
+              SELECT 1 FROM telegram_outbox e
+              WHERE e.chat_id = o.chat_id
+                AND e.id < o.id
+                AND ((e.status = 'pending' AND e.available_at > NOW())
+                     OR (e.status = 'sending'
+                         AND e.locked_at >= NOW()
+                             - make_interval(secs => :lock_timeout)))
+          )
+        ORDER BY o.id
+        LIMIT :batch
+    )
+    RETURNING id, chat_id, text, attempts, created_at
+    """)
+
+_MARK_SENT_SQL = text("""
+    UPDATE telegram_outbox AS o
+    SET status = 'sent', sent_at = NOW(), locked_at = NULL, message_id = v.mid
+    FROM unnest(CAST(:ids AS BIGINT[]), CAST(:mids AS BIGINT[])) AS v(id, mid)
+    WHERE o.id = v.id
+    """)
+
+_RETRY_SQL = text("""
+    UPDATE telegram_outbox
+    SET status = :status,
+        locked_at = NULL,
+        last_error = :error,
+        available_at = NOW() + make_interval(secs => :delay)
+    WHERE id = :id
+    """)
+
+# Не отправленные из-за более раннего сбоя: попытка не засчитывается
+_RELEASE_SQL = text("""
+    UPDATE telegram_outbox
+    SET status = 'pending', locked_at = NULL, attempts = GREATEST(attempts - 1, 0)
+    WHERE id = ANY(CAST(:ids AS BIGINT[]))
+    """)
+
+_BACKLOG_SQL = text("""
+    SELECT COUNT(*), EXTRACT(EPOCH FROM NOW() - MIN(created_at))
+    FROM telegram_outbox WHERE status IN ('pending', 'sending')
+    """)
+
+
+@dataclass
+class OutboxMessage:
+    id: int
+    chat_id: int
+    text: str
+    attempts: int
+    created_at: datetime
+
+
+def _retry_delay(data: dict[str, Any], attempts: int) -> Optional[float]:
+    """Seconds until the next try, or None if Telegram refused for good."""
+    code = data.get("error_code")
+    if code == 429:
+        return float((data.get("parameters") or {}).get("retry_after", 2**attempts))
+    if code is None or code >= 500:
+        return float(min(2**attempts, 300))
+    return None  # 400/403: чат не найден, бот заблокирован — повтор не поможет
+
+
+async def enqueue_messages(chat_id: int, parts: list[str]) -> list[int]:
+    async with SessionLocal() as session, session.begin():
+        res = await session.execute(_INSERT_SQL, {"cid": chat_id, "parts": parts})
+        return sorted(row[0] for row in res)
+
+
+async def enqueue_many(
+    session: AsyncSession, chat_ids: list[int], texts: list[str]
+) -> None:
+    """Queue one message per chat inside the caller's transaction.
+
+    Nothing is sent here: call ``outbox.notify()`` after the commit.
+    """
+    if chat_ids:
+        await session.execute(_INSERT_MANY_SQL, {"cids": chat_ids, "texts": texts})
+
+
+async def outbox_backlog() -> dict[str, object]:
+    async with SessionLocal() as session:
+        row = (await session.execute(_BACKLOG_SQL)).first()
+    return {"pending": row[0], "oldest_s": round(float(row[1] or 0), 1)}
+
+
+class OutboxSender:
+    """Sends pending outbox rows in per-chat order and keeps delivery metrics."""
+
+    def __init__(
+        self,
+        batch_size: int,
+        max_attempts: int,
+        poll_interval: float,
+        lock_timeout: float,
+    ) -> None:
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.lock_timeout = lock_timeout
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.lag_ms_avg = 0.0
+        self.lag_ms_max = 0.0
+        self._sent_times: deque[float] = deque()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def deliver(
+        self, token: str, chat_id: int, parts: list[str]
+    ) -> Optional[int]:
+        """Persist the parts and try to send them now.
+
+        Returns the message_id of the first part if it went out right away.
+        Raises only if the parts could not be persisted.
+        """
+        ids = await enqueue_messages(chat_id, parts)
+        try:
+            delivered = await self.flush(token, chat_id)
+        except Exception as exc:  # pragma: no cover - отправит фоновый цикл
+            logger.warning("Outbox flush failed: %s", exc, extra={"chat_id": chat_id})
+            delivered = {}
+        if not all(row_id in delivered for row_id in ids):
+            self.notify()
+        return delivered.get(ids[0]) if ids else None
+
+    async def flush(self, token: str, chat_id: Optional[int] = None) -> dict[int, int]:
+        """Send one batch of ready rows (of one chat or of all chats).
+
+        Returns ``{outbox id: Telegram message_id}`` for the rows delivered.
+        """
+        params = {"batch": self.batch_size, "lock_timeout": float(self.lock_timeout)}
+        async with SessionLocal() as session, session.begin():
+            res = await session.execute(
+                _LOCK_CHATS_SQL, {**params, "cid": chat_id, "ns": _CHAT_LOCK_NS}
+            )
+            chat_ids = list(res.scalars())
+            rows: list[OutboxMessage] = []
+            if chat_ids:
+                # Отдельным запросом: его снимок уже видит строки, захваченные
+                # до того, как освободился замок чата
+                res = await session.execute(_CLAIM_SQL, {**params, "cids": chat_ids})
+                rows = [OutboxMessage(*row) for row in res]
+        if not rows:
+            return {}
+
+        chats: dict[int, list[OutboxMessage]] = defaultdict(list)
+        for message in sorted(rows, key=lambda m: m.id):
+            chats[message.chat_id].append(message)
+        results = await asyncio.gather(
+            *(self._send_chat(token, messages) for messages in chats.values())
+        )
+
+        delivered: dict[int, int] = {}
+        released: list[int] = []
+        for sent, chat_released in results:
+            delivered.update(sent)
+            released.extend(chat_released)
+        async with SessionLocal() as session, session.begin():
+            if delivered:
+                await session.execute(
+                    _MARK_SENT_SQL,
+                    {"ids": list(delivered), "mids": list(delivered.values())},
+                )
+            if released:
+                await session.execute(_RELEASE_SQL, {"ids": released})
+        self._record_sent(rows, delivered)
+        return delivered
+
+    async def _send_chat(
+        self, token: str, messages: list[OutboxMessage]
+    ) -> tuple[dict[int, int], list[int]]:
+        sent: dict[int, int] = {}
+        for index, message in enumerate(messages):
+            try:
+                data = await telegram.send_message(token, message.chat_id, message.text)
+            except Exception as exc:
+                data = {"ok": False, "description": str(exc)}
+            if data.get("ok"):
+                sent[message.id] = (data.get("result") or {}).get("message_id")
+                continue
+            delay = _retry_delay(data, message.attempts)
+            await self._retry(message, data, delay)
+            if delay is not None:
+                # Остальные сообщения чата ждут, пока уйдёт это: порядок важнее
+                return sent, [m.id for m in messages[index + 1 :]]
+        return sent, []
+
+    async def _retry(
+        self, message: OutboxMessage, data: dict[str, Any], delay: Optional[float]
+    ) -> None:
+        exhausted = delay is None or message.attempts >= self.max_attempts
+        if exhausted:
+            self.failed += 1
+            logger.warning(
+                "Outbox message dropped: %s",
+                data.get("description"),
+                extra={"chat_id": message.chat_id, "outbox_id": message.id},
+            )
+        else:
+            self.retried += 1
+        async with SessionLocal() as session, session.begin():
+            await session.execute(
+                _RETRY_SQL,
+                {
+                    "id": message.id,
+                    "status": "failed" if exhausted else "pending",
+                    "error": str(data.get("description") or data)[:1000],
+                    "delay": float(delay or 0),
+                },
+            )
+
+    def _record_sent(
+        self, rows: list[OutboxMessage], delivered: dict[int, int]
+    ) -> None:
+        now = time.monotonic()
+        wall = datetime.now(timezone.utc)
+        for message in rows:
+            if message.id not in delivered:
+                continue
+            lag_ms = max(0.0, (wall - message.created_at).total_seconds() * 1000)
+            self.lag_ms_avg = (
+                lag_ms if not self.sent else 0.9 * self.lag_ms_avg + 0.1 * lag_ms
+            )
+            self.lag_ms_max = max(self.lag_ms_max, lag_ms)
+            self.sent += 1
+            self._sent_times.append(now)
+        while self._sent_times and self._sent_times[0] < now - 60:
+            self._sent_times.popleft()
+
+    def stats(self) -> dict[str, object]:
+        now = time.monotonic()
+        return {
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "sent_last_minute": sum(1 for t in self._sent_times if t >= now - 60),
+            "lag_ms_avg": round(self.lag_ms_avg, 1),
+            "lag_ms_max": round(self.lag_ms_max, 1),
+        }
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    def start(self, token: str) -> None:
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(token), name="telegram-outbox")
+
+    async def stop(self) -> None:
+        self._stopping = True
+        self._wakeup.set()
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self, token: str) -> None:
+        while not self._stopping:
+            try:
+                delivered = await self.flush(token)
+            except Exception as exc:  # pragma: no cover - DB hiccup, retry later
+                logger.warning("Outbox sender failed: %s", exc)
+                delivered = {}
+            if len(delivered) >= self.batch_size:
+                continue  # полная пачка — сразу за следующей
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+outbox = OutboxSender(
+    batch_size=settings.outbox_batch_size,
+    max_attempts=settings.outbox_max_attempts,
+    poll_interval=settings.outbox_poll_interval,
+    lock_timeout=settings.outbox_lock_timeout,
+)
+
+
+def start_outbox() -> Optional[OutboxSender]:
+    if not settings.outbox_enabled or not settings.telegram_bot_token:
+        return None
+    outbox.start(settings.telegram_bot_token)
+    return outbox
+
+
+async def stop_outbox() -> None:
+    await outbox.stop()
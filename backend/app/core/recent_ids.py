@@ -0,0 +1,35 @@
+from collections import deque
+
+
+class RecentIdFilter:
+    """Fixed-size memory of recently seen ids (ring buffer + set).
+
+    Only a positive answer is trusted: an id that fell out of the window
+    still has to be checked against processed_updates.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._order: deque[int] = deque()
+        self._ids: set[int] = set()
+        self.hits = 0
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, item: int) -> bool:
+        return item in self._ids
+
+    def seen(self, item: int) -> bool:
+        if item in self._ids:
+            self.hits += 1
+            return True
+        return False
+
+    def add(self, item: int) -> None:
+        if self.capacity <= 0 or item in self._ids:
+            return
+        self._order.append(item)
+        self._ids.add(item)
+        if len(self._order) > self.capacity:
+            self._ids.discard(self._order.popleft())
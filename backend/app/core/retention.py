@@ -0,0 +1,130 @@
+import asyncio
+import logging
+from typing import Optional
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from sqlalchemy import TextClause, text
+
+logger = logging.getLogger(__name__)
+
+# Удаляем пачками, чтобы не держать длинные блокировки на горячей таблице
+_SWEEP_SQL = text("""
+    DELETE FROM processed_updates
+    WHERE update_id IN (
+        SELECT update_id FROM processed_updates
+        WHERE processed_at < NOW() - make_interval(hours => :hours)
+        ORDER BY processed_at
+        LIMIT :batch
+    )
+    """)
+
+# Доставленные ответы нужны только для разбора инцидентов
+_OUTBOX_SWEEP_SQL = text("""
+    DELETE FROM telegram_outbox
+    WHERE id IN (
+        SELECT id FROM telegram_outbox
+        WHERE status = 'sent' AND sent_at < NOW() - make_interval(hours => :hours)
+        ORDER BY id
+        LIMIT :batch
+    )
+    """)
+
+
+_CRM_OUTBOX_SWEEP_SQL = text("""
+    DELETE FROM crm_outbox
+    WHERE id IN (
+        SELECT id FROM crm_outbox
+        WHERE status = 'sent' AND sent_at < NOW() - make_interval(hours => :hours)
+        ORDER BY id
+        LIMIT :batch
+    )
+    """)
+
+
+async def _sweep(sql: TextClause, retention_hours: int, batch: int) -> int:
+    deleted = 0
+    while True:
+        async with SessionLocal() as session, session.begin():
+            res = await session.execute(sql, {"hours": retention_hours, "batch": batch})
+        deleted += res.rowcount or 0
+        if (res.rowcount or 0) < batch:
+            return deleted
+
+
+async def sweep_processed_updates(retention_hours: int, batch: int = 5_000) -> int:
+    """Delete processed_updates rows older than the retention window."""
+    return await _sweep(_SWEEP_SQL, retention_hours, batch)
+
+
+async def sweep_outbox(retention_hours: int, batch: int = 5_000) -> int:
+    """Delete delivered telegram_outbox rows older than the retention window."""
+    return await _sweep(_OUTBOX_SWEEP_SQL, retention_hours, batch)
+
+
+async def sweep_crm_outbox(retention_hours: int, batch: int = 5_000) -> int:
+    """Delete synced crm_outbox rows older than the retention window."""
+    return await _sweep(_CRM_OUTBOX_SWEEP_SQL, retention_hours, batch)
+
+
+class RetentionSweeper:
+    """Periodically trims processed_updates and delivered outbox rows."""
+
+    def __init__(self, retention_hours: int, interval: float) -> None:
+        self._retention_hours = retention_hours
+        self._interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="retention-sweeper")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                deleted = await sweep_processed_updates(self._retention_hours)
+                if deleted:
+                    logger.info("processed_updates sweep: %s rows deleted", deleted)
+            except Exception as exc:  # pragma: no cover - retried next interval
+                logger.warning("processed_updates sweep failed: %s", exc)
+            try:
+                deleted = await sweep_outbox(self._retention_hours)
+                if deleted:
+                    logger.info("telegram_outbox sweep: %s rows deleted", deleted)
+            except Exception as exc:  # pragma: no cover - retried next interval
+                logger.warning("telegram_outbox sweep failed: %s", exc)
+            try:
+                deleted = await sweep_crm_outbox(self._retention_hours)
+                if deleted:
+                    logger.info("crm_outbox sweep: %s rows deleted", deleted)
+            except Exception as exc:  # pragma: no cover - retried next interval
+                logger.warning("crm_outbox sweep failed: %s", exc)
+            await asyncio.sleep(self._interval)
+
+
+_sweeper: Optional[RetentionSweeper] = None
+
+
+def start_sweeper() -> Optional[RetentionSweeper]:
+    global _sweeper
+    if settings.processed_updates_retention_hours <= 0:
+        return None
+    _sweeper = RetentionSweeper(
+        retention_hours=settings.processed_updates_retention_hours,
+        interval=settings.processed_updates_sweep_interval,
+    )
+    _sweeper.start()
+    return _sweeper
+
+
+async def stop_sweeper() -> None:
+    global _sweeper
+    if _sweeper is not None:
+        await _sweeper.stop()
+        _sweeper = None
@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+import httpx
+from app.core.chunking import split_text
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+API_BASE = "https://api.telegram.org"
+MESSAGE_LIMIT = 4096
+
+
+class TelegramClient:
+    """App-lifetime Bot API client.
+
+    One pooled keep-alive ``httpx.AsyncClient`` for every call, a global
+    token bucket (~30 msg/s) plus per-chat spacing (~1 msg/s) for chat-bound
+    methods, and automatic retries honouring ``retry_after`` on 429.
+    Texts over ``MESSAGE_LIMIT`` go out as several messages, in order and
+    without other sends to the same chat in between.
+    """
+
+    def __init__(
+        self,
+        global_rate: float,
+        per_chat_interval: float,
+        max_connections: int,
+        http2: bool = False,
+        max_retries: int = 3,
+        max_retry_after: float = 30.0,
+    ) -> None:
+        self._global_rate = global_rate
+        self._per_chat_interval = per_chat_interval
+        self._max_connections = max_connections
+        self._http2 = http2
+        self._max_retries = max_retries
+        self._max_retry_after = max_retry_after
+        self._http: Optional[httpx.AsyncClient] = None
+        self._tokens = global_rate
+        self._tokens_at = time.monotonic()
+        self._chat_next: dict[int | str, float] = {}
+        # chat_id -> [lock, число ожидающих]; запись живёт, пока лок кому-то нужен
+        self._chat_locks: dict[int | str, list] = {}
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            http2 = self._http2
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    logger.warning("TELEGRAM_HTTP2 requested but h2 is not installed")
+                    http2 = False
+            self._http = httpx.AsyncClient(
+                timeout=10,
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=self._max_connections,
+                    max_keepalive_connections=self._max_connections,
+                    keepalive_expiry=60,
+                ),
+            )
+        return self._http
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def _reserve(self, chat_id: Optional[int | str]) -> float:
+        """Reserve a send slot and return how long the caller has to wait."""
+        now = time.monotonic()
+        self._tokens = min(
+            self._global_rate,
+            self._tokens + (now - self._tokens_at) * self._global_rate,
+        )
+        self._tokens_at = now
+        self._tokens -= 1
+        delay = 0.0 if self._tokens >= 0 else -self._tokens / self._global_rate
+
+        if chat_id is not None:
+            if len(self._chat_next) > 10_000:
+                self._chat_next = {c: t for c, t in self._chat_next.items() if t > now}
+            slot = max(now + delay, self._chat_next.get(chat_id, 0.0))
+            self._chat_next[chat_id] = slot + self._per_chat_interval
+            delay = slot - now
+        return delay
+
+    async def call(
+        self,
+        token: str,
+        method: str,
+        payload: Optional[dict[str, Any]] = None,
+        chat_id: Optional[int | str] = None,
+    ) -> dict[str, Any]:
+        """Call a Bot API method and return the decoded response body.
+
+        Pass ``chat_id`` for methods that post into a chat so they are rate
+        limited; service calls (setWebhook, getWebhookInfo) are not.
+        """
+        url = f"{API_BASE}/bot{token}/{method}"
+        for attempt in range(self._max_retries + 1):
+            if chat_id is not None:
+                delay = self._reserve(chat_id)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            resp = await self._client().post(url, json=payload or {})
+            data = resp.json() if resp.content else {}
+            if resp.status_code != 429 or attempt == self._max_retries:
+                return data
+            retry_after = float(
+                (data.get("parameters") or {}).get("retry_after", 2**attempt)
+            )
+            if retry_after > self._max_retry_after:
+                return data
+            logger.warning(
+                "Telegram 429 on %s, retry in %ss",
+                method,
+                retry_after,
+                extra={"chat_id": chat_id, "attempt": attempt},
+            )
+            await asyncio.sleep(retry_after)
+        return {}  # pragma: no cover - loop always returns
+
+    @asynccontextmanager
+    async def _chat_lock(self, chat_id: int | str) -> AsyncIterator[None]:
+        entry = self._chat_locks.get(chat_id)
+        if entry is None:
+            entry = self._chat_locks[chat_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chat_locks[chat_id]
+
+    async def send_message(
+        self,
+        token: str,
+        chat_id: int | str,
+        text: str,
+        edit_message_id: Optional[int] = None,
+    ) -> dict:
+        """Send ``text``, split into parts of at most ``MESSAGE_LIMIT`` chars.
+
+        With ``edit_message_id`` the first part replaces that message (e.g. a
+        streaming placeholder). Returns the response for the first part, or
+        the first refusal; parts after a refusal are not sent.
+        """
+        parts = split_text(text, MESSAGE_LIMIT)
+        first: dict = {}
+        async with self._chat_lock(chat_id):
+            for index, part in enumerate(parts):
+                data: dict = {}
+                if index == 0 and edit_message_id is not None:
+                    data = await self.edit_message_text(
+                        token, chat_id, edit_message_id, part
+                    )
+                if not data.get("ok"):
+                    # Первую часть не удалось подставить — отправляем новым сообщением
+                    data = await self.call(
+                        token,
+                        "sendMessage",
+                        {"chat_id": chat_id, "text": part},
+                        chat_id=chat_id,
+                    )
+                if not data.get("ok"):
+                    return data
+                first = first or data
+        return first
+
+    async def edit_message_text(
+        self, token: str, chat_id: int, message_id: int, text: str
+    ) -> dict:
+        return await self.call(
+            token,
+            "editMessageText",
+            {"chat_id": chat_id, "message_id": message_id, "text": text},
+            chat_id=chat_id,
+        )
+
+
+telegram = TelegramClient(
+    global_rate=settings.telegram_global_rate,
+    per_chat_interval=settings.telegram_per_chat_interval,
+    max_connections=settings.telegram_max_connections,
+    http2=settings.telegram_http2,
+)
@@ -0,0 +1,80 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable, Optional
+
+
+class ThreadCache:
+    """Size- and TTL-bounded LRU of chat_id -> OpenAI thread_id.
+
+    ``get_or_load`` is single-flight: concurrent misses for the same chat
+    share one loader call, so two first messages cannot create two threads.
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: OrderedDict[int, tuple[str, float]] = OrderedDict()
+        self._inflight: dict[int, asyncio.Task[str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, chat_id: int) -> Optional[str]:
+        item = self._data.get(chat_id)
+        if item is None:
+            return None
+        thread_id, expires_at = item
+        if expires_at < time.monotonic():
+            del self._data[chat_id]
+            return None
+        self._data.move_to_end(chat_id)
+        return thread_id
+
+    def set(self, chat_id: int, thread_id: str) -> None:
+        self._data[chat_id] = (thread_id, time.monotonic() + self.ttl)
+        self._data.move_to_end(chat_id)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def warm(self, rows: Iterable[tuple[int, str]]) -> int:
+        """Preload rows ordered from most to least recently active."""
+        loaded = 0
+        for chat_id, thread_id in reversed(list(rows)):
+            self.set(chat_id, thread_id)
+            loaded += 1
+        return loaded
+
+    async def get_or_load(
+        self, chat_id: int, loader: Callable[[], Awaitable[str]]
+    ) -> str:
+        cached = self.get(chat_id)
+        if cached:
+            self.hits += 1
+            return cached
+        self.misses += 1
+
+        task = self._inflight.get(chat_id)
+        if task is None:
+            # Загрузка живёт отдельно от вызывающего: отмена одного запроса
+            # не роняет остальных ожидающих
+            task = asyncio.ensure_future(loader())
+            self._inflight[chat_id] = task
+            task.add_done_callback(lambda t: self._loaded(chat_id, t))
+        return await asyncio.shield(task)
+
+    def _loaded(self, chat_id: int, task: "asyncio.Task[str]") -> None:
+        self._inflight.pop(chat_id, None)
+        if not task.cancelled() and task.exception() is None and task.result():
+            self.set(chat_id, task.result())
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "loading": len(self._inflight),
+        }
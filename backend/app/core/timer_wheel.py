@@ -0,0 +1,64 @@
+import math
+from typing import Hashable
+
+
+class TimerWheel:
+    """Hashed timing wheel: O(1) schedule and cancel, fires by whole ticks.
+
+    The wheel covers ``slots * tick`` seconds ahead of the last ``advance``;
+    timers further out are refused and must be scheduled again once they
+    come within the horizon. A timer fires on the first ``advance`` at or
+    after its deadline, at most one tick late; past deadlines fire on the
+    next tick.
+    """
+
+    def __init__(self, tick: float, slots: int, now: float) -> None:
+        self.tick = tick
+        self._slots: list[dict[Hashable, float]] = [{} for _ in range(slots)]
+        self._where: dict[Hashable, int] = {}
+        self._current = int(now // tick)
+
+    @property
+    def horizon(self) -> float:
+        """Latest deadline (epoch seconds) the wheel accepts right now."""
+        return (self._current + len(self._slots)) * self.tick
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._where
+
+    def schedule(self, key: Hashable, deadline: float) -> bool:
+        """(Re)schedule ``key``; False if the deadline is beyond the horizon."""
+        tick_no = max(math.ceil(deadline / self.tick), self._current + 1)
+        if tick_no - self._current > len(self._slots):
+            self.cancel(key)
+            return False
+        self.cancel(key)
+        slot = tick_no % len(self._slots)
+        self._slots[slot][key] = deadline
+        self._where[key] = slot
+        return True
+
+    def cancel(self, key: Hashable) -> bool:
+        slot = self._where.pop(key, None)
+        if slot is None:
+            return False
+        del self._slots[slot][key]
+        return True
+
+    def advance(self, now: float) -> list[tuple[Hashable, float]]:
+        """Move the wheel to ``now`` and return ``(key, deadline)`` that came due."""
+        target = int(now // self.tick)
+        steps = min(target - self._current, len(self._slots))
+        fired: list[tuple[Hashable, float]] = []
+        # В слоте только текущий оборот (горизонт = один оборот), всё в нём — срок
+        for tick_no in range(target - steps + 1, target + 1):
+            bucket = self._slots[tick_no % len(self._slots)]
+            for key in bucket:
+                del self._where[key]
+            fired.extend(bucket.items())
+            bucket.clear()
+        self._current = max(self._current, target)
+        return fired
@@ -0,0 +1,274 @@
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+UpdateHandler = Callable[[dict[str, Any]], Awaitable[None]]
+
+# Идемпотентность и постановка в очередь — одним запросом
+_ENQUEUE_SQL = text("""
+    WITH marked AS (
+        INSERT INTO processed_updates (update_id)
+        VALUES (:uid)
+        ON CONFLICT DO NOTHING
+        RETURNING update_id
+    )
+    INSERT INTO telegram_update_queue (update_id, chat_id, payload)
+    SELECT update_id, CAST(:cid AS BIGINT), CAST(:payload AS JSONB) FROM marked
+    RETURNING id
+    """)
+
+# Зависшие в processing задачи (упавший процесс) забираются повторно после lock_timeout.
+# Пока у чата есть более ранний незавершённый апдейт, следующие апдейты чата ждут.
+_CLAIM_SQL = text("""
+    UPDATE telegram_update_queue
+    SET status = 'processing', locked_at = NOW(), attempts = attempts + 1
+    WHERE id = (
+        SELECT q.id FROM telegram_update_queue q
+        WHERE ((q.status = 'pending' AND q.available_at <= NOW())
+               OR (q.status = 'processing'
+                   AND q.locked_at < NOW() - make_interval(secs => :lock_timeout)))
+          AND NOT EXISTS (
+              SELECT 1 FROM telegram_update_queue busy
+              WHERE busy.chat_id = q.chat_id
+                AND busy.id < q.id
+                AND busy.status IN ('pending', 'processing')
+          )
+        ORDER BY q.id
+        FOR UPDATE SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING id, payload, attempts
+    """)
+
+
+# Отложенное повторение: апдейт уже отмечен в processed_updates, дубли не ставим
+_DEFER_SQL = text("""
+    INSERT INTO telegram_update_queue (update_id, chat_id, payload, available_at)
+    VALUES (:uid, CAST(:cid AS BIGINT), CAST(:payload AS JSONB),
+            NOW() + make_interval(secs => :delay))
+    ON CONFLICT (update_id) DO NOTHING
+    """)
+
+
+class UpdateDeferred(Exception):
+    """Raised by a handler to put its update back for a later replay.
+
+    ``payload`` replaces the stored one; the attempt is not counted.
+    """
+
+    def __init__(self, payload: dict[str, Any], delay: float) -> None:
+        super().__init__(f"deferred for {delay:.0f}s")
+        self.payload = payload
+        self.delay = delay
+
+
+@dataclass
+class QueuedUpdate:
+    id: int
+    payload: dict[str, Any]
+    attempts: int
+
+
+async def enqueue_update(
+    update_id: int, chat_id: Optional[int], payload: dict[str, Any]
+) -> bool:
+    """Persist a raw update; return False if this update_id was already seen."""
+    async with SessionLocal() as session, session.begin():
+        res = await session.execute(
+            _ENQUEUE_SQL,
+            {
+                "uid": update_id,
+                "cid": chat_id,
+                "payload": json.dumps(payload, ensure_ascii=False),
+            },
+        )
+        return res.first() is not None
+
+
+async def defer_update(
+    update_id: int, chat_id: Optional[int], payload: dict[str, Any], delay: float
+) -> None:
+    """Queue an already processed update for a replay after ``delay`` seconds."""
+    async with SessionLocal() as session, session.begin():
+        await session.execute(
+            _DEFER_SQL,
+            {
+                "uid": update_id,
+                "cid": chat_id,
+                "payload": json.dumps(payload, ensure_ascii=False),
+                "delay": float(delay),
+            },
+        )
+
+
+async def claim_update() -> Optional[QueuedUpdate]:
+    async with SessionLocal() as session, session.begin():
+        res = await session.execute(
+            _CLAIM_SQL, {"lock_timeout": float(settings.telegram_queue_lock_timeout)}
+        )
+        row = res.first()
+    if not row:
+        return None
+    payload = row[1] if isinstance(row[1], dict) else json.loads(row[1])
+    return QueuedUpdate(id=row[0], payload=payload, attempts=row[2])
+
+
+async def complete_update(job_id: int) -> None:
+    async with SessionLocal() as session, session.begin():
+        await session.execute(
+            text("DELETE FROM telegram_update_queue WHERE id = :id"), {"id": job_id}
+        )
+
+
+async def fail_update(job: QueuedUpdate, error: str) -> None:
+    """Return the job to the queue with backoff or park it as failed."""
+    exhausted = job.attempts >= settings.telegram_queue_max_attempts
+    async with SessionLocal() as session, session.begin():
+        await session.execute(
+            text("""
+                UPDATE telegram_update_queue
+                SET status = :status,
+                    locked_at = NULL,
+                    last_error = :error,
+                    available_at = NOW() + make_interval(secs => :delay)
+                WHERE id = :id
+                """),
+            {
+                "id": job.id,
+                "status": "failed" if exhausted else "pending",
+                "error": error[:1000],
+                "delay": float(min(2**job.attempts, 300)),
+            },
+        )
+
+
+async def postpone_update(job: QueuedUpdate, deferred: UpdateDeferred) -> None:
+    async with SessionLocal() as session, session.begin():
+        await session.execute(
+            text("""
+                UPDATE telegram_update_queue
+                SET status = 'pending',
+                    locked_at = NULL,
+                    attempts = GREATEST(attempts - 1, 0),
+                    payload = CAST(:payload AS JSONB),
+                    available_at = NOW() + make_interval(secs => :delay)
+                WHERE id = :id
+                """),
+            {
+                "id": job.id,
+                "payload": json.dumps(deferred.payload, ensure_ascii=False),
+                "delay": float(deferred.delay),
+            },
+        )
+
+
+class UpdateWorkerPool:
+    """Async workers draining telegram_update_queue."""
+
+    def __init__(
+        self, handler: UpdateHandler, concurrency: int, poll_interval: float
+    ) -> None:
+        self._handler = handler
+        self._concurrency = max(1, concurrency)
+        self._poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._stopping = False
+        self._tasks = [
+            asyncio.create_task(self._run(), name=f"telegram-worker-{n}")
+            for n in range(self._concurrency)
+        ]
+        logger.info("Telegram update workers started: %s", self._concurrency)
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def stop(self, grace: float = 10.0) -> None:
+        self._stopping = True
+        self._wakeup.set()
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(self._tasks, timeout=grace)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._tasks = []
+
+    async def _idle(self) -> None:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self._poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                job = await claim_update()
+            except Exception as exc:  # pragma: no cover - DB hiccup, retry later
+                logger.warning("Update queue claim failed: %s", exc)
+                await self._idle()
+                continue
+
+            if job is None:
+                await self._idle()
+                continue
+
+            try:
+                await self._process(job)
+            except Exception as exc:  # pragma: no cover - reclaimed after lock timeout
+                logger.warning("Update queue bookkeeping failed: %s", exc)
+
+    async def _process(self, job: QueuedUpdate) -> None:
+        try:
+            await self._handler(job.payload)
+        except UpdateDeferred as deferred:
+            await postpone_update(job, deferred)
+        except Exception as exc:
+            logger.warning(
+                "Queued update failed",
+                extra={"job_id": job.id, "attempts": job.attempts, "error": str(exc)},
+            )
+            await fail_update(job, str(exc))
+        else:
+            await complete_update(job.id)
+
+
+_pool: Optional[UpdateWorkerPool] = None
+
+
+def start_workers(
+    handler: UpdateHandler, concurrency: Optional[int] = None
+) -> UpdateWorkerPool:
+    global _pool
+    _pool = UpdateWorkerPool(
+        handler,
+        concurrency=concurrency or settings.telegram_workers,
+        poll_interval=settings.telegram_queue_poll_interval,
+    )
+    _pool.start()
+    return _pool
+
+
+async def stop_workers() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.stop()
+        _pool = None
+
+
+def notify_workers() -> None:
+    """Wake idle in-process workers; other replicas pick the job up on poll."""
+    if _pool is not None:
+        _pool.notify()
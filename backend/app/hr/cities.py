@@ -0,0 +1,167 @@
+"""Canonical city names from free text: «Питер», «спб», «С-Петербург», «масква».
+
+The index is a trie over normalized names and aliases (spec aliases plus
+derived ones) searched with a bounded Levenshtein distance, so inflected
+forms and typos resolve without a model call. Fuzzy search keeps the first
+letter fixed and counts a swap of two letters as one edit.
+"""
+
+from typing import Any, Iterable, Optional
+
+from app.hr.policy import get_policy_spec
+from app.hr.routing import normalize
+
+
+def _max_distance(length: int) -> int:
+    # Короткие названия только точно: «мск» не должен стать «нск»
+    if length <= 4:
+        return 0
+    return 1 if length <= 8 else 2
+
+
+def derived_aliases(city: str) -> set[str]:
+    """Spelling variants of a city name: «Санкт-Петербург» → «с петербург», …"""
+    name = normalize(city)
+    words = name.split()
+    aliases = {name, "".join(words)}
+    if len(words) > 1:
+        aliases.add(words[-1])
+        aliases.add(" ".join([w[0] for w in words[:-1]] + [words[-1]]))
+    return aliases
+
+
+class _Node:
+    __slots__ = ("children", "city")
+
+    def __init__(self) -> None:
+        self.children: dict[str, "_Node"] = {}
+        self.city: Optional[str] = None
+
+
+class CityIndex:
+    """Trie of normalized city names with bounded edit-distance lookup."""
+
+    def __init__(
+        self, cities: Iterable[str], aliases: Optional[dict[str, str]] = None
+    ) -> None:
+        self._root = _Node()
+        self.cities: set[str] = set()
+        for city in cities:
+            self.cities.add(city)
+            for alias in derived_aliases(city):
+                self._insert(alias, city)
+        for alias, city in (aliases or {}).items():
+            self._insert(normalize(alias), city)
+        words = list(self._words())
+        self._lengths = {len(w) for w in words}
+        self._max_words = max((len(w.split()) for w in words), default=1)
+
+    @classmethod
+    def from_spec(cls, spec: dict[str, Any]) -> "CityIndex":
+        locations = spec.get("locations") or {}
+        cities = set(locations.get("hire_cities") or [])
+        for vacancy in spec.get("vacancies") or []:
+            cities.update(vacancy.get("hire_cities") or [])
+        return cls(sorted(cities), locations.get("city_aliases") or {})
+
+    def __len__(self) -> int:
+        return len(self.cities)
+
+    def _insert(self, key: str, city: str) -> None:
+        if not key:
+            return
+        node = self._root
+        for char in key:
+            node = node.children.setdefault(char, _Node())
+        node.city = city
+
+    def _words(self) -> Iterable[str]:
+        stack = [(self._root, "")]
+        while stack:
+            node, prefix = stack.pop()
+            if node.city is not None:
+                yield prefix
+            for char, child in node.children.items():
+                stack.append((child, prefix + char))
+
+    def lookup(self, name: str) -> Optional[str]:
+        """Resolve a short answer that is just a city name («Питер», «масква»)."""
+        key = normalize(name)
+        if not key:
+            return None
+        return self._search(key, _max_distance(len(key)))
+
+    def find(self, text_msg: str) -> Optional[str]:
+        """Return the first known city mentioned anywhere in the text."""
+        words = normalize(text_msg).split()
+        for index in range(len(words)):
+            # Сначала составные названия («санкт петербург»), потом слова
+            for size in range(self._max_words, 0, -1):
+                if index + size > len(words):
+                    continue
+                key = " ".join(words[index : index + size])
+                city = self._search(key, _max_distance(len(key)))
+                if city is not None:
+                    return city
+        return None
+
+    def _search(self, key: str, max_distance: int) -> Optional[str]:
+        node = self._root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                break
+        else:
+            if node.city is not None:
+                return node.city
+        if max_distance == 0 or not any(
+            abs(length - len(key)) <= max_distance for length in self._lengths
+        ):
+            return None
+        start = self._root.children.get(key[0])
+        if start is None:
+            return None
+
+        best: tuple[int, Optional[str]] = (max_distance + 1, None)
+        # Строка DP для первой (совпавшей) буквы: расстояние Дамерау–Левенштейна
+        first = [1] + list(range(len(key)))
+        stack = [(start, key[0], first, None)]
+        while stack:
+            node, char, row, prev = stack.pop()
+            if node.city is not None and row[-1] < best[0]:
+                best = (row[-1], node.city)
+            if min(row) >= best[0]:
+                continue
+            for nxt, child in node.children.items():
+                new = [row[0] + 1]
+                for col in range(1, len(key) + 1):
+                    cost = 0 if key[col - 1] == nxt else 1
+                    value = min(new[col - 1] + 1, row[col] + 1, row[col - 1] + cost)
+                    if (
+                        prev is not None
+                        and col > 1
+                        and key[col - 1] == char
+                        and key[col - 2] == nxt
+                    ):
+                        value = min(value, prev[col - 2] + 1)
+                    new.append(value)
+                stack.append((child, nxt, new, row))
+        return best[1]
+
+
+_index: Optional[CityIndex] = None
+
+
+def get_city_index() -> CityIndex:
+    """Process-wide index built from the policy spec on first use."""
+    global _index
+    if _index is None:
+        _index = CityIndex.from_spec(get_policy_spec())
+    return _index
+
+
+def normalize_city(name: Optional[str]) -> Optional[str]:
+    """Canonical city name for CRM payloads; unknown cities are kept as typed."""
+    if not name:
+        return name
+    return get_city_index().lookup(name) or name.strip()
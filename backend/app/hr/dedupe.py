@@ -0,0 +1,281 @@
+"""Duplicate detection for candidates by phone and email.
+
+Phones are normalized to E.164 (Russian numbers without a country code get
++7), emails are trimmed and casefolded. Only HMAC-SHA256 digests of the
+normalized values are stored, in the indexed ``phone_hash`` and
+``email_hash`` columns of ``candidates``, so a lookup is an index probe per
+key rather than a scan. The earliest candidate with a matching key is the
+primary; later records either merge into it or point at it through
+``duplicate_of_id``.
+"""
+
+import hashlib
+import hmac
+import logging
+import re
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.hr.models import Source
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+# Всё после первого символа, которого не бывает в номере: «доб. 12», «ext 5»
+_PHONE_TAIL = re.compile(r"[^\d\s()+\-.]")
+_EMAIL = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+_FIND_PRIMARY_SQL = text("""
+    SELECT id, duplicate_of_id, phone_hash, email_hash FROM candidates
+    WHERE phone_hash = :phone_hash OR email_hash = :email_hash
+    ORDER BY COALESCE(duplicate_of_id, id), id
+    LIMIT 1
+    """)
+
+_MERGE_SQL = text("""
+    UPDATE candidates
+    SET phone = COALESCE(phone, :phone),
+        email = COALESCE(email, :email),
+        phone_hash = COALESCE(phone_hash, :phone_hash),
+        email_hash = COALESCE(email_hash, :email_hash),
+        notes = concat_ws(E'\\n', notes, CAST(:note AS TEXT)),
+        updated_at = timezone('utc', NOW())
+    WHERE id = :id
+    """)
+
+_INSERT_SQL = text("""
+    INSERT INTO candidates
+        (full_name, phone, email, source, status, notes, vacancy_id,
+         phone_hash, email_hash, duplicate_of_id, created_at, updated_at)
+    VALUES (:full_name, :phone, :email, :source, 'NEW', :notes, :vacancy_id,
+            :phone_hash, :email_hash, :duplicate_of_id,
+            timezone('utc', NOW()), timezone('utc', NOW()))
+    RETURNING id
+    """)
+
+# Первичная запись — самая ранняя с совпавшим ключом (или та, дублем которой
+# она уже помечена); по ix_candidates_phone_hash / ix_candidates_email_hash
+_LINK_SQL = text("""
+    UPDATE candidates AS c
+    SET duplicate_of_id = m.primary_id
+    FROM (
+        SELECT n.id, (
+            SELECT MIN(COALESCE(o.duplicate_of_id, o.id)) FROM candidates o
+            WHERE (o.phone_hash = n.phone_hash OR o.email_hash = n.email_hash)
+              AND o.id < n.id
+        ) AS primary_id
+        FROM candidates n
+        WHERE n.id = ANY(CAST(:ids AS INT[]))
+    ) AS m
+    WHERE c.id = m.id
+      AND m.primary_id IS NOT NULL
+      AND c.duplicate_of_id IS DISTINCT FROM m.primary_id
+    RETURNING c.id
+    """)
+
+_BACKFILL_PAGE_SQL = text("""
+    SELECT id, phone, email, phone_hash, email_hash FROM candidates
+    WHERE id > :after_id
+    ORDER BY id
+    LIMIT :batch
+    """)
+
+_BACKFILL_UPDATE_SQL = text("""
+    UPDATE candidates AS c
+    SET phone_hash = v.phone_hash, email_hash = v.email_hash
+    FROM unnest(CAST(:ids AS INT[]), CAST(:phone_hashes AS TEXT[]),
+                CAST(:email_hashes AS TEXT[])) AS v(id, phone_hash, email_hash)
+    WHERE c.id = v.id
+    """)
+
+
+def normalize_phone(raw: Any) -> Optional[str]:
+    """E.164 form of a phone number, or None if it does not look like one.
+
+    ``8 (912) 345-67-89``, ``+7 912 345 67 89`` and ``9123456789`` all give
+    ``+79123456789``.
+    """
+    if not raw:
+        return None
+    value = _PHONE_TAIL.split(str(raw).strip(), 1)[0].strip()
+    digits = re.sub(r"\D", "", value)
+    if value.startswith("+"):
+        pass
+    elif value.startswith("00"):
+        digits = digits[2:]
+    elif len(digits) == 11 and digits[0] in "78":
+        digits = "7" + digits[1:]
+    elif len(digits) == 10 and digits[0] == "9":
+        digits = "7" + digits  # мобильный без кода страны
+    if not 8 <= len(digits) <= 15 or digits[0] == "0":
+        return None
+    return "+" + digits
+
+
+def normalize_email(raw: Any) -> Optional[str]:
+    if not raw:
+        return None
+    value = str(raw).strip().casefold()
+    value = value.removeprefix("mailto:")
+    return value if _EMAIL.match(value) else None
+
+
+def contact_hash(kind: str, value: Optional[str]) -> Optional[str]:
+    """HMAC of a normalized phone or email; the raw value is never indexed.
+
+    None while ``DEDUPE_HASH_KEY`` is unset: with an empty key the digest is
+    a plain hash anyone can recompute from a phone list.
+    """
+    if value is None or not settings.dedupe_hash_key:
+        return None
+    key = settings.dedupe_hash_key.encode()
+    return hmac.new(key, f"{kind}:{value}".encode(), hashlib.sha256).hexdigest()
+
+
+def contact_hashes(phone: Any, email: Any) -> tuple[Optional[str], Optional[str]]:
+    return (
+        contact_hash("phone", normalize_phone(phone)),
+        contact_hash("email", normalize_email(email)),
+    )
+
+
+@dataclass
+class Registration:
+    """Outcome of ``register_candidate``."""
+
+    candidate_id: int
+    duplicate_of: Optional[int] = None
+    merged: bool = False
+
+
+async def register_candidate(
+    session: AsyncSession,
+    full_name: str,
+    phone: Optional[str],
+    email: Optional[str],
+    source: Source,
+    notes: Optional[str] = None,
+    vacancy_id: Optional[int] = None,
+) -> Registration:
+    """Insert a candidate unless one with the same phone or email exists.
+
+    A match gets the missing phone/email filled in (merge). If the new
+    record brings a key the match already has a different value for, it is
+    inserted and linked to the match instead, so both keys stay findable.
+    Runs in the caller's transaction.
+    """
+    phone_hash, email_hash = contact_hashes(phone, email)
+    # Одновременные отклики одного человека не должны создать две записи
+    for key in sorted(filter(None, (phone_hash, email_hash))):
+        await session.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"),
+            {"key": zlib.crc32(f"candidate:{key}".encode())},
+        )
+    match = None
+    if phone_hash or email_hash:
+        res = await session.execute(
+            _FIND_PRIMARY_SQL, {"phone_hash": phone_hash, "email_hash": email_hash}
+        )
+        match = res.first()
+    values = {
+        "full_name": full_name,
+        "phone": normalize_phone(phone) or phone,
+        "email": normalize_email(email) or email,
+        "phone_hash": phone_hash,
+        "email_hash": email_hash,
+    }
+    if match is not None:
+        found_id, found_primary, found_phone, found_email = match
+        primary = found_primary or found_id
+        conflicts = (phone_hash and found_phone and phone_hash != found_phone) or (
+            email_hash and found_email and email_hash != found_email
+        )
+        if not conflicts:
+            note = f"Повторный отклик ({source.value}): {full_name}"
+            await session.execute(_MERGE_SQL, {**values, "note": note, "id": found_id})
+            return Registration(found_id, duplicate_of=primary, merged=True)
+    else:
+        primary = None
+    res = await session.execute(
+        _INSERT_SQL,
+        {
+            **values,
+            "source": source.name,
+            "notes": notes,
+            "vacancy_id": vacancy_id,
+            "duplicate_of_id": primary,
+        },
+    )
+    return Registration(res.scalar_one(), duplicate_of=primary)
+
+
+async def link_duplicates(session: AsyncSession, ids: list[int]) -> int:
+    """Point ``ids`` at the earliest candidate sharing a phone or email key."""
+    if not ids:
+        return 0
+    res = await session.execute(_LINK_SQL, {"ids": ids})
+    return len(res.all())
+
+
+@dataclass
+class BackfillStats:
+    scanned: int = 0
+    hashed: int = 0
+    linked: int = 0
+    batches: int = 0
+    elapsed_ms: float = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return dict(self.__dict__)
+
+
+async def backfill_contact_hashes(batch_size: int = 1000) -> BackfillStats:
+    """Hash phones/emails of existing candidates and link their duplicates.
+
+    Walks ``candidates`` by id in keyset pages, one transaction per page.
+    Safe to rerun: rows whose hashes are current are not rewritten.
+    Refuses to run without ``DEDUPE_HASH_KEY``, which would erase the hashes.
+    """
+    if not settings.dedupe_hash_key:
+        raise RuntimeError("DEDUPE_HASH_KEY is not set")
+    stats = BackfillStats()
+    started = time.perf_counter()
+    after_id = 0
+    while True:
+        async with SessionLocal() as session, session.begin():
+            res = await session.execute(
+                _BACKFILL_PAGE_SQL, {"after_id": after_id, "batch": batch_size}
+            )
+            rows = res.all()
+            if not rows:
+                break
+            changed: dict[str, list[Any]] = {
+                "ids": [],
+                "phone_hashes": [],
+                "email_hashes": [],
+            }
+            for row_id, phone, email, old_phone_hash, old_email_hash in rows:
+                phone_hash, email_hash = contact_hashes(phone, email)
+                if (phone_hash, email_hash) == (old_phone_hash, old_email_hash):
+                    continue
+                changed["ids"].append(row_id)
+                changed["phone_hashes"].append(phone_hash)
+                changed["email_hashes"].append(email_hash)
+            if changed["ids"]:
+                await session.execute(_BACKFILL_UPDATE_SQL, changed)
+            # Ранние id уже захешированы: дубль ищется только среди них
+            stats.linked += await link_duplicates(session, [row[0] for row in rows])
+        stats.scanned += len(rows)
+        stats.hashed += len(changed["ids"])
+        stats.batches += 1
+        after_id = rows[-1][0]
+        if len(rows) < batch_size:
+            break
+    stats.elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+    logger.info("Contact hash backfill finished", extra=stats.as_dict())
+    return stats
@@ -0,0 +1,135 @@
+"""Cache of assistant answers to repeated vacancy FAQ questions.
+
+Only short questions about a known FAQ topic (pay, schedule) are cached;
+anything personal or long still goes to the assistant. Keys are the
+vacancy, the policy version and a hash of the normalized question tokens.
+Cached answers must come from a run that saw only the vacancy and the
+question, never a candidate's own thread. Workplace questions are not cached: the answer
+depends on the candidate's city, which the key does not carry.
+"""
+
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from app.hr.policy import policy_version
+from app.hr.routing import normalize, word_stem
+
+# Тема вопроса по основе слова: «зарплата», «платят», «смены», «часов».
+# Основы полные, чтобы «платформа», «сменить» и «часто» не считались вопросом
+FAQ_TOPICS: dict[str, re.Pattern[str]] = {
+    "pay": re.compile(
+        r"^(?:зарплат|оплат|выплат|заработ|доход|ставк|плат(?:я|и[мт]|ишь)|зп$)"
+    ),
+    "schedule": re.compile(
+        r"^(?:график|выходн|сменн|смен(?:[аеуы]|ой|ам|ах)$|час(?:а|ов)?$)"
+    ),
+}
+
+# Слова, не меняющие смысла вопроса: «а сколько у вас платят?» = «сколько платят»
+STOP_WORDS = set(
+    "а и у в на по с вас вы мне я ли же подскажите скажите пожалуйста "
+    "здравствуйте добрый день привет вообще там это какой какая какие".split()
+)
+
+MAX_QUESTION_WORDS = 12
+
+
+def faq_topic(words: list[str]) -> Optional[str]:
+    for topic, pattern in FAQ_TOPICS.items():
+        if any(pattern.match(word) for word in words):
+            return topic
+    return None
+
+
+def question_key(text_msg: str) -> Optional[str]:
+    """Hash of the normalized question, or None if it is not a cacheable FAQ."""
+    words = normalize(text_msg).split()
+    if not words or len(words) > MAX_QUESTION_WORDS:
+        return None
+    if any(char.isdigit() for word in words for char in word):
+        return None  # цифры — почти всегда личные данные или уточнения
+    if faq_topic(words) is None:
+        return None
+    tokens = sorted({word_stem(word) for word in words if word not in STOP_WORDS})
+    return hashlib.sha1(" ".join(tokens).encode()).hexdigest()[:16]
+
+
+class FaqCache:
+    """TTL + LRU cache of answers scoped by vacancy and policy version.
+
+    The policy version is re-read at most every ``version_check`` seconds;
+    when the spec or the prompt changes, every cached answer is dropped and
+    answers still being generated land under the old, unreachable version.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        version_check: float = 5.0,
+        version: Callable[[], str] = policy_version,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._version_check = version_check
+        self._version_fn = version
+        self._version = version()
+        self._checked_at = time.monotonic()
+        self._data: OrderedDict[tuple[str, str, str], tuple[str, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def key(
+        self, vacancy_key: Optional[str], text_msg: str
+    ) -> Optional[tuple[str, str, str]]:
+        if not vacancy_key or self.max_size <= 0:
+            return None
+        question = question_key(text_msg)
+        if question is None:
+            return None
+        self._refresh_version()
+        return (vacancy_key, self._version, question)
+
+    def _refresh_version(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < self._version_check:
+            return
+        self._checked_at = now
+        version = self._version_fn()
+        if version != self._version:
+            self._version = version
+            self._data.clear()
+            self.invalidations += 1
+
+    def get(self, key: tuple[str, str, str]) -> Optional[str]:
+        item = self._data.get(key)
+        if item is None or item[1] < time.monotonic():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[0]
+
+    def set(self, key: tuple[str, str, str], answer: str) -> None:
+        self._data[key] = (answer, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def stats(self) -> dict[str, object]:
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "policy_version": self._version,
+        }
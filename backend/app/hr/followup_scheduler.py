@@ -0,0 +1,265 @@
+"""In-process follow-up scheduler.
+
+One replica (the holder of a Postgres advisory lock) keeps the follow-up
+tasks due within the next ``FOLLOWUP_HORIZON`` seconds on a timer wheel and
+runs each one when its second comes. The wheel is filled from the DB once,
+then kept in sync incrementally: tasks entering the horizon window and rows
+changed since the last sync (by ``updated_at``). ``/jobs/followup`` stays
+as a catch-up path.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from app.core.config import settings
+from app.core.db import SessionLocal, engine
+from app.core.timer_wheel import TimerWheel
+from app.hr.followups import run_due_followups
+from app.hr.policy import get_policy_spec
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+logger = logging.getLogger(__name__)
+
+_LEADER_LOCK_KEY = 7_305_818_413
+PAGE_SIZE = 5_000
+# Запас на коммиты, завершившиеся после нашего чтения, и расхождение часов
+SYNC_OVERLAP = timedelta(seconds=60)
+CATCHUP_INTERVAL = 600.0  # задачи, чьи таймеры сработали, но не были обработаны
+
+_WINDOW_SQL = text("""
+    SELECT id, due_at FROM followup_tasks
+    WHERE completed = false
+      AND due_at > :start AND due_at <= :end
+      AND (due_at, id) > (:after_due, :after_id)
+      AND plan_id IS NOT NULL
+    ORDER BY due_at, id
+    LIMIT :batch
+    """)
+
+# Сдвинутые за горизонт не берём: их таймер сработает вхолостую
+_CHANGED_SQL = text("""
+    SELECT id, due_at, completed OR plan_id IS NULL, updated_at
+    FROM followup_tasks
+    WHERE updated_at > :since
+      AND (updated_at, id) > (:after_at, :after_id)
+      AND (completed OR plan_id IS NULL OR due_at <= :end)
+    ORDER BY updated_at, id
+    LIMIT :batch
+    """)
+
+
+def _epoch(value: datetime) -> float:
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _utc(epoch: float) -> datetime:
+    return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None)
+
+
+class FollowUpScheduler:
+    """Fires follow-up tasks at their ``due_at`` from an in-memory timer wheel."""
+
+    def __init__(self, horizon: float, resync_interval: float, tick: float = 1.0):
+        self.horizon = horizon
+        self.resync_interval = resync_interval
+        self.tick = tick
+        self.wheel: Optional[TimerWheel] = None
+        self.fired = 0
+        self.sent = 0
+        self.resyncs = 0
+        self._window_end: Optional[datetime] = None
+        self._synced_at = datetime.min
+        # Недавно сработавшие (id -> due_at): перекрытие синхронизации их не вернёт
+        self._recent: dict[int, float] = {}
+        self._lock_conn: Optional[AsyncConnection] = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def leader(self) -> bool:
+        return self._lock_conn is not None
+
+    async def _acquire_leadership(self) -> bool:
+        conn = await engine.connect()
+        try:
+            await conn.execution_options(isolation_level="AUTOCOMMIT")
+            got = await conn.scalar(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": _LEADER_LOCK_KEY}
+            )
+        except Exception:
+            await conn.close()
+            raise
+        if not got:
+            await conn.close()
+            return False
+        # Блокировка сессионная: живёт, пока открыто это соединение
+        self._lock_conn = conn
+        now = time.time()
+        self.wheel = TimerWheel(self.tick, int(self.horizon / self.tick), now)
+        self._window_end = None
+        self._synced_at = datetime.utcnow() - SYNC_OVERLAP
+        logger.info("Follow-up scheduler: leadership acquired")
+        return True
+
+    async def _release_leadership(self) -> None:
+        conn, self._lock_conn = self._lock_conn, None
+        self.wheel = None
+        self._recent.clear()
+        if conn is None:
+            return
+        try:
+            await conn.execute(
+                text("SELECT pg_advisory_unlock(:key)"), {"key": _LEADER_LOCK_KEY}
+            )
+        except Exception:  # pragma: no cover - соединение уже потеряно
+            pass
+        await conn.close()
+
+    async def _load_window(self) -> int:
+        """Schedule tasks whose due_at entered the horizon since the last load."""
+        assert self.wheel is not None
+        start = self._window_end or datetime.min
+        end = _utc(self.wheel.horizon)
+        loaded = 0
+        after_due, after_id = datetime.min, 0
+        while True:
+            async with SessionLocal() as session:
+                res = await session.execute(
+                    _WINDOW_SQL,
+                    {
+                        "start": start,
+                        "end": end,
+                        "after_due": after_due,
+                        "after_id": after_id,
+                        "batch": PAGE_SIZE,
+                    },
+                )
+                rows = res.all()
+            for task_id, due_at in rows:
+                loaded += self.wheel.schedule(task_id, _epoch(due_at))
+            if len(rows) < PAGE_SIZE:
+                break
+            after_due, after_id = rows[-1]
+        self._window_end = end
+        return loaded
+
+    async def _sync_changes(self) -> None:
+        """Apply rows changed since the last sync: reschedule or cancel."""
+        assert self.wheel is not None
+        since = self._synced_at
+        latest = since
+        after_at, after_id = datetime.min, 0
+        while True:
+            async with SessionLocal() as session:
+                res = await session.execute(
+                    _CHANGED_SQL,
+                    {
+                        "since": since,
+                        "end": self._window_end,
+                        "after_at": after_at,
+                        "after_id": after_id,
+                        "batch": PAGE_SIZE,
+                    },
+                )
+                rows = res.all()
+            for task_id, due_at, closed, updated_at in rows:
+                if closed or due_at is None:
+                    self.wheel.cancel(task_id)
+                elif self._recent.get(task_id) != _epoch(due_at):
+                    self.wheel.schedule(task_id, _epoch(due_at))
+                latest = max(latest, updated_at)
+            if len(rows) < PAGE_SIZE:
+                break
+            after_at, after_id = rows[-1][3], rows[-1][0]
+        self._synced_at = latest - SYNC_OVERLAP
+        stale = time.time() - 2 * SYNC_OVERLAP.total_seconds()
+        self._recent = {k: v for k, v in self._recent.items() if v >= stale}
+
+    async def resync(self) -> None:
+        await self._lock_conn.execute(text("SELECT 1"))  # блокировка ещё наша?
+        await self._load_window()
+        await self._sync_changes()
+        self.resyncs += 1
+
+    async def _fire(self, fired: list[tuple[Any, float]]) -> None:
+        self.fired += len(fired)
+        self._recent.update(fired)
+        stats = await run_due_followups(task_ids=[task_id for task_id, _ in fired])
+        self.sent += stats.sent
+
+    def stats(self) -> dict[str, object]:
+        return {
+            "leader": self.leader,
+            "scheduled": len(self.wheel) if self.wheel is not None else 0,
+            "fired": self.fired,
+            "sent": self.sent,
+            "resyncs": self.resyncs,
+        }
+
+    def start(self) -> None:
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(), name="followup-scheduler")
+
+    async def stop(self) -> None:
+        self._stopping = True
+        self._wakeup.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._release_leadership()
+
+    async def _run(self) -> None:
+        next_resync = next_catchup = 0.0
+        while not self._stopping:
+            try:
+                if not self.leader and not await self._acquire_leadership():
+                    await self._sleep(self.resync_interval)
+                    continue
+                now = time.time()
+                if now >= next_resync:
+                    await self.resync()
+                    next_resync = now + self.resync_interval
+                if now >= next_catchup:
+                    await run_due_followups()
+                    next_catchup = now + CATCHUP_INTERVAL
+                fired = self.wheel.advance(time.time())
+                if fired:
+                    await self._fire(fired)
+            except Exception as exc:
+                logger.warning("Follow-up scheduler failed: %s", exc)
+                await self._release_leadership()
+                next_resync = next_catchup = 0.0
+                await self._sleep(self.resync_interval)
+                continue
+            await self._sleep(self.tick - time.time() % self.tick)
+
+    async def _sleep(self, seconds: float) -> None:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+
+followup_scheduler = FollowUpScheduler(
+    horizon=settings.followup_horizon,
+    resync_interval=settings.followup_resync_interval,
+)
+
+
+def start_followup_scheduler() -> Optional[FollowUpScheduler]:
+    if not settings.followup_scheduler_enabled:
+        return None
+    if not (get_policy_spec().get("followups") or {}).get("enabled"):
+        return None
+    followup_scheduler.start()
+    return followup_scheduler
+
+
+async def stop_followup_scheduler() -> None:
+    await followup_scheduler.stop()
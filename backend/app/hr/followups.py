@@ -0,0 +1,443 @@
+"""Follow-up reminders driven by ``followups.plans`` of the policy spec.
+
+Due ``followup_tasks`` with a ``plan_id`` are read in keyset order over
+``(completed, due_at, id)``, a batch at a time, so a run over any number of
+tasks keeps one batch in memory. Each task either gets the next template of
+its plan (attempts + 1, due again in ``after_hours``), is closed because the
+candidate left the plan's status, or, after ``max_attempts``, is closed and
+the candidate moves to ``on_exhausted.new_status``. A task of a duplicate
+candidate is handed over to the primary record, unless the primary already
+has an open task of the same plan or for the same chat.
+
+Reminders go to the Telegram outbox in the batch transaction. With the
+outbox disabled they are sent directly, but only after the batch commits:
+the reschedule is the claim, and a failed send puts the task back.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.core.outbox import enqueue_many, outbox
+from app.core.telegram_client import telegram
+from app.hr.models import CandidateStatus
+from app.hr.policy import get_policy_spec, status_transition_allowed
+from app.integrations.crm_outbox import (
+    StatusFlowError,
+    crm_outbox,
+    enqueue_crm,
+    enqueue_status,
+)
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+# Статусы спецификации -> CandidateStatus
+SPEC_STATUSES: dict[str, CandidateStatus] = {
+    "new": CandidateStatus.NEW,
+    "screening": CandidateStatus.SCREENING,
+    "needs_clarification": CandidateStatus.NEEDS_CLARIFICATION,
+    "qualified": CandidateStatus.QUALIFIED,
+    "scheduled": CandidateStatus.INTERVIEW_SCHEDULED,
+    "waiting_docs": CandidateStatus.DOCS_PENDING,
+    "rejected": CandidateStatus.REJECTED,
+    "escalated": CandidateStatus.ESCALATED,
+}
+
+SEND_CONCURRENCY = 8  # прямые отправки, когда outbox выключен
+
+# Строки пачки блокируются до коммита: параллельный прогон их пропустит
+_DUE_QUERY = """
+    SELECT t.id, t.candidate_id, t.chat_id, t.plan_id, t.attempts, t.due_at,
+           c.status, c.duplicate_of_id,
+           CASE WHEN c.duplicate_of_id IS NULL THEN false ELSE EXISTS (
+               SELECT 1 FROM followup_tasks p
+               WHERE p.candidate_id = c.duplicate_of_id
+                 AND p.completed = false
+                 AND (p.plan_id = t.plan_id OR p.chat_id = t.chat_id)
+           ) END AS primary_covered
+    FROM followup_tasks t
+    JOIN candidates c ON c.id = t.candidate_id
+    WHERE t.completed = false
+      AND t.due_at <= :now
+      AND (t.due_at, t.id) > (:after_due, :after_id)
+      AND t.plan_id IS NOT NULL
+      {extra}
+    ORDER BY t.due_at, t.id
+    LIMIT :batch
+    FOR UPDATE OF t SKIP LOCKED
+    """
+_DUE_SQL = text(_DUE_QUERY.format(extra=""))
+# Только сработавшие таймеры планировщика
+_DUE_IDS_SQL = text(_DUE_QUERY.format(extra="AND t.id = ANY(CAST(:ids AS INT[]))"))
+
+_RESCHEDULE_SQL = text("""
+    UPDATE followup_tasks AS t
+    SET attempts = v.attempts, due_at = v.due_at, updated_at = :now
+    FROM unnest(CAST(:ids AS INT[]), CAST(:attempts AS INT[]),
+                CAST(:due AS TIMESTAMP[])) AS v(id, attempts, due_at)
+    WHERE t.id = v.id
+    """)
+
+# Неотправленное напоминание снова к сроку, если задачу никто не трогал
+_RESTORE_SQL = text("""
+    UPDATE followup_tasks AS t
+    SET attempts = v.attempts, due_at = v.due_at, updated_at = :now
+    FROM unnest(CAST(:ids AS INT[]), CAST(:attempts AS INT[]),
+                CAST(:claimed AS INT[]), CAST(:due AS TIMESTAMP[]))
+        AS v(id, attempts, claimed, due_at)
+    WHERE t.id = v.id AND t.attempts = v.claimed AND t.completed = false
+    """)
+
+# Задача дубля переходит к основной записи кандидата с тем же счётчиком попыток
+_REPOINT_SQL = text("""
+    UPDATE followup_tasks AS t
+    SET candidate_id = v.candidate_id, updated_at = :now
+    FROM unnest(CAST(:ids AS INT[]), CAST(:candidates AS INT[]))
+        AS v(id, candidate_id)
+    WHERE t.id = v.id
+    """)
+
+_COMPLETE_SQL = text("""
+    UPDATE followup_tasks AS t
+    SET completed = true,
+        notes = concat_ws(E'\\n', t.notes, v.note),
+        updated_at = :now
+    FROM unnest(CAST(:ids AS INT[]), CAST(:notes AS TEXT[])) AS v(id, note)
+    WHERE t.id = v.id
+    """)
+
+# Переводим только из статуса плана: кандидата могли уже передвинуть вручную
+_CANDIDATE_STATUS_SQL = text("""
+    UPDATE candidates AS c
+    SET status = CAST(v.status AS candidatestatus), updated_at = :now
+    FROM unnest(CAST(:ids AS INT[]), CAST(:statuses AS TEXT[]),
+                CAST(:expected AS TEXT[])) AS v(id, status, expected)
+    WHERE c.id = v.id AND c.status = CAST(v.expected AS candidatestatus)
+    RETURNING c.id
+    """)
+
+
+@dataclass(frozen=True)
+class FollowUpPlan:
+    plan_id: str
+    status: Optional[CandidateStatus]
+    after_hours: float
+    max_attempts: int
+    templates: tuple[str, ...]
+    exhausted_status: Optional[CandidateStatus] = None
+    exhausted_note: str = ""
+
+    def template(self, attempt: int) -> str:
+        return self.templates[min(attempt, len(self.templates) - 1)]
+
+
+@dataclass
+class DueTask:
+    id: int
+    candidate_id: int
+    chat_id: Optional[int]
+    plan_id: str
+    attempts: int
+    due_at: datetime
+    status: Optional[str]  # имя CandidateStatus, как его хранит Enum-колонка
+    duplicate_of: Optional[int] = None
+    # У основной записи уже есть открытая задача того же плана или чата
+    primary_covered: bool = False
+
+
+@dataclass
+class Step:
+    """What to do with one due task."""
+
+    send: Optional[str] = None
+    attempts: int = 0
+    due_at: Optional[datetime] = None
+    complete_note: Optional[str] = None
+    new_status: Optional[CandidateStatus] = None
+    repoint_to: Optional[int] = None
+
+
+@dataclass
+class FollowUpStats:
+    processed: int = 0
+    sent: int = 0
+    completed: int = 0
+    repointed: int = 0
+    status_changed: int = 0
+    send_failed: int = 0
+    batches: int = 0
+    budget_exhausted: bool = False
+    plans: dict[str, int] = field(default_factory=dict)
+
+    def as_dict(self) -> dict[str, object]:
+        return dict(self.__dict__)
+
+
+def load_plans(spec: dict[str, Any]) -> dict[str, FollowUpPlan]:
+    """Parse ``followups.plans``; plans without templates are ignored."""
+    plans: dict[str, FollowUpPlan] = {}
+    for raw in (spec.get("followups") or {}).get("plans") or []:
+        templates = tuple(t for t in raw.get("templates") or [] if t)
+        if not raw.get("plan_id") or not templates:
+            continue
+        status = raw.get("status")
+        exhausted = raw.get("on_exhausted") or {}
+        target = exhausted.get("new_status")
+        if target and status and not status_transition_allowed(status, target, spec):
+            logger.warning(
+                "Follow-up plan %s: %s -> %s is not in status_flow",
+                raw["plan_id"],
+                status,
+                target,
+            )
+            target = None
+        plans[raw["plan_id"]] = FollowUpPlan(
+            plan_id=raw["plan_id"],
+            status=SPEC_STATUSES.get(status) if status else None,
+            after_hours=float(raw.get("after_hours") or 24),
+            max_attempts=int(raw.get("max_attempts") or len(templates)),
+            templates=templates,
+            exhausted_status=SPEC_STATUSES.get(target) if target else None,
+            exhausted_note=exhausted.get("note") or "",
+        )
+    return plans
+
+
+def plan_step(task: DueTask, plan: FollowUpPlan, now: datetime) -> Step:
+    if task.duplicate_of is not None:
+        # Напоминания получает только основная запись кандидата
+        if task.primary_covered:
+            return Step(
+                complete_note=(
+                    f"Follow-up закрыт: дубль кандидата #{task.duplicate_of}, "
+                    "у основной записи уже есть такое напоминание"
+                )
+            )
+        return Step(repoint_to=task.duplicate_of)
+    if plan.status is not None and task.status != plan.status.name:
+        return Step(complete_note="Follow-up закрыт: статус кандидата изменился")
+    if task.attempts >= plan.max_attempts:
+        return Step(
+            complete_note=plan.exhausted_note or "Follow-up попытки исчерпаны",
+            new_status=plan.exhausted_status,
+        )
+    if task.chat_id is None:
+        return Step(complete_note="Follow-up закрыт: нет Telegram-чата кандидата")
+    return Step(
+        send=plan.template(task.attempts),
+        attempts=task.attempts + 1,
+        due_at=now + timedelta(hours=plan.after_hours),
+    )
+
+
+async def _send_direct(token: str, messages: list[tuple[int, str]]) -> list[bool]:
+    semaphore = asyncio.Semaphore(SEND_CONCURRENCY)
+
+    async def send(chat_id: int, text_msg: str) -> bool:
+        async with semaphore:
+            try:
+                data = await telegram.send_message(token, chat_id, text_msg)
+            except Exception as exc:
+                logger.warning("Follow-up send failed: %s", exc)
+                return False
+            return bool(data.get("ok"))
+
+    return await asyncio.gather(*(send(cid, body) for cid, body in messages))
+
+
+async def _process_batch(
+    tasks: list[DueTask],
+    plans: dict[str, FollowUpPlan],
+    now: datetime,
+    session: AsyncSession,
+    stats: FollowUpStats,
+) -> list[tuple[DueTask, Step]]:
+    """Apply the batch's steps in its transaction.
+
+    Returns the reminders still to send directly once it commits.
+    """
+    steps = []
+    for task in tasks:
+        plan = plans.get(task.plan_id)
+        if plan is None:
+            continue  # план убрали из спецификации — задачу не трогаем
+        steps.append((task, plan, plan_step(task, plan, now)))
+        stats.plans[plan.plan_id] = stats.plans.get(plan.plan_id, 0) + 1
+    stats.processed += len(steps)
+
+    handed = [(task, step) for task, _, step in steps if step.repoint_to is not None]
+    if handed:
+        # Следующий прогон увидит задачу уже со статусом основной записи
+        await session.execute(
+            _REPOINT_SQL,
+            {
+                "now": now,
+                "ids": [task.id for task, _ in handed],
+                "candidates": [step.repoint_to for _, step in handed],
+            },
+        )
+        stats.repointed += len(handed)
+
+    sending = [(task, step) for task, _, step in steps if step.send is not None]
+    if sending:
+        # Сдвиг срока и есть захват: до коммита задачу не видят другие прогоны,
+        # после — она уже не к сроку
+        await session.execute(
+            _RESCHEDULE_SQL,
+            {
+                "now": now,
+                "ids": [task.id for task, _ in sending],
+                "attempts": [step.attempts for _, step in sending],
+                "due": [step.due_at for _, step in sending],
+            },
+        )
+    direct: list[tuple[DueTask, Step]] = []
+    if settings.outbox_enabled:
+        # В той же транзакции: либо напоминание в очереди и задача сдвинута, либо ничего
+        await enqueue_many(
+            session,
+            [task.chat_id for task, _ in sending],
+            [step.send for _, step in sending],
+        )
+        stats.sent += len(sending)
+    else:
+        direct = sending
+
+    done = [(task, plan, step) for task, plan, step in steps if step.complete_note]
+    if done:
+        await session.execute(
+            _COMPLETE_SQL,
+            {
+                "now": now,
+                "ids": [task.id for task, _, _ in done],
+                "notes": [step.complete_note for _, _, step in done],
+            },
+        )
+        stats.completed += len(done)
+    moved = [(task, plan, step) for task, plan, step in done if step.new_status]
+    if moved:
+        res = await session.execute(
+            _CANDIDATE_STATUS_SQL,
+            {
+                "now": now,
+                "ids": [task.candidate_id for task, _, _ in moved],
+                "statuses": [step.new_status.name for _, _, step in moved],
+                "expected": [
+                    plan.status.name if plan.status else task.status
+                    for task, plan, _ in moved
+                ],
+            },
+        )
+        changed = {row[0] for row in res}
+        stats.status_changed += len(changed)
+        # Смена статуса уходит в CRM через crm_outbox — в этой же транзакции
+        for task, _, step in moved:
+            if task.candidate_id not in changed:
+                continue
+            try:
+                await enqueue_status(session, task.candidate_id, step.new_status.value)
+            except StatusFlowError as exc:
+                logger.warning("Candidate %s: %s", task.candidate_id, exc)
+            await enqueue_crm(
+                session,
+                "attach_note",
+                {"text": step.complete_note},
+                candidate_id=task.candidate_id,
+            )
+    return direct
+
+
+async def _deliver_direct(
+    sending: list[tuple[DueTask, Step]],
+    now: datetime,
+    stats: FollowUpStats,
+    token: str,
+) -> None:
+    """Send claimed reminders after their batch committed.
+
+    Telegram latency no longer holds the batch's row locks. Failed sends put
+    their task back as it was, so the next run retries it; a crash between
+    the commit and the send loses that one reminder instead of repeating it.
+    """
+    delivered = await _send_direct(
+        token, [(task.chat_id, step.send) for task, step in sending]
+    )
+    failed = [pair for pair, ok in zip(sending, delivered) if not ok]
+    stats.sent += len(sending) - len(failed)
+    stats.send_failed += len(failed)
+    if not failed:
+        return
+    async with SessionLocal() as session, session.begin():
+        await session.execute(
+            _RESTORE_SQL,
+            {
+                "now": now,
+                "ids": [task.id for task, _ in failed],
+                "attempts": [task.attempts for task, _ in failed],
+                "claimed": [step.attempts for _, step in failed],
+                "due": [task.due_at for task, _ in failed],
+            },
+        )
+
+
+async def run_due_followups(
+    now: Optional[datetime] = None,
+    batch_size: Optional[int] = None,
+    budget_seconds: Optional[float] = None,
+    spec: Optional[dict[str, Any]] = None,
+    task_ids: Optional[list[int]] = None,
+) -> FollowUpStats:
+    """Work through due follow-up tasks until none are left or time runs out.
+
+    Tasks not reached within ``budget_seconds`` stay due for the next run.
+    ``task_ids`` limits the run to those tasks (still only if they are due).
+    """
+    now = now or datetime.utcnow()
+    batch_size = batch_size or settings.followup_batch_size
+    budget = settings.followup_run_seconds if budget_seconds is None else budget_seconds
+    plans = load_plans(get_policy_spec() if spec is None else spec)
+    token = settings.telegram_bot_token or ""
+    stats = FollowUpStats()
+    if not plans:
+        return stats
+
+    deadline = time.monotonic() + budget
+    after_due, after_id = datetime.min, 0
+    while True:
+        if time.monotonic() >= deadline:
+            stats.budget_exhausted = True
+            break
+        async with SessionLocal() as session, session.begin():
+            params = {
+                "now": now,
+                "after_due": after_due,
+                "after_id": after_id,
+                "batch": batch_size,
+            }
+            if task_ids is None:
+                res = await session.execute(_DUE_SQL, params)
+            else:
+                res = await session.execute(_DUE_IDS_SQL, {**params, "ids": task_ids})
+            tasks = [DueTask(*row) for row in res]
+            if not tasks:
+                break
+            direct = await _process_batch(tasks, plans, now, session, stats)
+        if direct:
+            await _deliver_direct(direct, now, stats, token)
+        stats.batches += 1
+        if settings.outbox_enabled and stats.sent:
+            outbox.notify()
+        if stats.status_changed:
+            crm_outbox.notify()
+        after_due, after_id = tasks[-1].due_at, tasks[-1].id
+        if len(tasks) < batch_size:
+            break
+    logger.info("Follow-up run finished", extra=stats.as_dict())
+    return stats
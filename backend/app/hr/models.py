@@ -2,8 +2,8 @@ import enum
 from datetime import datetime
 
 from app.core.db import Base
-from sqlalchemy import (Boolean, Column, DateTime, Enum, ForeignKey, Integer,
-                        String, Text)
+from sqlalchemy import (BigInteger, Boolean, Column, DateTime, Enum, ForeignKey,
+                        Index, Integer, String, Text)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 
@@ -23,6 +23,9 @@ class CandidateStatus(str, enum.Enum):
     REJECTED = "rejected"
     NO_RESPONSE = "no_response"
     DOCS_PENDING = "docs_pending"
+    ESCALATED = "escalated"
+    NEEDS_CLARIFICATION = "needs_clarification"
+    QUALIFIED = "qualified"
 
 
 class Vacancy(Base):
@@ -49,6 +52,16 @@ class Vacancy(Base):
 
 class Candidate(Base):
     __tablename__ = "candidates"
+    # id отклика у источника (Avito); повторный забор обновляет ту же строку.
+    # Поиск дублей — по HMAC нормализованных телефона и email (app.hr.dedupe)
+    __table_args__ = (
+        Index(
+            "ix_candidates_source_external_id", "source", "external_id", unique=True
+        ),
+        Index("ix_candidates_phone_hash", "phone_hash"),
+        Index("ix_candidates_email_hash", "email_hash"),
+        Index("ix_candidates_duplicate_of_id", "duplicate_of_id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     full_name: Mapped[str] = mapped_column(String(255), nullable=False)
@@ -61,6 +74,12 @@ class Candidate(Base):
         Enum(CandidateStatus), nullable=False, default=CandidateStatus.NEW
     )
     notes: Mapped[str | None] = mapped_column(Text, nullable=True)
+    external_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    phone_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    email_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    duplicate_of_id: Mapped[int | None] = mapped_column(
+        ForeignKey("candidates.id", ondelete="SET NULL"), nullable=True
+    )
     vacancy_id: Mapped[int | None] = mapped_column(
         ForeignKey("vacancies.id", ondelete="SET NULL"), nullable=True
     )
@@ -107,6 +126,14 @@ class InterviewSlot(Base):
 
 class FollowUpTask(Base):
     __tablename__ = "followup_tasks"
+    # Выборка созревших задач идёт по (completed, due_at, id) keyset-пагинацией,
+    # досинхронизация планировщика — по (updated_at, id), задачи основной записи
+    # кандидата при передаче от дубля — по (candidate_id, plan_id)
+    __table_args__ = (
+        Index("ix_followup_tasks_due", "completed", "due_at", "id"),
+        Index("ix_followup_tasks_updated_at", "updated_at", "id"),
+        Index("ix_followup_tasks_candidate", "candidate_id", "plan_id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     candidate_id: Mapped[int] = mapped_column(
@@ -116,6 +143,12 @@ class FollowUpTask(Base):
     due_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     completed: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
     notes: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # followups.plans[].plan_id спецификации; без плана задача движком не трогается
+    plan_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    attempts: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False
+    )
+    chat_id: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.utcnow, nullable=False
     )
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Any, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SPEC_FILENAME = "hr_policy_spec.json"
+PROMPT_PATH = Path("prompts") / "hr_agent_system.md"
+
+_spec: Optional[dict[str, Any]] = None
+
+
+def _docs_file(relative: Path | str) -> Optional[Path]:
+    here = Path(__file__).resolve()
+    # <repo>/backend/app/hr/policy.py локально, /app/app/hr/policy.py в образе
+    for root in (here.parents[3], here.parents[2]):
+        candidate = root / "docs" / relative
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+def policy_spec_path() -> Optional[Path]:
+    """Locate hr_policy_spec.json: POLICY_SPEC_PATH, repo docs/ or image docs/."""
+    if settings.policy_spec_path:
+        return Path(settings.policy_spec_path)
+    return _docs_file(SPEC_FILENAME)
+
+
+def policy_version() -> str:
+    """Short fingerprint of the policy spec and the assistant prompt files.
+
+    Built from file size and mtime, so editing either file changes it.
+    """
+    parts = []
+    for path in (policy_spec_path(), _docs_file(PROMPT_PATH)):
+        try:
+            stat = path.stat() if path is not None else None
+        except OSError:
+            stat = None
+        parts.append(f"{path}:{stat.st_size}:{stat.st_mtime_ns}" if stat else "-")
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:12]
+
+
+def load_policy_spec(path: Optional[Path] = None) -> dict[str, Any]:
+    path = path or policy_spec_path()
+    if path is None:
+        raise FileNotFoundError(f"{SPEC_FILENAME} not found")
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def get_policy_spec() -> dict[str, Any]:
+    """Return the policy spec loaded once per process ({} if unavailable)."""
+    global _spec
+    if _spec is None:
+        try:
+            _spec = load_policy_spec()
+        except (OSError, ValueError) as exc:
+            logger.warning("HR policy spec unavailable: %s", exc)
+            _spec = {}
+    return _spec
+
+
+def candidate_message(reason_code: str, **values: str) -> Optional[str]:
+    """Render ``reason_codes[code].candidate_message_template`` from the spec."""
+    reason = (get_policy_spec().get("reason_codes") or {}).get(reason_code) or {}
+    template = reason.get("candidate_message_template")
+    if not template:
+        return None
+    try:
+        return template.format(**values)
+    except (KeyError, IndexError):
+        return template
+
+
+# Значения CandidateStatus, которые в спецификации называются иначе
+SPEC_STATUS_ALIASES = {
+    "interview_scheduled": "scheduled",
+    "docs_pending": "waiting_docs",
+}
+
+
+def status_transition_allowed(
+    source: str, target: str, spec: Optional[dict[str, Any]] = None
+) -> bool:
+    """Check a status change against ``global.status_flow`` of the spec.
+
+    Takes CandidateStatus values or spec status names; statuses the flow
+    does not list (offer, hired, ...) are not restricted.
+    """
+    spec = get_policy_spec() if spec is None else spec
+    rules = spec.get("global") or {}
+    flow = rules.get("status_flow") or {}
+    known = set(flow) | set(rules.get("allowed_statuses") or [])
+    source = SPEC_STATUS_ALIASES.get(source, source)
+    target = SPEC_STATUS_ALIASES.get(target, target)
+    if source not in flow or target not in known:
+        return True
+    return target in (flow.get(source) or [])
@@ -0,0 +1,218 @@
+"""Local pre-routing of candidate messages by the HR policy spec.
+
+``routing.rules`` of hr_policy_spec.json are compiled into one Aho–Corasick
+automaton over normalized Russian keywords, so every rule is checked in a
+single pass over the message without calling the assistant.
+"""
+
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Iterable, Optional
+
+_NON_WORD = re.compile(r"[^\w]+|_")
+_WHEN_KEYWORDS = re.compile(r"any of (\w+)")
+_ACTION = re.compile(r"escalate_to_human\((.*)\)")
+
+_VOWELS = set("аеиоуыэюяйь")
+_CONSONANT_ENDINGS = ("", "а", "у", "ом", "е", "ы", "ов", "ам", "ами", "ах")
+_A_ENDINGS = ("а", "ы", "е", "у", "ой", "ою", "", "ам", "ами", "ах")
+_IA_ENDINGS = ("ия", "ии", "ию", "ией", "иею", "ий", "иям", "иями", "иях")
+
+PRIORITY_RANK = {"low": 0, "normal": 1, "high": 2, "urgent": 3}
+
+# Усилители сами по себе правило не включают: «срочно ищу работу» пишет
+# обычный кандидат, а «срочно, я директор» — уже VIP
+INTENSIFIERS = frozenset({"срочно"})
+
+
+def normalize(text: str) -> str:
+    """Casefold, fold ё into е and keep only letters/digits split by spaces."""
+    text = text.casefold().replace("ё", "е")
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+def word_stem(keyword: str) -> str:
+    # Гласные окончания отбрасываем: «угроза» → «угроз», «пеший» → «пеш»
+    if len(keyword) < 5:
+        return keyword
+    stem = keyword
+    while len(stem) > 3 and stem[-1] in _VOWELS:
+        stem = stem[:-1]
+    return stem
+
+
+def word_forms(keyword: str) -> set[str]:
+    """Case forms of a single-word noun keyword; other keywords stay as is.
+
+    Only whole words are matched, so the forms are listed explicitly:
+    «суд» gives «суда», «судом»… but never «судя», «контракт» never gives
+    «контрактная». Verbs, adverbs and phrases match exactly.
+    """
+    if " " in keyword or len(keyword) < 3:
+        return {keyword}
+    if keyword.endswith("ия"):
+        return {keyword[:-2] + ending for ending in _IA_ENDINGS}
+    if keyword.endswith("а"):
+        return {keyword[:-1] + ending for ending in _A_ENDINGS}
+    if keyword[-1] not in _VOWELS:
+        return {keyword + ending for ending in _CONSONANT_ENDINGS}
+    return {keyword}
+
+
+class KeywordAutomaton:
+    """Aho–Corasick matcher over normalized keywords.
+
+    By default every keyword is expanded into its ``word_forms`` and a form
+    matches only as a whole word (or phrase): «суд» finds «суда» but not
+    «посуда» or «судя». With ``inflect=True`` (vacancy titles) a keyword's
+    ``word_stem`` may be followed by up to three letters of an ending, so
+    «пеший» finds «пешему»; keywords shorter than four letters still match
+    only whole words.
+    """
+
+    def __init__(self, keywords: Iterable[str], inflect: bool = False) -> None:
+        self.keywords: list[str] = []
+        self.inflect = inflect
+        # (форма, индекс ключевого слова, сколько букв окончания допустимо)
+        self._forms: list[tuple[str, int, int]] = []
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list[int]] = [[]]
+        for keyword in keywords:
+            self._add(normalize(keyword))
+        self._build()
+
+    def _add(self, keyword: str) -> None:
+        if not keyword or keyword in self.keywords:
+            return
+        if self.inflect:
+            stem = word_stem(keyword)
+            forms = {stem: 3 if len(keyword) >= 4 else 0}
+        else:
+            forms = dict.fromkeys(word_forms(keyword), 0)
+        for form, max_suffix in sorted(forms.items()):
+            state = 0
+            for char in form:
+                nxt = self._goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][char] = nxt
+                state = nxt
+            self._out[state].append(len(self._forms))
+            self._forms.append((form, len(self.keywords), max_suffix))
+        self.keywords.append(keyword)
+
+    def _build(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                if self._fail[nxt] == nxt:
+                    self._fail[nxt] = 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, normalized: str) -> list[str]:
+        """Return keywords found in already normalized text, in text order."""
+        found: list[str] = []
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for end, char in enumerate(normalized):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if not out[state]:
+                continue
+            tail = normalized.find(" ", end + 1)
+            suffix = (len(normalized) if tail < 0 else tail) - end - 1
+            for index in out[state]:
+                form, keyword, max_suffix = self._forms[index]
+                start = end - len(form) + 1
+                if start > 0 and normalized[start - 1] != " ":
+                    continue
+                if suffix <= max_suffix:
+                    found.append(self.keywords[keyword])
+        return found
+
+
+@dataclass(frozen=True)
+class RouteRule:
+    rule_id: str
+    priority: str
+    reason: str
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    rule_id: str
+    priority: str
+    reason: str
+    keywords: tuple[str, ...]
+
+
+class PolicyRouter:
+    """Compiled ``routing`` section of the policy spec."""
+
+    def __init__(self, routing: dict[str, Any]) -> None:
+        self.rules: list[RouteRule] = []
+        keyword_rules: dict[str, set[int]] = {}
+        for rule in routing.get("rules") or []:
+            when = _WHEN_KEYWORDS.search(rule.get("when", ""))
+            action = _ACTION.search(rule.get("action", ""))
+            if not when or not action:
+                continue
+            args = dict(
+                part.strip().split("=", 1)
+                for part in action.group(1).split(",")
+                if "=" in part
+            )
+            index = len(self.rules)
+            self.rules.append(
+                RouteRule(
+                    rule_id=rule.get("rule_id", f"rule_{index}"),
+                    priority=args.get("priority", "normal"),
+                    reason=args.get("reason", rule.get("rule_id", "")),
+                )
+            )
+            for keyword in routing.get(when.group(1)) or []:
+                keyword_rules.setdefault(normalize(keyword), set()).add(index)
+        self._keyword_rules = keyword_rules
+        self._automaton = KeywordAutomaton(keyword_rules)
+
+    def __bool__(self) -> bool:
+        return bool(self.rules)
+
+    def route(self, text: str) -> Optional[RouteDecision]:
+        """Return the most urgent rule triggered by the message, if any.
+
+        A rule whose only hits are ``INTENSIFIERS`` does not trigger.
+        """
+        hits: dict[int, list[str]] = {}
+        for keyword in self._automaton.find(normalize(text)):
+            for index in self._keyword_rules[keyword]:
+                hits.setdefault(index, []).append(keyword)
+        hits = {
+            index: keywords
+            for index, keywords in hits.items()
+            if not INTENSIFIERS.issuperset(keywords)
+        }
+        if not hits:
+            return None
+        index = max(
+            hits, key=lambda i: (PRIORITY_RANK.get(self.rules[i].priority, 1), -i)
+        )
+        rule = self.rules[index]
+        return RouteDecision(
+            rule_id=rule.rule_id,
+            priority=rule.priority,
+            reason=rule.reason,
+            keywords=tuple(hits[index]),
+        )
@@ -21,6 +21,9 @@ class CandidateStatus(str, Enum):
     REJECTED = "rejected"
     NO_RESPONSE = "no_response"
     DOCS_PENDING = "docs_pending"
+    ESCALATED = "escalated"
+    NEEDS_CLARIFICATION = "needs_clarification"
+    QUALIFIED = "qualified"
 
 
 class VacancyBase(BaseModel):
@@ -73,6 +76,8 @@ class CandidateUpdate(BaseModel):
 
 class CandidateRead(CandidateBase):
     id: int
+    external_id: Optional[str] = None
+    duplicate_of_id: Optional[int] = None
     created_at: datetime
     updated_at: datetime
 
@@ -111,6 +116,9 @@ class FollowUpTaskBase(BaseModel):
     due_at: Optional[datetime] = None
     completed: bool = False
     notes: Optional[str] = None
+    plan_id: Optional[str] = None
+    attempts: int = 0
+    chat_id: Optional[int] = None
 
 
 class FollowUpTaskCreate(FollowUpTaskBase):
@@ -122,6 +130,8 @@ class FollowUpTaskUpdate(BaseModel):
     due_at: Optional[datetime] = None
     completed: Optional[bool] = None
     notes: Optional[str] = None
+    plan_id: Optional[str] = None
+    chat_id: Optional[int] = None
 
 
 class FollowUpTaskRead(FollowUpTaskBase):
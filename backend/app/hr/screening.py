@@ -0,0 +1,366 @@
+"""Deterministic knockout screening by the vacancies of the HR policy spec.
+
+Screening questions tied to ``knockout_rules`` are asked and evaluated
+locally; the assistant only gets free-form dialogue and the turns after
+screening. Per-chat state is the vacancy key plus bitsets of answered and
+passed rules, kept in the ``screening_state`` table.
+"""
+
+import re
+from dataclasses import dataclass, replace
+from typing import Any, Optional
+
+from app.core.db import SessionLocal
+from app.hr.cities import CityIndex
+from app.hr.policy import candidate_message
+from app.hr.routing import KeywordAutomaton, normalize
+from sqlalchemy import text
+
+# Подсказки, по которым вопрос из screening_questions привязывается к правилу
+RULE_HINTS: dict[str, tuple[str, ...]] = {
+    "city_in_hire_list": ("город",),
+    "min_age": ("18", "лет"),
+    "requires_smartphone": ("смартфон", "телефон"),
+    "requires_work_docs": ("документ",),
+    "requires_driver_license": ("прав",),
+    "requires_shift_work": ("смен", "график"),
+    "requires_industrial_sewing": ("машин", "оборудован", "прямострочк"),
+    "requires_pc_or_laptop": ("ноутбук", "пк", "компьютер"),
+    "requires_stable_internet": ("интернет",),
+}
+
+YES_WORDS = {
+    "да",
+    "есть",
+    "имеется",
+    "имею",
+    "конечно",
+    "ага",
+    "угу",
+    "ок",
+    "ok",
+    "готов",
+    "готова",
+    "стабильный",
+    "стабильно",
+    "норм",
+    "нормальный",
+}
+NO_WORDS = {"нет", "неа", "нету", "отсутствует", "нема", "против"}
+SEWING_MACHINES = ("прямострочк", "оверлок", "распошив", "промышлен")
+
+# Слова названий вакансий, которые слишком часто встречаются сами по себе
+GENERIC_TITLE_WORDS = {"центра", "заказов", "звонкам", "поток"}
+
+_CLAUSES = re.compile(r"[,.;!?\n]+")
+_NUMBER = re.compile(r"\b(\d{1,2})\b")
+
+ACTIVE, PASSED, REJECTED = "active", "passed", "rejected"
+
+
+@dataclass(frozen=True)
+class KnockoutRule:
+    rule_id: str
+    type: str
+    value: Any
+    reason_code: str
+    question: str
+    requirement: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Vacancy:
+    key: str
+    title: str
+    hire_cities: tuple[str, ...]
+    rules: tuple[KnockoutRule, ...]
+
+
+@dataclass(frozen=True)
+class ScreeningState:
+    vacancy_key: str
+    answered: int = 0
+    passed: int = 0
+    synced: int = 0
+    status: str = ACTIVE
+
+
+@dataclass(frozen=True)
+class ScreeningTurn:
+    state: ScreeningState
+    # Ответ кандидату без ассистента; None — ход уходит ассистенту
+    reply: Optional[str] = None
+    # Итоги скрининга для треда ассистента, если он их ещё не видел
+    note: Optional[str] = None
+    outcome: str = "unparsed"
+
+
+def _has_prefix(words: list[str], prefixes: tuple[str, ...]) -> bool:
+    return any(word.startswith(prefix) for word in words for prefix in prefixes)
+
+
+def _yes_no(words: list[str]) -> Optional[bool]:
+    """Read a yes/no answer; None if it has neither or both.
+
+    «не» negates only the next word: «не работал» is no, «не против» is
+    yes, and «да не вопрос» mixes both and goes to the assistant.
+    """
+    verdicts = set()
+    negated = False
+    for word in words:
+        if word == "не":
+            negated = True
+            continue
+        if word in YES_WORDS:
+            verdicts.add(not negated)
+        elif word in NO_WORDS:
+            verdicts.add(negated)
+        elif negated:
+            verdicts.add(False)
+        negated = False
+    return verdicts.pop() if len(verdicts) == 1 else None
+
+
+def _question_for(rule_type: str, questions: list[str]) -> Optional[str]:
+    hints = RULE_HINTS.get(rule_type, ())
+    for question in questions:
+        if _has_prefix(normalize(question).split(), hints):
+            return question
+    return None
+
+
+class ScreeningEngine:
+    """Knockout screening compiled from ``vacancies`` of the policy spec."""
+
+    def __init__(self, spec: dict[str, Any]) -> None:
+        locations = spec.get("locations") or {}
+        self.cities = CityIndex.from_spec(spec)
+        self.vacancies: dict[str, Vacancy] = {}
+        title_tokens: dict[str, set[str]] = {}
+        for item in spec.get("vacancies") or []:
+            vacancy = self._compile(item, locations)
+            if not vacancy.rules:
+                continue
+            self.vacancies[vacancy.key] = vacancy
+            for token in normalize(vacancy.title).split():
+                if len(token) >= 4 and token not in GENERIC_TITLE_WORDS:
+                    title_tokens.setdefault(token, set()).add(vacancy.key)
+        self._title_tokens = title_tokens
+        self._titles = KeywordAutomaton(title_tokens, inflect=True)
+
+    def __bool__(self) -> bool:
+        return bool(self.vacancies)
+
+    @staticmethod
+    def _compile(item: dict[str, Any], locations: dict[str, Any]) -> Vacancy:
+        questions = item.get("screening_questions") or []
+        rules = []
+        for rule in item.get("knockout_rules") or []:
+            question = _question_for(rule.get("type", ""), questions)
+            if question is None:
+                continue  # правило без вопроса остаётся ассистенту
+            rules.append(
+                KnockoutRule(
+                    rule_id=rule["rule_id"],
+                    type=rule["type"],
+                    value=rule.get("value"),
+                    reason_code=rule.get("reason_code", "needs_more_info"),
+                    question=question,
+                    requirement=rule.get("requirement"),
+                )
+            )
+        # Вопросы задаём в порядке screening_questions
+        rules.sort(key=lambda r: questions.index(r.question))
+        return Vacancy(
+            key=item["vacancy_key"],
+            title=item.get("title", item["vacancy_key"]),
+            hire_cities=tuple(
+                item.get("hire_cities") or locations.get("hire_cities") or ()
+            ),
+            rules=tuple(rules),
+        )
+
+    def detect_vacancy(self, text_msg: str) -> Optional[Vacancy]:
+        """Pick the vacancy whose title words the message names unambiguously."""
+        scores: dict[str, int] = {}
+        for token in set(self._titles.find(normalize(text_msg))):
+            for key in self._title_tokens[token]:
+                scores[key] = scores.get(key, 0) + 1
+        if not scores:
+            return None
+        best = max(scores.values())
+        leaders = [key for key, score in scores.items() if score == best]
+        return self.vacancies[leaders[0]] if len(leaders) == 1 else None
+
+    def start(self, text_msg: str) -> Optional[ScreeningTurn]:
+        vacancy = self.detect_vacancy(text_msg)
+        if vacancy is None:
+            return None
+        # Первое сообщение — не ответ на вопрос, засчитываем только явные ответы
+        turn = self.step(ScreeningState(vacancy.key), text_msg, answering=False)
+        if turn.outcome == "unparsed":
+            # Вакансия названа, ответов ещё нет — задаём первый вопрос
+            question = vacancy.rules[0].question
+            reply = f"Отлично, вакансия «{vacancy.title}». {question}"
+            return replace(turn, reply=reply, outcome="asked")
+        return turn
+
+    def step(
+        self, state: ScreeningState, text_msg: str, answering: bool = True
+    ) -> ScreeningTurn:
+        """Evaluate one candidate message against the unanswered rules.
+
+        With ``answering`` the message is taken as a reply to the current
+        question, so a bare «да» or «Тула» counts for that question.
+        """
+        vacancy = self.vacancies.get(state.vacancy_key)
+        if vacancy is None or state.status != ACTIVE:
+            return ScreeningTurn(state, note=self._note(state))
+
+        current = self._current(vacancy, state) if answering else None
+        answered, passed = state.answered, state.passed
+        failed: Optional[KnockoutRule] = None
+        for index, rule in enumerate(vacancy.rules):
+            bit = 1 << index
+            if answered & bit:
+                continue
+            verdict = self._evaluate(rule, vacancy, text_msg, index == current)
+            if verdict is None:
+                continue
+            answered |= bit
+            if verdict:
+                passed |= bit
+            elif failed is None:
+                failed = rule
+
+        if answered == state.answered:
+            return ScreeningTurn(state, note=self._note(state))
+
+        if failed is not None:
+            state = replace(state, answered=answered, passed=passed, status=REJECTED)
+            reply = candidate_message(
+                failed.reason_code,
+                hire_cities=", ".join(vacancy.hire_cities),
+                requirement=failed.requirement or "",
+            )
+            if reply:
+                return ScreeningTurn(state, reply=reply, outcome="rejected")
+            return ScreeningTurn(state, note=self._note(state), outcome="rejected")
+
+        state = replace(state, answered=answered, passed=passed)
+        following = self._current(vacancy, state)
+        if following is None:
+            state = replace(state, status=PASSED)
+            return ScreeningTurn(state, note=self._note(state), outcome="passed")
+        reply = f"Принял. {vacancy.rules[following].question}"
+        return ScreeningTurn(state, reply=reply, outcome="asked")
+
+    def synced(self, state: ScreeningState) -> ScreeningState:
+        return replace(state, synced=state.answered)
+
+    @staticmethod
+    def _current(vacancy: Vacancy, state: ScreeningState) -> Optional[int]:
+        for index in range(len(vacancy.rules)):
+            if not state.answered & (1 << index):
+                return index
+        return None
+
+    def _note(self, state: ScreeningState) -> Optional[str]:
+        vacancy = self.vacancies.get(state.vacancy_key)
+        if vacancy is None or state.answered == state.synced:
+            return None
+        lines = [f"[Скрининг] Вакансия: {vacancy.title} ({vacancy.key})."]
+        for index, rule in enumerate(vacancy.rules):
+            bit = 1 << index
+            if state.answered & bit:
+                verdict = "да" if state.passed & bit else "нет"
+                lines.append(f"- {rule.question} — {verdict}")
+        if state.status == REJECTED:
+            lines.append("Обязательные требования не пройдены, отказ отправлен.")
+        elif state.status == PASSED:
+            lines.append("Обязательные требования пройдены, продолжай диалог.")
+        return "\n".join(lines)
+
+    def _evaluate(
+        self, rule: KnockoutRule, vacancy: Vacancy, text_msg: str, is_current: bool
+    ) -> Optional[bool]:
+        if rule.type == "city_in_hire_list":
+            city = self.cities.find(text_msg)
+            if city is not None:
+                return city in vacancy.hire_cities
+            words = normalize(text_msg).split()
+            # Ответ на вопрос о городе одним-двумя словами, но не из списка
+            if is_current and 0 < len(words) <= 2 and _yes_no(words) is None:
+                if not any(word.isdigit() for word in words):
+                    return False
+            return None
+
+        hints = RULE_HINTS.get(rule.type, ())
+        for clause in _CLAUSES.split(text_msg):
+            words = normalize(clause).split()
+            if not words:
+                continue
+            if not (is_current or _has_prefix(words, hints)):
+                continue
+            verdict = self._evaluate_clause(rule, words)
+            if verdict is not None:
+                return verdict
+        return None
+
+    @staticmethod
+    def _evaluate_clause(rule: KnockoutRule, words: list[str]) -> Optional[bool]:
+        if rule.type == "min_age":
+            for match in _NUMBER.finditer(" ".join(words)):
+                age = int(match.group(1))
+                if age >= 10:
+                    return age >= int(rule.value or 18)
+            return _yes_no(words)
+        if rule.type == "requires_industrial_sewing":
+            if _has_prefix(words, ("бытов",)):
+                return False
+            if _has_prefix(words, SEWING_MACHINES):
+                return True
+        return _yes_no(words)
+
+
+_LOAD_SQL = text("""
+    SELECT vacancy_key, answered, passed, synced, status
+    FROM screening_state WHERE chat_id = :cid
+    """)
+
+_SAVE_SQL = text("""
+    INSERT INTO screening_state
+        (chat_id, vacancy_key, answered, passed, synced, status, updated_at)
+    VALUES (:cid, :vacancy_key, :answered, :passed, :synced, :status, NOW())
+    ON CONFLICT (chat_id) DO UPDATE SET
+        vacancy_key = EXCLUDED.vacancy_key,
+        answered = EXCLUDED.answered,
+        passed = EXCLUDED.passed,
+        synced = EXCLUDED.synced,
+        status = EXCLUDED.status,
+        updated_at = NOW()
+    """)
+
+
+async def load_screening_state(chat_id: int) -> Optional[ScreeningState]:
+    async with SessionLocal() as session:
+        res = await session.execute(_LOAD_SQL, {"cid": chat_id})
+        row = res.first()
+    if row is None:
+        return None
+    return ScreeningState(*row)
+
+
+async def save_screening_state(chat_id: int, state: ScreeningState) -> None:
+    async with SessionLocal() as session, session.begin():
+        await session.execute(
+            _SAVE_SQL,
+            {
+                "cid": chat_id,
+                "vacancy_key": state.vacancy_key,
+                "answered": state.answered,
+                "passed": state.passed,
+                "synced": state.synced,
+                "status": state.status,
+            },
+        )
@@ -1,39 +1,75 @@
 from typing import Any, Mapping
 
+from app.core.config import settings
 from app.hr.models import Candidate
+from app.integrations.base import ProviderClient
 
 CandidateInput = Candidate | Mapping[str, Any]
 
+client = ProviderClient(
+    "amocrm",
+    base_url=settings.amocrm_url,
+    token=settings.amocrm_token,
+    timeout=settings.amocrm_timeout,
+    max_connections=settings.integrations_max_connections,
+    # amoCRM принимает до 50 сделок за один запрос
+    batch_size=50,
+)
 
-def create_lead_from_candidate(
-    candidate: CandidateInput, source: str
-) -> dict[str, Any]:
+
+def _candidate_dict(candidate: CandidateInput) -> dict[str, Any]:
+    if isinstance(candidate, Mapping):
+        return dict(candidate)
     return {
-        "provider": "amocrm",
-        "action": "create_lead_from_candidate",
-        "candidate": dict(candidate)
-        if isinstance(candidate, Mapping)
-        else getattr(candidate, "__dict__", {}),
-        "source": source,
-        "status": "ok",
+        key: value
+        for key, value in getattr(candidate, "__dict__", {}).items()
+        if not key.startswith("_")
     }
 
 
-def update_lead_status(candidate_id: int, status: str) -> dict[str, Any]:
-    return {
-        "provider": "amocrm",
-        "action": "update_lead_status",
-        "candidate_id": candidate_id,
-        "status_value": status,
-        "status": "ok",
-    }
+async def create_lead_from_candidate(
+    candidate: CandidateInput, source: str
+) -> dict[str, Any]:
+    data = _candidate_dict(candidate)
+    return await client.call(
+        "create_lead_from_candidate",
+        "/leads",
+        {"candidate": data, "source": source},
+        local={
+            "provider": "amocrm",
+            "action": "create_lead_from_candidate",
+            "candidate": data,
+            "source": source,
+            "status": "ok",
+        },
+    )
 
 
-def attach_note(candidate_id: int, text: str) -> dict[str, Any]:
-    return {
-        "provider": "amocrm",
-        "action": "attach_note",
-        "candidate_id": candidate_id,
-        "text": text,
-        "status": "ok",
-    }
+async def update_lead_status(candidate_id: int, status: str) -> dict[str, Any]:
+    return await client.call(
+        "update_lead_status",
+        f"/leads/{candidate_id}/status",
+        {"status": status},
+        local={
+            "provider": "amocrm",
+            "action": "update_lead_status",
+            "candidate_id": candidate_id,
+            "status_value": status,
+            "status": "ok",
+        },
+    )
+
+
+async def attach_note(candidate_id: int, text: str) -> dict[str, Any]:
+    return await client.call(
+        "attach_note",
+        f"/leads/{candidate_id}/notes",
+        {"text": text},
+        local={
+            "provider": "amocrm",
+            "action": "attach_note",
+            "candidate_id": candidate_id,
+            "text": text,
+            "status": "ok",
+        },
+    )
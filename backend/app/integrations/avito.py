@@ -1,39 +1,74 @@
 from typing import Any, Mapping
 
+from app.core.config import settings
 from app.hr.models import Candidate
+from app.integrations.base import ProviderClient
 
 CandidateInput = Candidate | Mapping[str, Any]
 
+client = ProviderClient(
+    "avito",
+    base_url=settings.avito_url,
+    token=settings.avito_token,
+    timeout=settings.avito_timeout,
+    max_connections=settings.integrations_max_connections,
+    batch_size=50,
+)
 
-def create_lead_from_candidate(
-    candidate: CandidateInput, source: str
-) -> dict[str, Any]:
+
+def _candidate_dict(candidate: CandidateInput) -> dict[str, Any]:
+    if isinstance(candidate, Mapping):
+        return dict(candidate)
     return {
-        "provider": "avito",
-        "action": "create_lead_from_candidate",
-        "candidate": dict(candidate)
-        if isinstance(candidate, Mapping)
-        else getattr(candidate, "__dict__", {}),
-        "source": source,
-        "status": "ok",
+        key: value
+        for key, value in getattr(candidate, "__dict__", {}).items()
+        if not key.startswith("_")
     }
 
 
-def update_lead_status(candidate_id: int, status: str) -> dict[str, Any]:
-    return {
-        "provider": "avito",
-        "action": "update_lead_status",
-        "candidate_id": candidate_id,
-        "status_value": status,
-        "status": "ok",
-    }
+async def create_lead_from_candidate(
+    candidate: CandidateInput, source: str
+) -> dict[str, Any]:
+    data = _candidate_dict(candidate)
+    return await client.call(
+        "create_lead_from_candidate",
+        "/leads",
+        {"candidate": data, "source": source},
+        local={
+            "provider": "avito",
+            "action": "create_lead_from_candidate",
+            "candidate": data,
+            "source": source,
+            "status": "ok",
+        },
+    )
 
 
-def attach_note(candidate_id: int, text: str) -> dict[str, Any]:
-    return {
-        "provider": "avito",
-        "action": "attach_note",
-        "candidate_id": candidate_id,
-        "text": text,
-        "status": "ok",
-    }
+async def update_lead_status(candidate_id: int, status: str) -> dict[str, Any]:
+    return await client.call(
+        "update_lead_status",
+        f"/leads/{candidate_id}/status",
+        {"status": status},
+        local={
+            "provider": "avito",
+            "action": "update_lead_status",
+            "candidate_id": candidate_id,
+            "status_value": status,
+            "status": "ok",
+        },
+    )
+
+
+async def attach_note(candidate_id: int, text: str) -> dict[str, Any]:
+    return await client.call(
+        "attach_note",
+        f"/leads/{candidate_id}/notes",
+        {"text": text},
+        local={
+            "provider": "avito",
+            "action": "attach_note",
+            "candidate_id": candidate_id,
+            "text": text,
+            "status": "ok",
+        },
+    )
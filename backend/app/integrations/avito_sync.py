@@ -0,0 +1,394 @@
+"""Incremental ingestion of Avito responses into ``candidates``.
+
+The worker pulls ``GET /responses?since=<cursor>`` from the Avito API.
+The cursor and the feed ETag live in ``integration_cursors``. The first
+page is a conditional request (``If-None-Match``), so an idle poll costs
+one 304. Page 1 also fixes the snapshot (``until``) and the page count;
+the other pages are fetched concurrently against that snapshot. The
+responses are upserted a page at a time, one transaction per page, keyed
+on ``(source, external_id)`` and linked to earlier candidates with the
+same phone or email (``app.hr.dedupe``). The cursor moves only after the
+last page commits, so a run that fails halfway leaves the cursor where it
+was and the next run repeats it without duplicates. One replica at a time
+syncs: the holder of a Postgres advisory lock.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import httpx
+from app.core.config import settings
+from app.core.db import SessionLocal, engine
+from app.hr.dedupe import contact_hashes, link_duplicates
+from app.integrations import avito
+from app.integrations.base import ProviderClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+logger = logging.getLogger(__name__)
+
+CURSOR_NAME = "avito_responses"
+# candidates.external_id — String(64): длиннее упала бы вся пачка вместе с курсором
+EXTERNAL_ID_MAX = 64
+
+# Ключ сессионной блокировки лидера: синхронизирует одна реплика
+_LEADER_LOCK_KEY = 7_305_818_414
+
+_READ_CURSOR_SQL = text(
+    "SELECT cursor, etag FROM integration_cursors WHERE name = :name"
+)
+
+# Курсор двигаем, только если его не сдвинул параллельный запуск
+_SAVE_CURSOR_SQL = text("""
+    INSERT INTO integration_cursors (name, cursor, etag, updated_at)
+    VALUES (:name, :cursor, :etag, NOW())
+    ON CONFLICT (name) DO UPDATE
+    SET cursor = EXCLUDED.cursor, etag = EXCLUDED.etag, updated_at = NOW()
+    WHERE integration_cursors.cursor IS NOT DISTINCT FROM :previous
+    """)
+
+_UPSERT_SQL = text("""
+    INSERT INTO candidates
+        (full_name, phone, email, notes, source, status, external_id,
+         phone_hash, email_hash, created_at, updated_at)
+    SELECT n, p, e, m, 'AVITO', 'NEW', x, ph, eh,
+           timezone('utc', NOW()), timezone('utc', NOW())
+    FROM unnest(CAST(:ids AS TEXT[]), CAST(:names AS TEXT[]),
+                CAST(:phones AS TEXT[]), CAST(:emails AS TEXT[]),
+                CAST(:notes AS TEXT[]), CAST(:phone_hashes AS TEXT[]),
+                CAST(:email_hashes AS TEXT[])) AS t(x, n, p, e, m, ph, eh)
+    ON CONFLICT (source, external_id) DO UPDATE
+    SET full_name = EXCLUDED.full_name,
+        phone = COALESCE(EXCLUDED.phone, candidates.phone),
+        email = COALESCE(EXCLUDED.email, candidates.email),
+        phone_hash = COALESCE(EXCLUDED.phone_hash, candidates.phone_hash),
+        email_hash = COALESCE(EXCLUDED.email_hash, candidates.email_hash),
+        updated_at = EXCLUDED.updated_at
+    WHERE (candidates.full_name, candidates.phone, candidates.email)
+        IS DISTINCT FROM (EXCLUDED.full_name,
+                          COALESCE(EXCLUDED.phone, candidates.phone),
+                          COALESCE(EXCLUDED.email, candidates.email))
+    RETURNING id, (xmax = 0)
+    """)
+
+
+class AvitoFeedError(RuntimeError):
+    """The feed kept failing after all retries."""
+
+
+@dataclass
+class FeedPage:
+    items: list[dict[str, Any]]
+    pages: int
+    cursor: Optional[str]
+    etag: Optional[str]
+
+
+@dataclass
+class FeedDelta:
+    """New responses since a cursor; ``items`` is empty on 304."""
+
+    items: list[dict[str, Any]] = field(default_factory=list)
+    cursor: Optional[str] = None
+    etag: Optional[str] = None
+    not_modified: bool = False
+    pages: int = 0
+
+
+def _clip(value: Any, size: int) -> Optional[str]:
+    return str(value)[:size] if value else None
+
+
+def candidate_rows(items: list[dict[str, Any]]) -> dict[str, list[Optional[str]]]:
+    """Column arrays for ``_UPSERT_SQL``, one row per Avito response id.
+
+    A response seen twice in one run keeps its last version: one INSERT
+    cannot touch the same conflict key twice. Responses with an empty id or
+    one longer than ``EXTERNAL_ID_MAX`` are logged and skipped.
+    """
+    latest: dict[str, dict[str, Any]] = {}
+    for item in items:
+        if item.get("id") is None:
+            continue
+        external_id = str(item["id"]).strip()
+        if not external_id or len(external_id) > EXTERNAL_ID_MAX:
+            logger.warning("Skipping Avito response with invalid id %.80r", item["id"])
+            continue
+        latest[external_id] = item
+    rows: dict[str, list[Optional[str]]] = {
+        "ids": [],
+        "names": [],
+        "phones": [],
+        "emails": [],
+        "notes": [],
+        "phone_hashes": [],
+        "email_hashes": [],
+    }
+    for external_id, item in latest.items():
+        note = "\n".join(
+            str(part) for part in (item.get("vacancy"), item.get("message")) if part
+        )
+        rows["ids"].append(external_id)
+        rows["names"].append((item.get("name") or f"Avito {external_id}")[:255])
+        rows["phones"].append(_clip(item.get("phone"), 50))
+        rows["emails"].append(_clip(item.get("email"), 255))
+        rows["notes"].append(note or None)
+        phone_hash, email_hash = contact_hashes(item.get("phone"), item.get("email"))
+        rows["phone_hashes"].append(phone_hash)
+        rows["email_hashes"].append(email_hash)
+    return rows
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+
+class AvitoSync:
+    """Polls the Avito responses feed and upserts new responses."""
+
+    def __init__(
+        self,
+        client: ProviderClient,
+        interval: float,
+        page_size: int,
+        concurrency: int,
+        max_retries: int,
+        backoff: float = 0.5,
+    ) -> None:
+        self.client = client
+        self.interval = interval
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.runs = 0
+        self.skipped = 0
+        self.not_modified = 0
+        self.pages = 0
+        self.retries = 0
+        self.inserted = 0
+        self.updated = 0
+        self.linked = 0
+        self.errors = 0
+        self.last_run_ms = 0.0
+        self.cursor: Optional[str] = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def _get_page(
+        self, params: dict[str, Any], etag: Optional[str] = None
+    ) -> Optional[FeedPage]:
+        """One feed page with backoff on 429/5xx/network errors; None on 304."""
+        headers = {"If-None-Match": etag} if etag else None
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self.client.get(
+                    "/responses", params=params, headers=headers
+                )
+            except httpx.HTTPError as exc:
+                error, wait = str(exc) or type(exc).__name__, None
+            else:
+                if response.status_code == 304:
+                    return None
+                if response.status_code < 400:
+                    data = response.json()
+                    return FeedPage(
+                        items=list(data.get("items") or []),
+                        pages=int(data.get("pages") or 1),
+                        cursor=data.get("cursor"),
+                        etag=response.headers.get("ETag"),
+                    )
+                if response.status_code != 429 and response.status_code < 500:
+                    raise AvitoFeedError(f"HTTP {response.status_code}")
+                error, wait = f"HTTP {response.status_code}", _retry_after(response)
+            if attempt == self.max_retries:
+                raise AvitoFeedError(error)
+            self.retries += 1
+            # Retry-After провайдера важнее своей экспоненты
+            delay = wait if wait is not None else self.backoff * 2**attempt
+            await asyncio.sleep(min(delay, 60.0))
+        raise AssertionError("unreachable")  # pragma: no cover
+
+    async def fetch(
+        self, since: Optional[str] = None, etag: Optional[str] = None
+    ) -> FeedDelta:
+        """All responses after ``since``; pages 2..N go out concurrently."""
+        params: dict[str, Any] = {"per_page": self.page_size, "page": 1}
+        if since is not None:
+            params["since"] = since
+        first = await self._get_page(params, etag)
+        if first is None:
+            return FeedDelta(cursor=since, etag=etag, not_modified=True)
+        if first.cursor is not None:
+            params["until"] = first.cursor
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def page(number: int) -> FeedPage:
+            async with semaphore:
+                result = await self._get_page({**params, "page": number})
+            assert result is not None  # без If-None-Match 304 не бывает
+            return result
+
+        rest = await asyncio.gather(*(page(n) for n in range(2, first.pages + 1)))
+        items = list(first.items)
+        for extra in rest:
+            items.extend(extra.items)
+        return FeedDelta(
+            items=items,
+            cursor=first.cursor if first.cursor is not None else since,
+            etag=first.etag,
+            pages=first.pages,
+        )
+
+    async def _try_lock(self) -> Optional[AsyncConnection]:
+        """Connection holding the leader lock, or None if another replica has it."""
+        conn = await engine.connect()
+        try:
+            await conn.execution_options(isolation_level="AUTOCOMMIT")
+            got = await conn.scalar(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": _LEADER_LOCK_KEY}
+            )
+        except Exception:
+            await conn.close()
+            raise
+        if not got:
+            await conn.close()
+            return None
+        return conn
+
+    async def _unlock(self, conn: AsyncConnection) -> None:
+        try:
+            await conn.execute(
+                text("SELECT pg_advisory_unlock(:key)"), {"key": _LEADER_LOCK_KEY}
+            )
+        except Exception:  # pragma: no cover - соединение уже потеряно
+            pass
+        await conn.close()
+
+    async def sync_once(self) -> Optional[FeedDelta]:
+        """Pull new responses and upsert them; None if another replica syncs."""
+        conn = await self._try_lock()
+        if conn is None:
+            self.skipped += 1
+            return None
+        try:
+            return await self._sync()
+        finally:
+            await self._unlock(conn)
+
+    async def _write_page(self, items: list[dict[str, Any]]) -> None:
+        rows = candidate_rows(items)
+        if not rows["ids"]:
+            return
+        async with SessionLocal() as session, session.begin():
+            res = await session.execute(_UPSERT_SQL, rows)
+            written = res.all()
+            inserted = sum(1 for _, fresh in written if fresh)
+            self.inserted += inserted
+            self.updated += len(written) - inserted
+            # Тот же человек мог прийти из Telegram или Яндекса
+            self.linked += await link_duplicates(
+                session, [row_id for row_id, _ in written]
+            )
+
+    async def _sync(self) -> FeedDelta:
+        started = time.perf_counter()
+        async with SessionLocal() as session:
+            row = (
+                await session.execute(_READ_CURSOR_SQL, {"name": CURSOR_NAME})
+            ).first()
+        since, etag = (row[0], row[1]) if row else (None, None)
+        delta = await self.fetch(since, etag)
+        self.runs += 1
+        self.pages += delta.pages
+        if delta.not_modified:
+            self.not_modified += 1
+        else:
+            # Страница за транзакцией: длинный бэклог не держит блокировки строк
+            for start in range(0, len(delta.items), self.page_size):
+                await self._write_page(delta.items[start : start + self.page_size])
+            async with SessionLocal() as session, session.begin():
+                await session.execute(
+                    _SAVE_CURSOR_SQL,
+                    {
+                        "name": CURSOR_NAME,
+                        "cursor": delta.cursor,
+                        "etag": delta.etag,
+                        "previous": since,
+                    },
+                )
+        self.cursor = delta.cursor
+        self.last_run_ms = (time.perf_counter() - started) * 1000
+        return delta
+
+    def stats(self) -> dict[str, object]:
+        return {
+            "enabled": self.client.enabled,
+            "cursor": self.cursor,
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "not_modified": self.not_modified,
+            "pages": self.pages,
+            "retries": self.retries,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "linked": self.linked,
+            "errors": self.errors,
+            "last_run_ms": round(self.last_run_ms, 1),
+        }
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    def start(self) -> None:
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(), name="avito-sync")
+
+    async def stop(self) -> None:
+        self._stopping = True
+        self._wakeup.set()
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await self.sync_once()
+            except Exception as exc:
+                self.errors += 1
+                logger.warning("Avito sync failed: %s", exc)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+avito_sync = AvitoSync(
+    avito.client,
+    interval=settings.avito_sync_interval,
+    page_size=settings.avito_sync_page_size,
+    concurrency=settings.avito_sync_concurrency,
+    max_retries=settings.avito_sync_max_retries,
+)
+
+
+def start_avito_sync() -> Optional[AvitoSync]:
+    if not settings.avito_sync_enabled or not avito.client.enabled:
+        return None
+    avito_sync.start()
+    return avito_sync
+
+
+async def stop_avito_sync() -> None:
+    await avito_sync.stop()
@@ -0,0 +1,158 @@
+"""Shared plumbing for CRM providers (seller_gpt, amocrm, avito).
+
+Each provider has one pooled ``httpx.AsyncClient`` for the process and its
+own deadline. Providers without a configured URL answer locally, as before
+the integrations were wired up. ``fan_out`` calls all providers at once, so
+a tool call costs the slowest provider rather than the sum of them.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+OK, PARTIAL, ERROR, TIMEOUT = "ok", "partial", "error", "timeout"
+QUEUED = "queued"  # записано в crm_outbox, уйдёт фоновой пачкой
+
+_clients: list["ProviderClient"] = []
+
+
+class ProviderClient:
+    """HTTP client of one CRM provider with a per-call deadline."""
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str = "",
+        token: str = "",
+        timeout: float = 3.0,
+        max_connections: int = 20,
+        batch_size: int = 50,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        self.name = name
+        self.batch_size = batch_size
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._transport = transport
+        self._http: Optional[httpx.AsyncClient] = None
+        _clients.append(self)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.base_url)
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                transport=self._transport,
+            )
+        return self._http
+
+    async def call(
+        self, action: str, path: str, payload: dict[str, Any], local: dict[str, Any]
+    ) -> dict[str, Any]:
+        """POST ``payload`` to the provider; ``local`` is the answer without URL."""
+        if not self.enabled:
+            return local
+        response = await self._client().post(path, json=payload)
+        response.raise_for_status()
+        return {
+            "provider": self.name,
+            "action": action,
+            "status": OK,
+            "response": response.json() if response.content else None,
+        }
+
+    async def get(
+        self,
+        path: str,
+        params: Optional[dict[str, Any]] = None,
+        headers: Optional[dict[str, str]] = None,
+    ) -> httpx.Response:
+        """GET from the provider; the caller handles statuses (304, 429...)."""
+        return await self._client().get(path, params=params, headers=headers)
+
+    async def call_batch(self, items: list[dict[str, Any]]) -> dict[str, str]:
+        """POST queued operations to ``/batch`` in one request.
+
+        Items carry their ``idempotency_key`` so a resent batch is applied
+        once. Returns ``{key: error}`` for the items the provider rejected;
+        raises if the request as a whole failed.
+        """
+        response = await self._client().post("/batch", json={"items": items})
+        response.raise_for_status()
+        data = response.json() if response.content else {}
+        return {
+            result["idempotency_key"]: str(result.get("error") or "rejected")
+            for result in (data or {}).get("results") or []
+            if not result.get("ok", True) and result.get("idempotency_key")
+        }
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+        self._http = None
+
+
+async def close_clients() -> None:
+    for provider in _clients:
+        await provider.aclose()
+
+
+async def _guarded(
+    provider: ProviderClient, action: str, call: Awaitable[dict[str, Any]]
+) -> dict[str, Any]:
+    try:
+        return await asyncio.wait_for(call, timeout=provider.timeout)
+    except asyncio.TimeoutError:
+        logger.warning("%s %s timed out", provider.name, action)
+        return {
+            "provider": provider.name,
+            "action": action,
+            "status": TIMEOUT,
+            "timeout_s": provider.timeout,
+        }
+    except Exception as exc:
+        logger.warning("%s %s failed: %s", provider.name, action, exc)
+        return {
+            "provider": provider.name,
+            "action": action,
+            "status": ERROR,
+            "error": str(exc)[:300],
+        }
+
+
+async def fan_out(
+    action: str, calls: list[tuple[ProviderClient, Awaitable[dict[str, Any]]]]
+) -> list[dict[str, Any]]:
+    """Run provider calls concurrently, each under its provider's deadline.
+
+    Never raises: a provider that fails or runs late is reported in its slot
+    of the result list, the others' results are kept.
+    """
+    return list(
+        await asyncio.gather(
+            *(_guarded(provider, action, call) for provider, call in calls)
+        )
+    )
+
+
+def overall_status(results: list[dict[str, Any]]) -> str:
+    ok = sum(1 for result in results if result.get("status") in (OK, QUEUED))
+    if ok == len(results):
+        return OK
+    return PARTIAL if ok else ERROR
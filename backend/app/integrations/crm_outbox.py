@@ -0,0 +1,471 @@
+"""Transactional outbox for CRM writes.
+
+Operations for every configured provider are written to ``crm_outbox``
+in the caller's transaction (next to the candidate change they describe)
+and a background flusher sends them in batches of up to
+``ProviderClient.batch_size`` per request. Each row keeps its
+``idempotency_key`` across retries, so a batch resent after a timeout is
+applied once. Rows of one candidate go out in id order per provider.
+
+Status updates are coalesced: ``enqueue_status`` holds a new status row
+back for ``CRM_STATUS_COALESCE_SECONDS`` and later hops of the same
+candidate overwrite it while it is still pending, so a burst such as
+new -> screening -> qualified costs one CRM call per provider. A pending
+status row that already has a later note or lead write queued behind it
+is left alone, so the CRM sees the writes in the order they were made.
+``record_status`` checks each hop against ``global.status_flow`` of the
+policy spec and stores it on the candidate, with or without providers.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+import httpx
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.hr.models import CandidateStatus
+from app.hr.policy import status_transition_allowed
+from app.integrations import amocrm, avito, seller_gpt
+from app.integrations.base import QUEUED, ProviderClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+PROVIDERS: dict[str, ProviderClient] = {
+    module.client.name: module.client for module in (seller_gpt, amocrm, avito)
+}
+
+_INSERT_SQL = text("""
+    INSERT INTO crm_outbox
+        (provider, operation, candidate_id, idempotency_key, payload,
+         available_at)
+    SELECT p, :operation, :candidate_id, k, CAST(:payload AS JSONB),
+           NOW() + make_interval(secs => :delay)
+    FROM unnest(CAST(:providers AS TEXT[]), CAST(:keys AS TEXT[])) AS t(p, k)
+    ON CONFLICT (provider, idempotency_key) DO NOTHING
+    RETURNING id
+    """)
+
+STATUS_OPERATION = "update_lead_status"
+COALESCED, UNCHANGED = "coalesced", "unchanged"
+
+# Последний статус кандидата у каждого провайдера (ix_crm_outbox_candidate)
+_LAST_STATUS_SQL = text("""
+    SELECT p, (
+        SELECT o.payload->>'status' FROM crm_outbox o
+        WHERE o.provider = p AND o.candidate_id = :candidate_id
+          AND o.operation = 'update_lead_status' AND o.status <> 'failed'
+        ORDER BY o.id DESC
+        LIMIT 1
+    )
+    FROM unnest(CAST(:providers AS TEXT[])) AS t(p)
+    """)
+
+# Ещё не взятую отправщиком запись переписываем на новый статус; новый ключ —
+# другой payload не должен совпасть с уже применённым у провайдера. Если за ней
+# уже ждёт заметка или лид, статус не должен обогнать их — пишем новую строку
+_COALESCE_SQL = text("""
+    UPDATE crm_outbox AS o
+    SET payload = CAST(:payload AS JSONB), idempotency_key = :key_prefix || o.id
+    WHERE o.candidate_id = :candidate_id
+      AND o.operation = 'update_lead_status'
+      AND o.status = 'pending'
+      AND o.provider = ANY(CAST(:providers AS TEXT[]))
+      AND NOT EXISTS (
+          SELECT 1 FROM crm_outbox later
+          WHERE later.provider = o.provider
+            AND later.candidate_id = o.candidate_id
+            AND later.id > o.id
+            AND later.operation <> 'update_lead_status'
+            AND later.status IN ('pending', 'sending')
+      )
+    RETURNING o.provider
+    """)
+
+# Строку кандидата держим до конца транзакции: переходы идут по очереди
+_CANDIDATE_STATUS_SQL = text("SELECT status FROM candidates WHERE id = :id FOR UPDATE")
+
+_SET_CANDIDATE_STATUS_SQL = text("""
+    UPDATE candidates SET status = :status, updated_at = timezone('utc', NOW())
+    WHERE id = :id
+    """)
+
+# Как в telegram_outbox: ранняя неотправленная запись кандидата держит поздние
+_CLAIM_SQL = text("""
+    UPDATE crm_outbox
+    SET status = 'sending', locked_at = NOW(), attempts = attempts + 1
+    WHERE id IN (
+        SELECT o.id FROM crm_outbox o
+        WHERE o.provider = :provider
+          AND ((o.status = 'pending' AND o.available_at <= NOW())
+               OR (o.status = 'sending'
+                   AND o.locked_at < NOW() - make_interval(secs => :lock_timeout)))
+          AND (o.candidate_id IS NULL OR NOT EXISTS (
+              SELECT 1 FROM crm_outbox e
+              WHERE e.provider = o.provider
+                AND e.candidate_id = o.candidate_id
+                AND e.id < o.id
+                AND ((e.status = 'pending' AND e.available_at > NOW())
+                     OR (e.status = 'sending'
+                         AND e.locked_at >= NOW()
+                             - make_interval(secs => :lock_timeout)))
+          ))
+        ORDER BY o.id
+        LIMIT :batch
+    )
+    RETURNING id, operation, candidate_id, idempotency_key, payload, attempts,
+              created_at
+    """)
+
+_MARK_SENT_SQL = text("""
+    UPDATE crm_outbox
+    SET status = 'sent', sent_at = NOW(), locked_at = NULL, last_error = NULL
+    WHERE id = ANY(CAST(:ids AS BIGINT[]))
+    """)
+
+_RETRY_SQL = text("""
+    UPDATE crm_outbox AS o
+    SET status = v.status,
+        locked_at = NULL,
+        last_error = v.error,
+        available_at = NOW() + make_interval(secs => v.delay)
+    FROM unnest(CAST(:ids AS BIGINT[]), CAST(:statuses AS TEXT[]),
+                CAST(:errors AS TEXT[]), CAST(:delays AS FLOAT8[]))
+        AS v(id, status, error, delay)
+    WHERE o.id = v.id
+    """)
+
+_BACKLOG_SQL = text("""
+    SELECT provider, COUNT(*), EXTRACT(EPOCH FROM NOW() - MIN(created_at))
+    FROM crm_outbox WHERE status IN ('pending', 'sending')
+    GROUP BY provider
+    """)
+
+
+@dataclass
+class CrmOperation:
+    id: int
+    operation: str
+    candidate_id: Optional[int]
+    idempotency_key: str
+    payload: dict[str, Any]
+    attempts: int
+    created_at: datetime
+
+    def as_item(self) -> dict[str, Any]:
+        return {
+            "idempotency_key": self.idempotency_key,
+            "operation": self.operation,
+            "candidate_id": self.candidate_id,
+            "payload": self.payload,
+        }
+
+
+class StatusFlowError(ValueError):
+    """A status hop that ``global.status_flow`` does not allow."""
+
+
+def enabled_providers() -> list[str]:
+    return [name for name, client in PROVIDERS.items() if client.enabled]
+
+
+async def enqueue_crm(
+    session: AsyncSession,
+    operation: str,
+    payload: dict[str, Any],
+    candidate_id: Optional[int] = None,
+    providers: Optional[list[str]] = None,
+    delay: float = 0.0,
+) -> list[int]:
+    """Queue ``operation`` for each configured provider in the caller's transaction.
+
+    Nothing is sent here: call ``crm_outbox.notify()`` after the commit.
+    ``delay`` holds the rows back for that many seconds.
+    """
+    names = enabled_providers() if providers is None else providers
+    if not names:
+        return []
+    res = await session.execute(
+        _INSERT_SQL,
+        {
+            "operation": operation,
+            "candidate_id": candidate_id,
+            "payload": json.dumps(payload, ensure_ascii=False, default=str),
+            "providers": names,
+            "keys": [f"{operation}:{uuid.uuid4().hex}" for _ in names],
+            "delay": float(delay),
+        },
+    )
+    return [row[0] for row in res]
+
+
+async def record_status(session: AsyncSession, candidate_id: int, status: str) -> None:
+    """Check a hop from the candidate's current status and store the new one.
+
+    Runs before the CRM write is queued or sent inline, so the flow is
+    enforced even when no provider is configured. Raises
+    ``StatusFlowError``; an unknown ``candidate_id`` is not checked here.
+    """
+    res = await session.execute(_CANDIDATE_STATUS_SQL, {"id": candidate_id})
+    current = res.scalar_one_or_none()
+    if current is None:
+        return
+    source = CandidateStatus[current].value
+    if source != status and not status_transition_allowed(source, status):
+        crm_outbox.rejected += 1
+        raise StatusFlowError(f"{source} -> {status} is not in status_flow")
+    await session.execute(
+        _SET_CANDIDATE_STATUS_SQL,
+        {"id": candidate_id, "status": CandidateStatus(status).name},
+    )
+
+
+async def enqueue_status(
+    session: AsyncSession,
+    candidate_id: int,
+    status: str,
+    providers: Optional[list[str]] = None,
+    window: Optional[float] = None,
+) -> str:
+    """Queue a lead status update, folding it into a pending one if any.
+
+    Returns ``queued``, ``coalesced`` or ``unchanged``; raises
+    ``StatusFlowError`` if the hop from the last queued or sent status is
+    not in ``global.status_flow``. Runs in the caller's transaction.
+    """
+    names = enabled_providers() if providers is None else providers
+    if not names:
+        return UNCHANGED
+    window = settings.crm_status_coalesce_seconds if window is None else window
+    # Одновременные переходы одного кандидата проверяем и пишем по очереди
+    await session.execute(
+        text("SELECT pg_advisory_xact_lock(:key)"),
+        {"key": zlib.crc32(f"crm_status:{candidate_id}".encode())},
+    )
+    res = await session.execute(
+        _LAST_STATUS_SQL, {"candidate_id": candidate_id, "providers": names}
+    )
+    previous = dict(res.all())
+    for source in set(previous.values()) - {None, status}:
+        if not status_transition_allowed(source, status):
+            crm_outbox.rejected += 1
+            raise StatusFlowError(f"{source} -> {status} is not in status_flow")
+    names = [name for name in names if previous.get(name) != status]
+    if not names:
+        return UNCHANGED
+    payload = json.dumps({"status": status}, ensure_ascii=False)
+    res = await session.execute(
+        _COALESCE_SQL,
+        {
+            "candidate_id": candidate_id,
+            "payload": payload,
+            "key_prefix": f"{STATUS_OPERATION}:{uuid.uuid4().hex}:",
+            "providers": names,
+        },
+    )
+    coalesced = {row[0] for row in res}
+    crm_outbox.coalesced += len(coalesced)
+    rest = [name for name in names if name not in coalesced]
+    if rest:
+        await enqueue_crm(
+            session, STATUS_OPERATION, {"status": status}, candidate_id, rest, window
+        )
+    return QUEUED if rest else COALESCED
+
+
+async def crm_backlog() -> dict[str, dict[str, object]]:
+    async with SessionLocal() as session:
+        rows = (await session.execute(_BACKLOG_SQL)).all()
+    return {
+        provider: {"pending": count, "oldest_s": round(float(age or 0), 1)}
+        for provider, count, age in rows
+    }
+
+
+def _retryable(exc: Exception) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        code = exc.response.status_code
+        return code == 429 or code >= 500
+    return True  # сеть, таймаут, битый ответ — повтор безопасен по ключу
+
+
+class CrmOutboxFlusher:
+    """Sends pending CRM operations in per-provider batches with backoff."""
+
+    def __init__(
+        self,
+        max_attempts: int,
+        poll_interval: float,
+        lock_timeout: float,
+        providers: Optional[dict[str, ProviderClient]] = None,
+    ) -> None:
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.lock_timeout = lock_timeout
+        self.providers = PROVIDERS if providers is None else providers
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.batches = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.lag_ms_avg = 0.0
+        self.lag_ms_max = 0.0
+        self._sent_times: deque[float] = deque()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def flush(self, provider: ProviderClient) -> int:
+        """Send one batch of ready operations of ``provider``; returns rows sent."""
+        async with SessionLocal() as session, session.begin():
+            await session.execute(
+                text("SELECT pg_advisory_xact_lock(:key)"),
+                {"key": zlib.crc32(f"crm_outbox:{provider.name}".encode())},
+            )
+            res = await session.execute(
+                _CLAIM_SQL,
+                {
+                    "provider": provider.name,
+                    "batch": provider.batch_size,
+                    "lock_timeout": float(self.lock_timeout),
+                },
+            )
+            rows = sorted((CrmOperation(*row) for row in res), key=lambda r: r.id)
+        if not rows:
+            return 0
+        self.batches += 1
+        try:
+            rejected = await asyncio.wait_for(
+                provider.call_batch([row.as_item() for row in rows]),
+                timeout=provider.timeout,
+            )
+        except Exception as exc:
+            logger.warning("CRM batch to %s failed: %s", provider.name, exc)
+            await self._retry(rows, str(exc) or type(exc).__name__, _retryable(exc))
+            return 0
+        sent = [row for row in rows if row.idempotency_key not in rejected]
+        failed = [row for row in rows if row.idempotency_key in rejected]
+        async with SessionLocal() as session, session.begin():
+            if sent:
+                await session.execute(_MARK_SENT_SQL, {"ids": [r.id for r in sent]})
+        for row in failed:
+            await self._retry([row], rejected[row.idempotency_key], True)
+        self._record_sent(sent)
+        return len(sent)
+
+    async def _retry(
+        self, rows: list[CrmOperation], error: str, retryable: bool
+    ) -> None:
+        statuses, delays = [], []
+        for row in rows:
+            exhausted = not retryable or row.attempts >= self.max_attempts
+            statuses.append("failed" if exhausted else "pending")
+            delays.append(float(min(2**row.attempts, 300)))
+            if exhausted:
+                self.failed += 1
+            else:
+                self.retried += 1
+        async with SessionLocal() as session, session.begin():
+            await session.execute(
+                _RETRY_SQL,
+                {
+                    "ids": [row.id for row in rows],
+                    "statuses": statuses,
+                    "errors": [error[:1000]] * len(rows),
+                    "delays": delays,
+                },
+            )
+
+    def _record_sent(self, rows: list[CrmOperation]) -> None:
+        now = time.monotonic()
+        wall = datetime.now(timezone.utc)
+        for row in rows:
+            lag_ms = max(0.0, (wall - row.created_at).total_seconds() * 1000)
+            self.lag_ms_avg = (
+                lag_ms if not self.sent else 0.9 * self.lag_ms_avg + 0.1 * lag_ms
+            )
+            self.lag_ms_max = max(self.lag_ms_max, lag_ms)
+            self.sent += 1
+            self._sent_times.append(now)
+        while self._sent_times and self._sent_times[0] < now - 60:
+            self._sent_times.popleft()
+
+    def stats(self) -> dict[str, object]:
+        now = time.monotonic()
+        return {
+            "providers": enabled_providers(),
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "batches": self.batches,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "sent_last_minute": sum(1 for t in self._sent_times if t >= now - 60),
+            "lag_ms_avg": round(self.lag_ms_avg, 1),
+            "lag_ms_max": round(self.lag_ms_max, 1),
+        }
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    def start(self) -> None:
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(), name="crm-outbox")
+
+    async def stop(self) -> None:
+        self._stopping = True
+        self._wakeup.set()
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _flush_provider(self, provider: ProviderClient) -> bool:
+        """Flush one provider; True if it sent a full batch (more may wait)."""
+        try:
+            return await self.flush(provider) >= provider.batch_size
+        except Exception as exc:  # pragma: no cover - DB hiccup, retry later
+            logger.warning("CRM outbox flush failed: %s", exc)
+            return False
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            active = [p for p in self.providers.values() if p.enabled]
+            # Провайдеры независимы: медленный amoCRM не задерживает остальных
+            full = await asyncio.gather(*(self._flush_provider(p) for p in active))
+            if any(full):
+                continue  # полная пачка — сразу за следующей
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+crm_outbox = CrmOutboxFlusher(
+    max_attempts=settings.crm_outbox_max_attempts,
+    poll_interval=settings.crm_outbox_poll_interval,
+    lock_timeout=settings.crm_outbox_lock_timeout,
+)
+
+
+def start_crm_outbox() -> Optional[CrmOutboxFlusher]:
+    if not settings.crm_outbox_enabled or not enabled_providers():
+        return None
+    crm_outbox.start()
+    return crm_outbox
+
+
+async def stop_crm_outbox() -> None:
+    await crm_outbox.stop()
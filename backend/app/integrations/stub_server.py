@@ -0,0 +1,145 @@
+"""Local stand-in for a CRM provider, for tests and benchmarks.
+
+Serves the endpoints ``ProviderClient`` calls (``/batch`` included, with
+idempotency keys honoured) with a configurable delay and failure status.
+Run it as a server and point a provider at it::
+
+    python -m app.integrations.stub_server --port 9101 --delay 0.2
+    AMOCRM_URL=http://127.0.0.1:9101 uvicorn app.main:app
+
+or mount it in-process with ``httpx.ASGITransport(app=create_stub_app())``.
+``create_avito_stub_app`` fakes the Avito responses feed read by
+``app.integrations.avito_sync`` (``--avito`` on the command line).
+"""
+
+import argparse
+import asyncio
+import itertools
+from typing import Any, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+
+def create_stub_app(delay: float = 0.0, fail_status: Optional[int] = None) -> FastAPI:
+    app = FastAPI(title="crm-stub")
+    lead_ids = itertools.count(1)
+    app.state.calls = []
+    app.state.applied = {}
+
+    async def reply(kind: str, body: dict[str, Any], **extra: Any) -> JSONResponse:
+        app.state.calls.append((kind, body))
+        if delay:
+            await asyncio.sleep(delay)
+        if fail_status:
+            return JSONResponse({"error": "stub failure"}, status_code=fail_status)
+        return JSONResponse({"ok": True, **extra})
+
+    @app.post("/leads")
+    async def create_lead(body: dict[str, Any]) -> JSONResponse:
+        return await reply("create", body, lead_id=next(lead_ids))
+
+    @app.post("/leads/{lead_id}/status")
+    async def update_status(lead_id: int, body: dict[str, Any]) -> JSONResponse:
+        return await reply("status", body, lead_id=lead_id)
+
+    @app.post("/leads/{lead_id}/notes")
+    async def add_note(lead_id: int, body: dict[str, Any]) -> JSONResponse:
+        return await reply("note", body, lead_id=lead_id)
+
+    @app.post("/batch")
+    async def batch(body: dict[str, Any]) -> JSONResponse:
+        # Повтор пачки с теми же ключами не применяется второй раз
+        app.state.calls.append(("batch", body))
+        if delay:
+            await asyncio.sleep(delay)
+        if fail_status:
+            return JSONResponse({"error": "stub failure"}, status_code=fail_status)
+        results = []
+        for item in body.get("items") or []:
+            key = item.get("idempotency_key")
+            if key not in app.state.applied:
+                app.state.applied[key] = item
+            results.append({"idempotency_key": key, "ok": True})
+        return JSONResponse({"results": results})
+
+    return app
+
+
+def create_avito_stub_app(
+    responses: Optional[list[dict[str, Any]]] = None,
+    throttle: int = 0,
+    fail_status: Optional[int] = None,
+    delay: float = 0.0,
+) -> FastAPI:
+    """Fake Avito feed: ``GET /responses?since=&until=&page=&per_page=``.
+
+    ``app.state.responses`` is the feed; an item's cursor is its position
+    (1-based). The first ``throttle`` requests get 429 with ``Retry-After: 0``.
+    The ETag is the feed length, so ``If-None-Match`` gets 304 until an item
+    is appended.
+    """
+    app = FastAPI(title="avito-stub")
+    app.state.responses = list(responses or [])
+    app.state.requests = []
+    app.state.throttle = throttle
+
+    @app.get("/responses")
+    async def list_responses(
+        request: Request,
+        since: int = 0,
+        until: Optional[int] = None,
+        page: int = 1,
+        per_page: int = 100,
+    ) -> Response:
+        app.state.requests.append(dict(request.query_params))
+        if delay:
+            await asyncio.sleep(delay)
+        if app.state.throttle > 0:
+            app.state.throttle -= 1
+            return JSONResponse(
+                {"error": "too many requests"},
+                status_code=429,
+                headers={"Retry-After": "0"},
+            )
+        if fail_status:
+            return JSONResponse({"error": "stub failure"}, status_code=fail_status)
+        feed = app.state.responses
+        etag = f'"{len(feed)}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        # until фиксирует срез: новые отклики не сдвигают страницы 2..N
+        until = len(feed) if until is None else min(until, len(feed))
+        window = feed[since:until]
+        start = (page - 1) * per_page
+        return JSONResponse(
+            {
+                "items": window[start : start + per_page],
+                "pages": max(1, -(-len(window) // per_page)),
+                "cursor": str(until),
+            },
+            headers={"ETag": etag},
+        )
+
+    return app
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9101)
+    parser.add_argument("--delay", type=float, default=0.0)
+    parser.add_argument("--fail-status", type=int, default=None)
+    parser.add_argument("--avito", action="store_true", help="serve the Avito feed")
+    args = parser.parse_args()
+    if args.avito:
+        app = create_avito_stub_app(fail_status=args.fail_status, delay=args.delay)
+    else:
+        app = create_stub_app(args.delay, args.fail_status)
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,37 @@
 import logging
 from contextlib import asynccontextmanager
 
-import httpx
 from app.core.config import settings
 from app.core.db import check_database, engine, ensure_telegram_tables
+from app.core.openai_client import close_openai_client, get_openai_client, pool_stats
+from app.core.outbox import outbox, outbox_backlog, start_outbox, stop_outbox
+from app.core.retention import start_sweeper, stop_sweeper
+from app.core.telegram_client import telegram
+from app.core.update_queue import start_workers, stop_workers
+from app.hr.cities import get_city_index
+from app.hr.followup_scheduler import (
+    followup_scheduler,
+    start_followup_scheduler,
+    stop_followup_scheduler,
+)
+from app.integrations.avito_sync import avito_sync, start_avito_sync, stop_avito_sync
+from app.integrations.base import close_clients as close_integrations
+from app.integrations.crm_outbox import (
+    crm_backlog,
+    crm_outbox,
+    start_crm_outbox,
+    stop_crm_outbox,
+)
 from app.tools.internal import router as jobs_router
 from app.tools.router import router as tools_router
 from app.tools.telegram_webhook import router as telegram_router
-from app.tools.telegram_webhook import set_telegram_webhook
+from app.tools.telegram_webhook import (
+    faq_cache,
+    handle_queued_update,
+    pipeline_stats,
+    set_telegram_webhook,
+    warm_thread_cache,
+)
 from app.tools.webhook import router as webhook_router
 from fastapi import APIRouter, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
@@ -25,12 +49,28 @@ async def health() -> dict[str, object]:
         db_ok = False
         logger.warning("Database health check failed: %s", exc)
 
+    outbox_stats: dict[str, object] = outbox.stats()
+    crm_stats: dict[str, object] = crm_outbox.stats()
+    if db_ok:
+        try:
+            outbox_stats.update(await outbox_backlog())
+            crm_stats["backlog"] = await crm_backlog()
+        except Exception as exc:  # pragma: no cover - таблицы может ещё не быть
+            logger.warning("Outbox backlog unavailable: %s", exc)
+
     return {
         "ok": db_ok,
         "env": settings.app_env,
         "public_url": settings.backend_public_url,
         "commit_sha": settings.commit_sha,
         "db_ok": db_ok,
+        "openai_pool": pool_stats(),
+        "agent_pipeline": pipeline_stats(),
+        "outbox": outbox_stats,
+        "crm_outbox": crm_stats,
+        "faq_cache": faq_cache.stats(),
+        "followup_scheduler": followup_scheduler.stats(),
+        "avito_sync": avito_sync.stats(),
     }
 
 
@@ -69,11 +109,7 @@ async def send_startup_notify(webhook_status: str | None = None) -> None:
     )
 
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            await client.post(
-                f"https://api.telegram.org/bot{token}/sendMessage",
-                json={"chat_id": chat_id, "text": text},
-            )
+        await telegram.send_message(token, chat_id, text)
     except Exception as exc:  # pragma: no cover - log only
         logger.warning("Startup notify failed: %s", exc)
 
@@ -83,6 +119,15 @@ async def lifespan(app: FastAPI):
     # Ensure DB reachable on startup
     await check_database()
     await ensure_telegram_tables()
+    logger.info("City index built: %s cities", len(get_city_index()))
+    if not settings.dedupe_hash_key:
+        logger.warning("DEDUPE_HASH_KEY is not set: candidate duplicates are not found")
+    if settings.thread_cache_warmup > 0:
+        try:
+            loaded = await warm_thread_cache(settings.thread_cache_warmup)
+            logger.info("Thread cache warmed: %s chats", loaded)
+        except Exception as exc:  # pragma: no cover - cache is best-effort
+            logger.warning("Thread cache warmup failed: %s", exc)
     webhook_status: str | None = None
     # Set Telegram webhook automatically in production when public URL provided
     if settings.app_env == "production" and settings.backend_public_url:
@@ -93,7 +138,28 @@ async def lifespan(app: FastAPI):
             webhook_status = f"error:{exc}"
             logger.warning("Auto setWebhook failed: %s", exc)
         await send_startup_notify(webhook_status=webhook_status)
+    if settings.openai_api_key:
+        get_openai_client()
+    if settings.telegram_update_mode == "queue":
+        start_workers(handle_queued_update)
+    elif settings.openai_breaker_failures > 0:
+        # В inline-режиме очередь нужна только для повторов после сбоя OpenAI
+        start_workers(handle_queued_update, concurrency=1)
+    start_outbox()
+    start_crm_outbox()
+    start_sweeper()
+    start_followup_scheduler()
+    start_avito_sync()
     yield
+    await stop_avito_sync()
+    await stop_followup_scheduler()
+    await stop_sweeper()
+    await stop_workers()
+    await stop_outbox()
+    await stop_crm_outbox()
+    await close_openai_client()
+    await close_integrations()
+    await telegram.aclose()
     await engine.dispose()
 
 
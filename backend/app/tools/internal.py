@@ -1,4 +1,7 @@
 from app.core.config import settings
+from app.hr.dedupe import backfill_contact_hashes
+from app.hr.followups import run_due_followups
+from app.hr.policy import get_policy_spec
 from fastapi import APIRouter, HTTPException, Request
 
 router = APIRouter(prefix="/jobs", tags=["jobs"])
@@ -16,5 +19,16 @@ def _check_internal_token(request: Request) -> None:
 @router.post("/followup")
 async def run_followup(request: Request):
     _check_internal_token(request)
-    # Placeholder: integrate actual follow-up logic here.
-    return {"status": "ok", "processed": 0}
+    if not (get_policy_spec().get("followups") or {}).get("enabled"):
+        return {"status": "disabled", "processed": 0}
+    stats = await run_due_followups()
+    return {"status": "ok", **stats.as_dict()}
+
+
+@router.post("/dedupe")
+async def run_dedupe_backfill(request: Request, batch_size: int = 1000):
+    _check_internal_token(request)
+    if not settings.dedupe_hash_key:
+        raise HTTPException(status_code=500, detail="DEDUPE_HASH_KEY is not set")
+    stats = await backfill_contact_hashes(batch_size=max(1, batch_size))
+    return {"status": "ok", **stats.as_dict()}
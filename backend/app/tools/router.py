@@ -1,13 +1,93 @@
+import logging
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional
+from types import ModuleType
+from typing import Any, Awaitable, Callable, Optional
 
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.hr.cities import normalize_city
+from app.hr.dedupe import Registration, register_candidate
 from app.hr.schemas import CandidateStatus, Source
 from app.integrations import amocrm, avito, seller_gpt
+from app.integrations.base import QUEUED, fan_out, overall_status
+from app.integrations.crm_outbox import (
+    StatusFlowError,
+    crm_outbox,
+    enabled_providers,
+    enqueue_crm,
+    enqueue_status,
+    record_status,
+)
 from fastapi import APIRouter
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
+from sqlalchemy.ext.asyncio import AsyncSession
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/tools", tags=["tools"])
 
+# Порядок results в ответах инструментов
+PROVIDERS = (seller_gpt, amocrm, avito)
+
+
+def _outbox_providers() -> list[str]:
+    return enabled_providers() if settings.crm_outbox_enabled else []
+
+
+async def _call_providers(
+    operation: str,
+    call: Callable[[ModuleType], Awaitable[dict[str, Any]]],
+    queued: list[str],
+) -> list[dict[str, Any]]:
+    """Results in ``PROVIDERS`` order; providers not in ``queued`` are called."""
+    inline = [module for module in PROVIDERS if module.client.name not in queued]
+    results = iter(
+        await fan_out(operation, [(module.client, call(module)) for module in inline])
+    )
+    return [
+        (
+            {"provider": module.client.name, "action": operation, "status": QUEUED}
+            if module.client.name in queued
+            else next(results)
+        )
+        for module in PROVIDERS
+    ]
+
+
+async def _write_crm(
+    operation: str,
+    payload: dict[str, Any],
+    candidate_id: Optional[int],
+    call: Callable[[ModuleType], Awaitable[dict[str, Any]]],
+    queue: Optional[Callable[[AsyncSession, list[str]], Awaitable[Any]]] = None,
+    prepare: Optional[Callable[[AsyncSession], Awaitable[Any]]] = None,
+) -> list[dict[str, Any]]:
+    """Queue the write for providers with a URL, call the others inline.
+
+    ``queue`` replaces the plain ``enqueue_crm`` call. ``prepare`` runs
+    first, in the same transaction, whether or not anything is queued. If
+    the database cannot be written, every provider is called inline;
+    ``StatusFlowError`` is raised to the caller instead.
+    """
+    names = _outbox_providers()
+    if names or prepare is not None:
+        try:
+            async with SessionLocal() as session, session.begin():
+                if prepare is not None:
+                    await prepare(session)
+                if names and queue is None:
+                    await enqueue_crm(session, operation, payload, candidate_id, names)
+                elif names:
+                    await queue(session, names)
+        except StatusFlowError:
+            raise
+        except Exception as exc:
+            logger.warning("CRM outbox unavailable, calling providers inline: %s", exc)
+            names = []
+    if names:
+        crm_outbox.notify()
+    return await _call_providers(operation, call, names)
+
 
 class CreateCandidatePayload(BaseModel):
     full_name: str
@@ -15,8 +95,15 @@ class CreateCandidatePayload(BaseModel):
     phone: Optional[str] = None
     source: Source = Source.OTHER
     vacancy_id: Optional[int] = None
+    city: Optional[str] = None
     notes: Optional[str] = None
 
+    @field_validator("city")
+    @classmethod
+    def _canonical_city(cls, value: Optional[str]) -> Optional[str]:
+        # «спб», «Питер» → «Санкт-Петербург» для CRM
+        return normalize_city(value)
+
 
 class UpdateCandidateStatusPayload(BaseModel):
     candidate_id: int
@@ -39,30 +126,104 @@ class EscalateToHumanPayload(BaseModel):
     priority: str = Field(default="normal")  # could be: low|normal|high|urgent
 
 
+@dataclass
+class _CrmWrite:
+    operation: str
+    payload: dict[str, Any]
+    candidate_id: Optional[int]
+    call: Callable[[ModuleType], Awaitable[dict[str, Any]]]
+
+
+def _candidate_write(
+    payload: CreateCandidatePayload, registration: Optional[Registration]
+) -> _CrmWrite:
+    data = payload.model_dump()
+    source = payload.source.value
+    if registration is not None and registration.duplicate_of is not None:
+        # Тот же человек из другого канала: заметка к лиду вместо второго лида
+        primary_id = registration.duplicate_of
+        note_text = f"Повторный отклик ({source}): {payload.full_name}"
+        return _CrmWrite(
+            "attach_note",
+            {"text": note_text},
+            primary_id,
+            lambda module: module.attach_note(primary_id, note_text),
+        )
+    return _CrmWrite(
+        "create_lead_from_candidate",
+        {"candidate": data, "source": source},
+        registration.candidate_id if registration else None,
+        lambda module: module.create_lead_from_candidate(data, source=source),
+    )
+
+
 @router.post("/create_candidate_in_crm")
 async def create_candidate_in_crm(payload: CreateCandidatePayload) -> dict:
-    data = payload.model_dump()
+    names = _outbox_providers()
+    registration: Optional[Registration] = None
+    try:
+        # Кандидат и его запись в crm_outbox — одной транзакцией
+        async with SessionLocal() as session, session.begin():
+            registration = await register_candidate(
+                session,
+                payload.full_name,
+                payload.phone,
+                payload.email,
+                payload.source,
+                notes=payload.notes,
+                vacancy_id=payload.vacancy_id,
+            )
+            write = _candidate_write(payload, registration)
+            if names:
+                await enqueue_crm(
+                    session, write.operation, write.payload, write.candidate_id, names
+                )
+    except Exception as exc:
+        logger.warning(
+            "Candidate registration unavailable, creating lead as is: %s", exc
+        )
+        registration, names = None, []
+    write = _candidate_write(payload, registration)
+    if names:
+        crm_outbox.notify()
+    results = await _call_providers(write.operation, write.call, names)
     return {
-        "status": "ok",
+        "status": overall_status(results),
         "action": "create_candidate_in_crm",
-        "results": [
-            seller_gpt.create_lead_from_candidate(data, source=payload.source.value),
-            amocrm.create_lead_from_candidate(data, source=payload.source.value),
-            avito.create_lead_from_candidate(data, source=payload.source.value),
-        ],
+        "candidate_id": registration.candidate_id if registration else None,
+        "duplicate_of": registration.duplicate_of if registration else None,
+        "results": results,
     }
 
 
 @router.post("/update_candidate_status")
 async def update_candidate_status(payload: UpdateCandidateStatusPayload) -> dict:
+    status = payload.status.value
+    try:
+        # Промежуточные статусы в окне склейки уходят в CRM одним вызовом
+        results = await _write_crm(
+            "update_lead_status",
+            {"status": status},
+            payload.candidate_id,
+            lambda module: module.update_lead_status(payload.candidate_id, status),
+            queue=lambda session, names: enqueue_status(
+                session, payload.candidate_id, status, names
+            ),
+            # Переход проверяем и без провайдеров, до выбора очередь/напрямую
+            prepare=lambda session: record_status(
+                session, payload.candidate_id, status
+            ),
+        )
+    except StatusFlowError as exc:
+        return {
+            "status": "rejected",
+            "action": "update_candidate_status",
+            "reason": str(exc),
+        }
     return {
-        "status": "ok",
+        "status": overall_status(results),
         "action": "update_candidate_status",
-        "results": [
-            seller_gpt.update_lead_status(payload.candidate_id, payload.status.value),
-            amocrm.update_lead_status(payload.candidate_id, payload.status.value),
-            avito.update_lead_status(payload.candidate_id, payload.status.value),
-        ],
+        "results": results,
     }
 
 
@@ -89,13 +250,15 @@ async def schedule_interview(payload: ScheduleInterviewPayload) -> dict:
 @router.post("/escalate_to_human")
 async def escalate_to_human(payload: EscalateToHumanPayload) -> dict:
     note_text = f"Escalation ({payload.priority}): {payload.reason}"
+    results = await _write_crm(
+        "attach_note",
+        {"text": note_text},
+        payload.candidate_id,
+        lambda module: module.attach_note(payload.candidate_id, note_text),
+    )
     return {
-        "status": "ok",
+        "status": overall_status(results),
         "action": "escalate_to_human",
         "payload": payload.model_dump(),
-        "results": [
-            seller_gpt.attach_note(payload.candidate_id, note_text),
-            amocrm.attach_note(payload.candidate_id, note_text),
-            avito.attach_note(payload.candidate_id, note_text),
-        ],
+        "results": results,
     }
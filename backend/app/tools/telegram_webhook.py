@@ -1,14 +1,33 @@
 import asyncio
 import logging
 import time
-from typing import Dict, Optional
+from typing import Any, Optional
 from uuid import uuid4
 
-import httpx
+from app.core.assistant_runs import OnDelta, run_assistant
+from app.core.breaker import CircuitOpenError, openai_breaker
+from app.core.chunking import split_text
+from app.core.coalescer import BurstCoalescer
 from app.core.config import settings
 from app.core.db import SessionLocal
+from app.core.limiter import openai_limiter
+from app.core.mailbox import ChatDispatcher
+from app.core.openai_client import get_openai_client
+from app.core.outbox import outbox
+from app.core.recent_ids import RecentIdFilter
+from app.core.telegram_client import MESSAGE_LIMIT, telegram
+from app.core.thread_cache import ThreadCache
+from app.core.update_queue import (UpdateDeferred, defer_update, enqueue_update,
+                                   notify_workers)
+from app.hr.faq import FaqCache
+from app.hr.policy import candidate_message, get_policy_spec
+from app.hr.routing import PolicyRouter, RouteDecision
+from app.hr.screening import (ScreeningEngine, ScreeningTurn, Vacancy,
+                              load_screening_state, save_screening_state)
+from app.tools.router import EscalateToHumanPayload, escalate_to_human
 from fastapi import APIRouter, HTTPException, Request
-from openai import AsyncOpenAI
+from openai import (APIConnectionError, AsyncOpenAI, InternalServerError,
+                    RateLimitError)
 from sqlalchemy import text
 
 router = APIRouter(tags=["telegram"], prefix="/telegram")
@@ -16,18 +35,86 @@ router = APIRouter(tags=["telegram"], prefix="/telegram")
 logger = logging.getLogger(__name__)
 
 # In-memory best-effort cache for threads (still persisted in DB)
-user_threads_cache: Dict[int, str] = {}
+user_threads_cache = ThreadCache(
+    max_size=settings.thread_cache_size, ttl=settings.thread_cache_ttl
+)
 
+# Очевидные повторы отсекаем без похода в БД; промах проверяется в processed_updates
+recent_updates = RecentIdFilter(capacity=settings.recent_updates_size)
+
+# Длиннее — уходит в тред несколькими частями одного сообщения
 TEXT_LIMIT = 4000
+TELEGRAM_MESSAGE_LIMIT = MESSAGE_LIMIT
 WEBHOOK_TIMEOUT = 25  # seconds
 
 _webhook_status: Optional[str] = None
 
+# Сообщения одного чата обрабатываются строго по очереди, разные чаты — параллельно
+chat_dispatcher = ChatDispatcher(max_concurrency=settings.agent_max_concurrency)
+
+# Серия коротких сообщений подряд («Москва», «есть 18») — один ход агента
+chat_coalescer = BurstCoalescer(
+    window=settings.telegram_debounce_ms / 1000,
+    max_wait=settings.telegram_debounce_max_ms / 1000,
+    max_chars=TEXT_LIMIT,
+)
+
+
+# VIP и конфликтные сообщения эскалируем сами, без запуска ассистента
+policy_router = PolicyRouter(
+    (get_policy_spec().get("routing") or {}) if settings.policy_routing_enabled else {}
+)
+
+# Вопросы knockout_rules задаём и оцениваем сами, ассистенту — свободный диалог.
+# Вакансии компилируются всегда: по ним же определяется ключ FAQ-кэша
+screening_engine = ScreeningEngine(get_policy_spec())
+
+# Повторяющиеся вопросы по вакансии (оплата, график, где работать)
+faq_cache = FaqCache(max_size=settings.faq_cache_size, ttl=settings.faq_cache_ttl)
+
+# Ссылки на фоновые задачи, чтобы их не собрал GC
+_background: set[asyncio.Task] = set()
+
+# Сбои, по которым считается доступность OpenAI (ошибки запроса сюда не входят)
+OPENAI_OUTAGE_ERRORS = (APIConnectionError, InternalServerError, RateLimitError)
+OPENAI_OUTAGE_STATUSES = {"timeout", "failed", "expired"}
+
+ESCALATION_FALLBACK_REPLY = (
+    "Понял. Передам ваш кейс ответственному специалисту — он свяжется с вами."
+)
+OPENAI_FALLBACK_REPLY = (
+    "Принял сообщение. Сейчас уточню данные и вернусь к вам чуть позже."
+)
+# Счётчик отложенных повторов и время первого откладывания внутри апдейта
+REPLAY_MARK = "_replays"
+REPLAY_SINCE = "_replay_since"
+REPLAY_GIVE_UP_REPLY = "⚠️ Сейчас не получается ответить. Попробуйте позже."
+PIPELINE_FULL_REPLY = (
+    "Сейчас очень много обращений. Пожалуйста, подождите пару минут "
+    "и напишите ещё раз — мы обязательно ответим."
+)
+
+
+def pipeline_depth() -> int:
+    """Turns waiting for a chat slot or for an assistant run slot."""
+    stats = chat_dispatcher.stats()
+    return stats["queued"] - stats["in_flight"] + openai_limiter.waiting
+
+
+def pipeline_stats() -> dict[str, object]:
+    return {
+        **chat_dispatcher.stats(),
+        "queue_depth": pipeline_depth(),
+        "queue_max": settings.agent_queue_max,
+        "openai": openai_limiter.stats(),
+        "breaker": openai_breaker.stats(),
+    }
+
 
 def _ensure_openai_client() -> AsyncOpenAI:
     if not settings.openai_api_key:
         raise HTTPException(status_code=500, detail="OPENAI_API_KEY is not set")
-    return AsyncOpenAI(api_key=settings.openai_api_key, timeout=20)
+    return get_openai_client()
 
 
 def _ensure_bot_token() -> str:
@@ -52,127 +139,379 @@ def _check_internal_token(request: Request) -> None:
         raise HTTPException(status_code=401, detail="unauthorized")
 
 
-async def _get_or_create_thread(client: AsyncOpenAI, chat_id: int) -> str:
-    cached = user_threads_cache.get(chat_id)
-    if cached:
-        return cached
+_THREAD_SQL = text("SELECT thread_id FROM telegram_users WHERE chat_id = :cid")
+
+# Если другая реплика успела раньше — возвращается её thread_id
+_CLAIM_THREAD_SQL = text(
+    """
+    INSERT INTO telegram_users (chat_id, thread_id, updated_at)
+    VALUES (:cid, :tid, NOW())
+    ON CONFLICT (chat_id) DO UPDATE SET updated_at = NOW()
+    RETURNING thread_id
+    """
+)
+
+
+async def _load_thread(client: AsyncOpenAI, chat_id: int) -> str:
+    async with SessionLocal() as session:
+        res = await session.execute(_THREAD_SQL, {"cid": chat_id})
+        row = res.first()
+    if row and row[0]:
+        return row[0]
 
+    thread = await client.beta.threads.create()
     async with SessionLocal() as session, session.begin():
         res = await session.execute(
-            text("SELECT thread_id FROM telegram_users WHERE chat_id = :cid"),
-            {"cid": chat_id},
+            _CLAIM_THREAD_SQL, {"cid": chat_id, "tid": thread.id}
         )
-        row = res.first()
-        if row and row[0]:
-            user_threads_cache[chat_id] = row[0]
-            return row[0]
+        thread_id = res.scalar_one()
+    if thread_id != thread.id:
+        # Гонку выиграла другая реплика: наш тред никому не нужен
+        _delete_thread_later(client, thread.id)
+    return thread_id
+
+
+async def _get_or_create_thread(client: AsyncOpenAI, chat_id: int) -> str:
+    return await user_threads_cache.get_or_load(
+        chat_id, lambda: _load_thread(client, chat_id)
+    )
 
-        thread = await client.beta.threads.create()
-        thread_id = thread.id
-        await session.execute(
+
+async def warm_thread_cache(limit: int) -> int:
+    """Preload threads of the most recently active chats."""
+    async with SessionLocal() as session:
+        res = await session.execute(
             text(
                 """
-                INSERT INTO telegram_users (chat_id, thread_id, updated_at)
-                VALUES (:cid, :tid, NOW())
-                ON CONFLICT (chat_id) DO UPDATE
-                SET thread_id = EXCLUDED.thread_id, updated_at = NOW()
+                SELECT chat_id, thread_id FROM telegram_users
+                WHERE updated_at IS NOT NULL
+                ORDER BY updated_at DESC
+                LIMIT :limit
                 """
             ),
-            {"cid": chat_id, "tid": thread_id},
+            {"limit": limit},
         )
-        user_threads_cache[chat_id] = thread_id
-        return thread_id
+        return user_threads_cache.warm(res.all())
+
+
+# Дедупликация и поиск треда чата — один запрос и одна транзакция.
+# updated_at — время последней активности чата (по нему греется кэш тредов);
+# чаще раза в минуту строку не переписываем
+_MARK_AND_LOOKUP_SQL = text(
+    """
+    WITH marked AS (
+        INSERT INTO processed_updates (update_id)
+        VALUES (:uid)
+        ON CONFLICT DO NOTHING
+        RETURNING update_id
+    ),
+    touched AS (
+        UPDATE telegram_users SET updated_at = NOW()
+        WHERE chat_id = CAST(:cid AS BIGINT)
+          AND EXISTS (SELECT 1 FROM marked)
+          AND (updated_at IS NULL OR updated_at < NOW() - INTERVAL '1 minute')
+        RETURNING thread_id
+    )
+    SELECT
+        EXISTS (SELECT 1 FROM marked) AS is_new,
+        COALESCE(
+            (SELECT thread_id FROM touched),
+            (SELECT thread_id FROM telegram_users
+             WHERE chat_id = CAST(:cid AS BIGINT))
+        ) AS thread_id,
+        EXISTS (
+            SELECT 1 FROM telegram_update_queue
+            WHERE chat_id = CAST(:cid AS BIGINT)
+              AND status IN ('pending', 'processing')
+        ) AS queued
+    """
+)
+
 
+async def _mark_processed(
+    update_id: int, chat_id: Optional[int] = None
+) -> tuple[bool, Optional[str], bool]:
+    """Mark the update as processed and look up the chat's stored thread.
 
-async def _mark_processed(update_id: int) -> bool:
-    """Return True if this update_id is new and marked, False if already processed."""
+    Returns ``(is_new, thread_id, queued)``; ``is_new`` is False for a
+    duplicate, ``queued`` is True while the chat has an update waiting in
+    ``telegram_update_queue`` (e.g. a deferred replay).
+    """
+    if recent_updates.seen(update_id):
+        return False, None, False
     async with SessionLocal() as session, session.begin():
         res = await session.execute(
-            text(
-                """
-                INSERT INTO processed_updates (update_id)
-                VALUES (:uid)
-                ON CONFLICT DO NOTHING
-                RETURNING update_id
-                """
-            ),
-            {"uid": update_id},
+            _MARK_AND_LOOKUP_SQL, {"uid": update_id, "cid": chat_id}
         )
-        row = res.first()
-        return bool(row)
+        is_new, thread_id, queued = res.one()
+    recent_updates.add(update_id)
+    if thread_id and chat_id is not None:
+        user_threads_cache.set(chat_id, thread_id)
+    return bool(is_new), thread_id, bool(queued)
 
 
-async def send_to_agent(client: AsyncOpenAI, chat_id: int, text_msg: str) -> str:
-    thread_id = await _get_or_create_thread(client, chat_id)
+def _message_content(text_msg: str) -> str | list[dict[str, str]]:
+    """Thread message content; long texts become several text parts."""
+    if len(text_msg) <= TEXT_LIMIT:
+        return text_msg
+    return [{"type": "text", "text": part} for part in split_text(text_msg, TEXT_LIMIT)]
 
-    await client.beta.threads.messages.create(
-        thread_id=thread_id,
-        role="user",
-        content=text_msg,
-    )
 
-    run = await client.beta.threads.runs.create(
-        thread_id=thread_id,
-        assistant_id=_ensure_agent_id(),
-    )
+async def send_to_agent(
+    client: AsyncOpenAI,
+    chat_id: int,
+    text_msg: str,
+    on_delta: Optional[OnDelta] = None,
+    thread_id: Optional[str] = None,
+    context_note: Optional[str] = None,
+) -> str:
+    try:
+        if thread_id is None:
+            thread_id = await _get_or_create_thread(client, chat_id)
 
-    max_iterations = 10  # Защита от бесконечных циклов
-    iteration = 0
+        if context_note:
+            # Итоги локального скрининга, чтобы ассистент не переспрашивал
+            await client.beta.threads.messages.create(
+                thread_id=thread_id,
+                role="assistant",
+                content=context_note,
+            )
 
-    while iteration < max_iterations:
-        iteration += 1
-        run = await client.beta.threads.runs.retrieve(
-            thread_id=thread_id, run_id=run.id
+        await client.beta.threads.messages.create(
+            thread_id=thread_id,
+            role="user",
+            content=_message_content(text_msg),
         )
-        
-        if run.status == "completed":
-            break
-        elif run.status in {"failed", "cancelled", "expired"}:
-            logger.warning(f"Run {run.id} ended with status: {run.status}")
-            return "⚠️ Не удалось получить ответ от агента. Попробуйте позже."
-        elif run.status == "requires_action":
-            # Assistant пытается вызвать функции - НО у нас нет их реализации!
-            # Это означает, что Assistant настроен неправильно
-            logger.error(
-                "Assistant requires_action but no tool handlers configured",
-                extra={"run_id": run.id, "thread_id": thread_id}
-            )
-            # Отменяем run, чтобы не зависнуть
-            await client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run.id)
-            return (
-                "⚠️ Бот пытается использовать инструменты, но они не настроены. "
-                "Обратитесь к администратору для настройки интеграций."
-            )
-        
-        await asyncio.sleep(0.5)
 
-    if iteration >= max_iterations:
-        logger.warning(f"Run {run.id} exceeded max iterations")
+        result = await run_assistant(
+            client,
+            thread_id,
+            _ensure_agent_id(),
+            timeout=settings.assistant_run_timeout,
+            on_delta=on_delta,
+            stream=settings.assistant_streaming,
+        )
+    except OPENAI_OUTAGE_ERRORS:
+        # Отмена (таймаут вебхука, остановка) — не сбой OpenAI
+        openai_breaker.record_failure()
+        raise
+    _record_run_health(result.status)
+
+    if result.status == "completed":
+        return result.text or "⚠️ Агент не вернул текст ответа."
+    if result.status == "requires_action":
+        # Assistant пытается вызвать функции - НО у нас нет их реализации!
+        # Это означает, что Assistant настроен неправильно (run уже отменён)
+        logger.error(
+            "Assistant requires_action but no tool handlers configured",
+            extra={"run_id": result.run_id, "thread_id": thread_id},
+        )
+        return (
+            "⚠️ Бот пытается использовать инструменты, но они не настроены. "
+            "Обратитесь к администратору для настройки интеграций."
+        )
+    if result.status == "timeout":
+        logger.warning(f"Run {result.run_id} exceeded run timeout")
         return "⏳ Обработка занимает слишком много времени. Попробуйте позже."
+    logger.warning(f"Run {result.run_id} ended with status: {result.status}")
+    return "⚠️ Не удалось получить ответ от агента. Попробуйте позже."
 
-    messages = await client.beta.threads.messages.list(
-        thread_id=thread_id, order="desc", limit=5
-    )
-    for msg in messages.data:
-        if msg.role == "assistant" and msg.content:
-            parts = []
-            for part in msg.content:
-                if hasattr(part, "text") and part.text:
-                    parts.append(part.text.value)
-            if parts:
-                return "\n".join(parts)
-    return "⚠️ Агент не вернул текст ответа."
-
-
-async def send_telegram_message(token: str, chat_id: int, text_msg: str) -> None:
+
+def _record_run_health(status: str) -> None:
+    if status in OPENAI_OUTAGE_STATUSES:
+        openai_breaker.record_failure()
+    else:
+        openai_breaker.record_success()
+    if status == "completed":
+        # Лимит растёт только на завершённых запусках, не на таймаутах
+        openai_limiter.on_success()
+
+
+async def _delete_thread(client: AsyncOpenAI, thread_id: str) -> None:
+    try:
+        await client.beta.threads.delete(thread_id)
+    except Exception as exc:  # pragma: no cover - best-effort cleanup
+        logger.warning("Failed to delete thread %s: %s", thread_id, exc)
+
+
+def _delete_thread_later(client: AsyncOpenAI, thread_id: str) -> None:
+    task = asyncio.ensure_future(_delete_thread(client, thread_id))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def answer_faq(
+    client: AsyncOpenAI,
+    faq_key: tuple[str, str, str],
+    vacancy: Vacancy,
+    text_msg: str,
+    on_delta: Optional[OnDelta] = None,
+) -> Optional[str]:
+    """Answer a FAQ question in a throwaway thread and cache the answer.
+
+    The run sees the vacancy the key is scoped to and the question, not the
+    candidate's thread, so its answer is safe to serve to other candidates
+    asking about that vacancy. None if the run did not complete; the
+    question then goes to the candidate's own thread.
+    """
+    context = f"Кандидат спрашивает о вакансии «{vacancy.title}» ({vacancy.key})."
+    try:
+        thread = await client.beta.threads.create(
+            messages=[
+                {"role": "assistant", "content": context},
+                {"role": "user", "content": _message_content(text_msg)},
+            ]
+        )
+        result = await run_assistant(
+            client,
+            thread.id,
+            _ensure_agent_id(),
+            timeout=settings.assistant_run_timeout,
+            on_delta=on_delta,
+            stream=settings.assistant_streaming,
+        )
+    except OPENAI_OUTAGE_ERRORS:
+        # Отмена (таймаут вебхука, остановка) — не сбой OpenAI
+        openai_breaker.record_failure()
+        raise
+    _record_run_health(result.status)
+    _delete_thread_later(client, thread.id)
+    if result.status != "completed" or not result.text:
+        return None
+    faq_cache.set(faq_key, result.text)
+    return result.text
+
+
+def _outbox_chat(chat_id: int | str) -> Optional[int]:
+    try:
+        return int(chat_id)
+    except (TypeError, ValueError):
+        return None  # @username канала в outbox не кладём
+
+
+async def send_telegram_message(
+    token: str,
+    chat_id: int,
+    text_msg: str,
+    edit_message_id: Optional[int] = None,
+    durable: bool = True,
+) -> Optional[int]:
+    """Send a message and return its message_id (None if not delivered yet).
+
+    Long texts are sent as several messages in order; ``edit_message_id``
+    puts the first part into an existing message instead. With the outbox
+    enabled the parts are persisted first and whatever Telegram does not
+    take now is retried in the background; ``durable=False`` is for
+    throwaway messages such as the streaming placeholder.
+    """
+    chat = _outbox_chat(chat_id) if durable and settings.outbox_enabled else None
+    if chat is not None:
+        parts = split_text(text_msg, TELEGRAM_MESSAGE_LIMIT)
+        first_id = None
+        if edit_message_id is not None and await edit_telegram_message(
+            token, chat, edit_message_id, parts[0]
+        ):
+            first_id, parts = edit_message_id, parts[1:]
+        try:
+            delivered = await outbox.deliver(token, chat, parts) if parts else None
+            return first_id or delivered
+        except Exception as exc:
+            logger.warning("Outbox unavailable, sending directly: %s", exc)
+            if first_id is not None:
+                text_msg, edit_message_id = "\n\n".join(parts), None
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            await client.post(
-                f"https://api.telegram.org/bot{token}/sendMessage",
-                json={"chat_id": chat_id, "text": text_msg},
+        data = await telegram.send_message(
+            token, chat_id, text_msg, edit_message_id=edit_message_id
+        )
+        if not data.get("ok"):
+            logger.warning(
+                "Telegram refused reply: %s",
+                data.get("description"),
+                extra={"chat_id": chat_id, "error_code": data.get("error_code")},
             )
+        return (data.get("result") or {}).get("message_id")
     except Exception as exc:  # pragma: no cover - optional log only
         logger.warning("Failed to send Telegram reply: %s", exc)
+    return None
+
+
+async def edit_telegram_message(
+    token: str, chat_id: int, message_id: int, text_msg: str
+) -> bool:
+    try:
+        data = await telegram.edit_message_text(token, chat_id, message_id, text_msg)
+        return bool(data.get("ok"))
+    except Exception as exc:  # pragma: no cover - optional log only
+        logger.warning("Failed to edit Telegram reply: %s", exc)
+    return False
+
+
+class ProgressiveReply:
+    """Placeholder message edited in place while the agent streams its reply.
+
+    Edits run in the background, at most one at a time and not more often
+    than ``interval`` seconds, so a slow Bot API never stalls the stream.
+    """
+
+    PLACEHOLDER = "✍️ Печатаю ответ…"
+    CURSOR = " ▌"
+
+    def __init__(self, token: str, chat_id: int, interval: float) -> None:
+        self.token = token
+        self.chat_id = chat_id
+        self.interval = interval
+        self.message_id: Optional[int] = None
+        self.first_visible_ms: Optional[float] = None
+        self._started = time.perf_counter()
+        self._text = ""
+        self._shown = ""
+        self._last_edit = 0.0
+        self._edit_task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self.message_id = await send_telegram_message(
+            self.token, self.chat_id, self.PLACEHOLDER, durable=False
+        )
+        if self.message_id is not None:
+            self._shown = self.PLACEHOLDER
+            self._last_edit = time.perf_counter()
+            self.first_visible_ms = round((self._last_edit - self._started) * 1000, 2)
+
+    async def on_delta(self, delta: str) -> None:
+        self._text += delta
+        if self.message_id is None:
+            return
+        if self._edit_task is not None and not self._edit_task.done():
+            return
+        if time.perf_counter() - self._last_edit < self.interval:
+            return
+        self._last_edit = time.perf_counter()
+        preview = self._text[: TELEGRAM_MESSAGE_LIMIT - len(self.CURSOR)] + self.CURSOR
+        self._edit_task = asyncio.create_task(self._edit(preview))
+
+    async def finish(self, final_text: str) -> None:
+        if self._edit_task is not None:
+            await asyncio.gather(self._edit_task, return_exceptions=True)
+        if self.message_id is None:
+            await send_telegram_message(self.token, self.chat_id, final_text)
+        elif len(final_text) > TELEGRAM_MESSAGE_LIMIT:
+            # Начало ответа — в плейсхолдер, продолжение — следующими сообщениями
+            await send_telegram_message(
+                self.token, self.chat_id, final_text, edit_message_id=self.message_id
+            )
+        elif final_text != self._shown:
+            await self._edit(final_text)
+            if self._shown != final_text:
+                # Плейсхолдер не удалось отредактировать — ответ отдельным сообщением
+                await send_telegram_message(self.token, self.chat_id, final_text)
+
+    async def _edit(self, text_msg: str) -> None:
+        if text_msg == self._shown:
+            return
+        if await edit_telegram_message(
+            self.token, self.chat_id, self.message_id, text_msg
+        ):
+            self._shown = text_msg
 
 
 async def set_telegram_webhook(auto: bool = False) -> dict[str, object]:
@@ -190,24 +529,17 @@ async def set_telegram_webhook(auto: bool = False) -> dict[str, object]:
     status = "error"
     response_json: dict[str, object] = {}
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            resp = await client.post(
-                f"https://api.telegram.org/bot{token}/setWebhook", json=payload
-            )
-            response_json = resp.json() if resp.content else {}
-            ok = resp.status_code == 200 and response_json.get("ok")
-            status = "ok" if ok else f"fail:{resp.status_code}"
-            
-            # Дополнительная проверка что webhook реально установлен
-            if ok:
-                verify_resp = await client.get(
-                    f"https://api.telegram.org/bot{token}/getWebhookInfo"
-                )
-                verify_data = verify_resp.json() if verify_resp.content else {}
-                actual_url = verify_data.get("result", {}).get("url")
-                if actual_url != url:
-                    status = f"fail:url_mismatch"
-                    logger.warning(f"Webhook URL mismatch: expected {url}, got {actual_url}")
+        response_json = await telegram.call(token, "setWebhook", payload)
+        ok = bool(response_json.get("ok"))
+        status = "ok" if ok else f"fail:{response_json.get('error_code')}"
+
+        # Дополнительная проверка что webhook реально установлен
+        if ok:
+            verify_data = await telegram.call(token, "getWebhookInfo")
+            actual_url = verify_data.get("result", {}).get("url")
+            if actual_url != url:
+                status = f"fail:url_mismatch"
+                logger.warning(f"Webhook URL mismatch: expected {url}, got {actual_url}")
     except Exception as exc:  # pragma: no cover - log only
         response_json = {"ok": False, "description": str(exc)}
         status = f"error:{exc}"
@@ -243,28 +575,24 @@ async def webhook_status_endpoint():
     token = _ensure_bot_token()
     
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            resp = await client.get(
-                f"https://api.telegram.org/bot{token}/getWebhookInfo"
-            )
-            data = resp.json() if resp.content else {}
-            result = data.get("result", {})
-            
-            expected_url = (
-                settings.backend_public_url.rstrip("/") + "/telegram/webhook"
-                if settings.backend_public_url
-                else None
-            )
-            
-            return {
-                "webhook_set": bool(result.get("url")),
-                "webhook_url": result.get("url"),
-                "expected_url": expected_url,
-                "url_matches": result.get("url") == expected_url,
-                "pending_updates": result.get("pending_update_count", 0),
-                "last_error_message": result.get("last_error_message"),
-                "status": get_webhook_status(),
-            }
+        data = await telegram.call(token, "getWebhookInfo")
+        result = data.get("result", {})
+
+        expected_url = (
+            settings.backend_public_url.rstrip("/") + "/telegram/webhook"
+            if settings.backend_public_url
+            else None
+        )
+
+        return {
+            "webhook_set": bool(result.get("url")),
+            "webhook_url": result.get("url"),
+            "expected_url": expected_url,
+            "url_matches": result.get("url") == expected_url,
+            "pending_updates": result.get("pending_update_count", 0),
+            "last_error_message": result.get("last_error_message"),
+            "status": get_webhook_status(),
+        }
     except Exception as exc:
         return {
             "webhook_set": False,
@@ -273,62 +601,335 @@ async def webhook_status_endpoint():
         }
 
 
-@router.post("/webhook")
-async def telegram_webhook(request: Request):
-    request_id = str(uuid4())
+async def _record_local_turn(
+    client: AsyncOpenAI, thread_id: str, user_text: str, reply: str
+) -> None:
+    """Mirror a turn answered without the assistant into its thread."""
+    try:
+        await client.beta.threads.messages.create(
+            thread_id=thread_id, role="user", content=_message_content(user_text)
+        )
+        await client.beta.threads.messages.create(
+            thread_id=thread_id, role="assistant", content=reply
+        )
+    except Exception as exc:  # pragma: no cover - context only, best-effort
+        logger.warning("Failed to mirror local turn: %s", exc)
+
+
+def _mirror_turn_later(
+    client: AsyncOpenAI,
+    chat_id: int,
+    thread_id: Optional[str],
+    user_text: str,
+    reply: str,
+) -> None:
+    """Queue the mirror of a locally answered turn behind the chat's mailbox."""
+
+    async def mirror() -> None:
+        tid = thread_id or await _get_or_create_thread(client, chat_id)
+        await _record_local_turn(client, tid, user_text, reply)
+
+    task = asyncio.ensure_future(chat_dispatcher.submit(chat_id, mirror))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+# Telegram-чат связан с кандидатом CRM только через его задачи follow-up
+_CHAT_CANDIDATE_SQL = text(
+    """
+    SELECT candidate_id FROM followup_tasks
+    WHERE chat_id = :cid
+    ORDER BY updated_at DESC, id DESC
+    LIMIT 1
+    """
+)
+
+
+async def _candidate_for_chat(chat_id: int) -> Optional[int]:
+    """CRM candidate of a Telegram chat, or None if it is unknown."""
+    try:
+        async with SessionLocal() as session:
+            res = await session.execute(_CHAT_CANDIDATE_SQL, {"cid": chat_id})
+            return res.scalar_one_or_none()
+    except Exception as exc:
+        logger.warning("Candidate lookup for chat %s failed: %s", chat_id, exc)
+        return None
+
+
+async def escalate_by_policy(
+    token: str,
+    chat_id: int,
+    text_msg: str,
+    decision: RouteDecision,
+    client: Optional[AsyncOpenAI] = None,
+    thread_id: Optional[str] = None,
+) -> None:
+    """Escalate to a human right away and answer with the vip_or_risk template.
+
+    The CRM note goes to the chat's candidate when one is known; the admin
+    chat is alerted either way.
+    """
+    candidate_id = await _candidate_for_chat(chat_id)
+    if candidate_id is not None:
+        await escalate_to_human(
+            EscalateToHumanPayload(
+                candidate_id=candidate_id,
+                reason=f"{decision.reason} (Telegram chat {chat_id})",
+                priority=decision.priority,
+            )
+        )
+    else:
+        logger.warning("No CRM candidate for chat %s, escalation not noted", chat_id)
+    admin_chat_id = settings.telegram_admin_chat_id
+    if admin_chat_id:
+        await send_telegram_message(
+            token,
+            admin_chat_id,
+            "\n".join(
+                [
+                    f"🚨 Эскалация ({decision.priority}): {decision.reason}",
+                    f"chat_id: {chat_id}",
+                    f"кандидат CRM: {candidate_id or 'не найден'}",
+                    f"правило: {decision.rule_id} ({', '.join(decision.keywords)})",
+                    f"сообщение: {text_msg[:500]}",
+                ]
+            ),
+        )
+    reply = candidate_message("vip_or_risk") or ESCALATION_FALLBACK_REPLY
+    await send_telegram_message(token, chat_id, reply)
+    if client is not None and thread_id:
+        # Через очередь чата: не обгоняем запуск, уже идущий в этом треде
+        _mirror_turn_later(client, chat_id, thread_id, text_msg, reply)
+
+
+async def _screen(chat_id: int, text_msg: str) -> Optional[ScreeningTurn]:
+    """Run the local screening step for a message (None if not screening)."""
+    state = await load_screening_state(chat_id)
+    if state is None:
+        turn = screening_engine.start(text_msg)
+    else:
+        turn = screening_engine.step(state, text_msg)
+    if turn is None:
+        return None
+    # Итоги помечаются увиденными только после хода ассистента
+    if turn.state != state:
+        await save_screening_state(chat_id, turn.state)
+    return turn
+
+
+async def _mark_screening_synced(chat_id: int, turn: ScreeningTurn) -> None:
+    """Record that the assistant's thread got the turn's screening note."""
+    try:
+        await save_screening_state(chat_id, screening_engine.synced(turn.state))
+    except Exception as exc:
+        # Итоги уйдут ассистенту ещё раз — лучше повтор, чем потеря
+        logger.warning("Failed to mark screening synced for %s: %s", chat_id, exc)
+
+
+def _replay_payload(update: dict[str, Any], text_msg: str) -> dict[str, Any]:
+    """Copy of the update to replay later, with the (coalesced) turn text."""
+    key = "message" if update.get("message") else "edited_message"
+    message = {**(update.get(key) or {}), "text": text_msg}
+    return {
+        **update,
+        key: message,
+        REPLAY_MARK: update.get(REPLAY_MARK, 0) + 1,
+        REPLAY_SINCE: update.get(REPLAY_SINCE, time.time()),
+    }
+
+
+def _replay_exhausted(replay: dict[str, Any]) -> bool:
+    return (
+        replay[REPLAY_MARK] > settings.openai_replay_max_attempts
+        or time.time() - replay[REPLAY_SINCE] > settings.openai_replay_max_age
+    )
+
+
+def _extract_message(update: dict[str, Any]) -> tuple[Optional[int], str]:
+    message = update.get("message") or update.get("edited_message") or {}
+    chat = message.get("chat") or {}
+    return chat.get("id"), message.get("text") or ""
+
+
+async def process_update(
+    update: dict[str, Any], request_id: Optional[str] = None, dedupe: bool = True
+) -> None:
+    """Run the agent pipeline for one update and reply to the chat.
+
+    ``dedupe=False`` is used by queue workers: the update was already marked
+    as processed when it was enqueued.
+    """
+    request_id = request_id or str(uuid4())
     started = time.perf_counter()
     chat_id: Optional[int] = None
     thread_id: Optional[str] = None
     update_id: Optional[int] = None
+    first_visible_ms: Optional[float] = None
     outcome = "ok"
 
     try:
         token = _ensure_bot_token()
         client = _ensure_openai_client()
 
-        update = await request.json()
         update_id = update.get("update_id")
         if update_id is None:
-            return {"ok": True}
+            return
+
+        chat_id, text_msg = _extract_message(update)
 
         # Idempotency check
-        is_new = await _mark_processed(update_id)
-        if not is_new:
-            outcome = "duplicate"
-            return {"ok": True}
+        if dedupe:
+            is_new, thread_id, queued = await _mark_processed(update_id, chat_id)
+            if not is_new:
+                outcome = "duplicate"
+                return
+            if queued:
+                # У чата ждёт отложенный ход: встаём в очередь за ним
+                await defer_update(update_id, chat_id, update, 0)
+                notify_workers()
+                outcome = "queued_behind"
+                return
 
         message = update.get("message") or update.get("edited_message")
         if not message:
             outcome = "no_message"
-            return {"ok": True}
-
-        chat = message.get("chat") or {}
-        chat_id = chat.get("id")
-        text_msg = message.get("text") or ""
+            return
 
         if not chat_id or not text_msg:
             outcome = "no_chat_or_text"
-            return {"ok": True}
+            return
 
-        if len(text_msg) > TEXT_LIMIT:
-            await send_telegram_message(
+        decision = policy_router.route(text_msg) if policy_router else None
+        if decision is not None:
+            await escalate_by_policy(
                 token,
                 chat_id,
-                "Сообщение слишком длинное. Пожалуйста, разделите на части.",
+                text_msg,
+                decision,
+                client,
+                thread_id or user_threads_cache.get(chat_id),
             )
-            outcome = "too_long"
-            return {"ok": True}
+            outcome = f"escalated:{decision.rule_id}"
+            return
+
+        # Воркеры очереди не сбрасывают: апдейт уже сохранён и дождётся своей очереди
+        if dedupe and 0 < settings.agent_queue_max <= pipeline_depth():
+            await send_telegram_message(token, chat_id, PIPELINE_FULL_REPLY)
+            outcome = "shed"
+            return
+
+        burst = None
+        # Воркер очереди берёт апдейты чата по одному: серия не соберётся,
+        # а окно склейки только задержит ход
+        if chat_coalescer.enabled and dedupe:
+            burst = chat_coalescer.join(chat_id, text_msg)
+            if burst is None:
+                # Текст уйдёт агенту вместе с открытой серией этого чата
+                outcome = "coalesced"
+                return
+
+        progressive = (
+            ProgressiveReply(token, chat_id, settings.telegram_edit_interval)
+            if settings.telegram_progressive_replies and settings.assistant_streaming
+            else None
+        )
 
         async def process() -> str:
-            nonlocal thread_id
-            thread_id = await _get_or_create_thread(client, chat_id=chat_id)
-            return await send_to_agent(client, chat_id=chat_id, text_msg=text_msg)
+            nonlocal thread_id, text_msg, outcome
+            if burst is not None:
+                text_msg = await chat_coalescer.settle(chat_id, burst)
+            turn = (
+                await _screen(chat_id, text_msg)
+                if settings.screening_enabled and screening_engine
+                else None
+            )
+            if turn is not None and turn.reply:
+                outcome = f"screening:{turn.outcome}"
+                return turn.reply
+
+            faq_key, vacancy = None, None
+            if turn is None or not turn.note:
+                vacancy = (
+                    screening_engine.vacancies.get(turn.state.vacancy_key)
+                    if turn is not None
+                    else screening_engine.detect_vacancy(text_msg)
+                )
+            if vacancy is not None:
+                faq_key = faq_cache.key(vacancy.key, text_msg)
+            cached = faq_cache.get(faq_key) if faq_key is not None else None
+            if cached is not None:
+                outcome = "faq_cache"
+                _mirror_turn_later(client, chat_id, thread_id, text_msg, cached)
+                return cached
+            if not openai_breaker.allow():
+                raise CircuitOpenError("openai circuit is open")
+            if progressive is not None:
+                await progressive.start()
+            async with openai_limiter.slot():
+                on_delta = progressive.on_delta if progressive is not None else None
+                if faq_key is not None:
+                    answer = await answer_faq(
+                        client, faq_key, vacancy, text_msg, on_delta
+                    )
+                    if answer is not None:
+                        outcome = "faq_answer"
+                        _mirror_turn_later(client, chat_id, thread_id, text_msg, answer)
+                        return answer
+                if thread_id is None:
+                    thread_id = await _get_or_create_thread(client, chat_id=chat_id)
+                reply = await send_to_agent(
+                    client,
+                    chat_id=chat_id,
+                    text_msg=text_msg,
+                    on_delta=on_delta,
+                    thread_id=thread_id,
+                    context_note=turn.note if turn is not None else None,
+                )
+                if turn is not None and turn.note:
+                    await _mark_screening_synced(chat_id, turn)
+                return reply
+
+        delivered = False
+
+        async def deliver(reply: str) -> None:
+            nonlocal delivered, first_visible_ms
+            delivered = True
+            if progressive is not None:
+                await progressive.finish(reply)
+                first_visible_ms = progressive.first_visible_ms
+            else:
+                await send_telegram_message(token, chat_id, reply)
+
+        async def process_and_deliver() -> None:
+            # Ответ уходит, пока чат занят: части длинного ответа не смешаются
+            # со следующим ходом этого же чата
+            await deliver(await process())
 
         try:
-            reply = await asyncio.wait_for(process(), timeout=WEBHOOK_TIMEOUT)
+            await asyncio.wait_for(
+                chat_dispatcher.submit(chat_id, process_and_deliver),
+                timeout=WEBHOOK_TIMEOUT,
+            )
+        except CircuitOpenError:
+            outcome = "circuit_open"
+            # Сообщение не теряется: повторим его, когда OpenAI оживёт
+            replay = _replay_payload(update, text_msg)
+            if _replay_exhausted(replay):
+                outcome = "replay_expired"
+                await deliver(REPLAY_GIVE_UP_REPLY)
+                return
+            if not update.get(REPLAY_MARK):
+                fallback = candidate_message("openai_error") or OPENAI_FALLBACK_REPLY
+                await deliver(fallback)
+            delay = max(openai_breaker.retry_after(), 1.0)
+            if not dedupe:
+                raise UpdateDeferred(replay, delay)
+            await defer_update(update_id, chat_id, replay, delay)
+            notify_workers()
         except asyncio.TimeoutError:
-            outcome = "timeout"
-            reply = "⏳ Ответ занимает дольше обычного. Попробуйте ещё раз."
+            if not delivered:
+                outcome = "timeout"
+                await deliver("⏳ Ответ занимает дольше обычного. Попробуйте ещё раз.")
         except Exception as exc:  # pragma: no cover
             outcome = "openai_error"
             logger.warning(
@@ -343,9 +944,14 @@ async def telegram_webhook(request: Request):
                     "error": str(exc),
                 },
             )
-            reply = "⚠️ Сейчас не получается ответить. Попробуйте позже."
-
-        await send_telegram_message(token, chat_id, reply)
+            if not delivered:
+                await deliver(REPLAY_GIVE_UP_REPLY)
+        finally:
+            if burst is not None:
+                # Серия не должна пережить своего лидера
+                chat_coalescer.close(chat_id, burst)
+    except UpdateDeferred:
+        raise
     except Exception as exc:  # pragma: no cover - always ack
         outcome = "error"
         logger.warning(
@@ -371,7 +977,78 @@ async def telegram_webhook(request: Request):
                 "chat_id": chat_id,
                 "thread_id": thread_id,
                 "duration_ms": duration_ms,
+                "first_visible_ms": first_visible_ms,
                 "outcome": outcome,
             },
         )
+
+
+async def handle_queued_update(update: dict[str, Any]) -> None:
+    """Worker entrypoint for updates persisted by the fast-ack webhook.
+
+    Also replays updates deferred while the OpenAI circuit was open.
+    """
+    await process_update(update, dedupe=False)
+
+
+async def _enqueue(update: dict[str, Any], request_id: str) -> None:
+    started = time.perf_counter()
+    update_id = update.get("update_id")
+    if update_id is None:
+        return
+    chat_id, _ = _extract_message(update)
+    try:
+        queued = not recent_updates.seen(update_id) and await enqueue_update(
+            update_id, chat_id, update
+        )
+    except Exception as exc:
+        # Не отвечаем 200: Telegram доставит апдейт повторно, когда БД оживёт
+        logger.warning(
+            "Telegram update enqueue failed",
+            extra={
+                "event": "telegram_webhook",
+                "request_id": request_id,
+                "update_id": update_id,
+                "chat_id": chat_id,
+                "error": str(exc),
+            },
+        )
+        raise HTTPException(status_code=503, detail="queue unavailable")
+
+    recent_updates.add(update_id)
+    if queued:
+        notify_workers()
+    logger.info(
+        "webhook queued",
+        extra={
+            "event": "telegram_webhook",
+            "request_id": request_id,
+            "update_id": update_id,
+            "chat_id": chat_id,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+            "outcome": "queued" if queued else "duplicate",
+        },
+    )
+
+
+@router.post("/webhook")
+async def telegram_webhook(request: Request):
+    request_id = str(uuid4())
+    try:
+        update = await request.json()
+    except Exception as exc:  # pragma: no cover - always ack
+        logger.warning(
+            "Telegram webhook payload error",
+            extra={
+                "event": "telegram_webhook",
+                "request_id": request_id,
+                "error": str(exc),
+            },
+        )
+        return {"ok": True}
+
+    if settings.telegram_update_mode == "queue":
+        await _enqueue(update, request_id)
+    else:
+        await process_update(update, request_id=request_id)
     return {"ok": True}
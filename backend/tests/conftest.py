@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+# Без ключа хеши контактов не считаются, а на них держатся тесты дублей
+os.environ.setdefault("DEDUPE_HASH_KEY", "test-dedupe-key")
+
+
+class _Result:
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def all(self):
+        return list(self.rows)
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+    def scalars(self):
+        return iter(row[0] for row in self.rows)
+
+    def scalar_one(self):
+        [row] = self.rows
+        return row[0]
+
+    def scalar_one_or_none(self):
+        return self.rows[0][0] if self.rows else None
+
+
+@pytest.fixture
+def fake_session():
+    """Stand-in for ``SessionLocal``: records statements, answers from ``rows``.
+
+    ``rows`` maps a statement to its result rows, or to a function of the
+    bound parameters returning them.
+    """
+
+    class _Session:
+        executed: list[tuple] = []
+        rows: dict = {}
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        def begin(self):
+            return self
+
+        async def execute(self, statement, params=None):
+            self.executed.append((statement, params))
+            rows = self.rows.get(statement, ())
+            return _Result(rows(params) if callable(rows) else rows)
+
+        @classmethod
+        def params(cls, statement):
+            return [params for sql, params in cls.executed if sql is statement]
+
+    return _Session
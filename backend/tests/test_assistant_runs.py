@@ -0,0 +1,152 @@
+from pathlib import Path
+from types import SimpleNamespace as NS
+
+import pytest
+
+from app.core import assistant_runs
+from app.core.assistant_runs import run_assistant
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def _text_part(value: str) -> NS:
+    return NS(text=NS(value=value))
+
+
+class _Stream:
+    def __init__(self, events):
+        self._events = events
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def __aiter__(self):
+        for event in self._events:
+            yield event
+
+
+class _FakeRuns:
+    def __init__(self, stream_events=None, statuses=(), latest=None):
+        self._stream_events = stream_events
+        self._statuses = list(statuses)
+        self._latest = latest
+        self.retrieved = 0
+        self.created = 0
+
+    def stream(self, **kwargs):
+        if self._stream_events is None:
+            raise RuntimeError("stream unavailable")
+        return _Stream(self._stream_events)
+
+    async def list(self, **kwargs):
+        return NS(data=[self._latest] if self._latest is not None else [])
+
+    async def create(self, **kwargs):
+        self.created += 1
+        return NS(id="run_poll")
+
+    async def retrieve(self, **kwargs):
+        self.retrieved += 1
+        return NS(id=kwargs["run_id"], status=self._statuses.pop(0))
+
+    async def cancel(self, **kwargs):
+        return None
+
+
+class _FakeMessages:
+    def __init__(self):
+        self.listed_with = None
+
+    async def list(self, **kwargs):
+        self.listed_with = kwargs
+        return NS(data=[NS(role="assistant", content=[_text_part("Ответ по run")])])
+
+
+def _client(runs: _FakeRuns) -> NS:
+    messages = _FakeMessages()
+    return NS(beta=NS(threads=NS(runs=runs, messages=messages)))
+
+
+@pytest.mark.anyio
+async def test_streaming_run_collects_deltas_and_final_message():
+    events = [
+        NS(event="thread.run.created", data=NS(id="run_1")),
+        NS(
+            event="thread.message.delta",
+            data=NS(delta=NS(content=[_text_part("При")])),
+        ),
+        NS(
+            event="thread.message.delta",
+            data=NS(delta=NS(content=[_text_part("вет")])),
+        ),
+        NS(
+            event="thread.message.completed",
+            data=NS(content=[_text_part("Привет")]),
+        ),
+        NS(event="thread.run.completed", data=NS(id="run_1", status="completed")),
+    ]
+    deltas: list[str] = []
+
+    async def on_delta(value: str) -> None:
+        deltas.append(value)
+
+    result = await run_assistant(
+        _client(_FakeRuns(events)), "thread", "asst", timeout=5, on_delta=on_delta
+    )
+
+    assert result.status == "completed"
+    assert result.text == "Привет"
+    assert result.run_id == "run_1"
+    assert deltas == ["При", "вет"]
+
+
+@pytest.mark.anyio
+async def test_falls_back_to_polling_and_fetches_message_of_this_run(monkeypatch):
+    monkeypatch.setattr(assistant_runs, "POLL_INITIAL_DELAY", 0)
+    runs = _FakeRuns(statuses=["queued", "in_progress", "completed"])
+    client = _client(runs)
+
+    result = await run_assistant(client, "thread", "asst", timeout=5)
+
+    assert result.status == "completed"
+    assert result.text == "Ответ по run"
+    assert runs.retrieved == 3
+    assert client.beta.threads.messages.listed_with["run_id"] == "run_poll"
+
+
+@pytest.mark.anyio
+async def test_polling_gives_up_at_deadline():
+    runs = _FakeRuns(statuses=["in_progress"] * 100)
+
+    result = await run_assistant(_client(runs), "thread", "asst", timeout=0.3)
+
+    assert result.status == "timeout"
+    assert result.run_id == "run_poll"
+
+
+@pytest.mark.anyio
+async def test_fallback_polls_the_run_the_broken_stream_already_started(monkeypatch):
+    monkeypatch.setattr(assistant_runs, "POLL_INITIAL_DELAY", 0)
+    runs = _FakeRuns(
+        statuses=["in_progress", "completed"],
+        latest=NS(id="run_stream", status="queued"),
+    )
+    client = _client(runs)
+
+    result = await run_assistant(client, "thread", "asst", timeout=5)
+
+    assert result.status == "completed"
+    assert result.run_id == "run_stream"
+    assert runs.created == 0
+
+
+def test_bot_copy_matches_backend_module():
+    backend = Path(assistant_runs.__file__)
+    bot = Path(__file__).resolve().parents[2] / "bot" / "assistant_runs.py"
+    assert bot.read_text() == backend.read_text(), "run `make sync-bot`"
@@ -0,0 +1,162 @@
+import httpx
+import pytest
+
+from app.integrations import avito_sync
+from app.integrations.avito_sync import AvitoFeedError, AvitoSync, candidate_rows
+from app.integrations.base import ProviderClient
+from app.integrations.stub_server import create_avito_stub_app
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def _feed(count):
+    return [
+        {"id": f"r{n}", "name": f"Кандидат {n}", "phone": f"+7900000{n:04d}"}
+        for n in range(1, count + 1)
+    ]
+
+
+def _sync(app, **kwargs):
+    client = ProviderClient(
+        "avito", base_url="http://avito", transport=httpx.ASGITransport(app=app)
+    )
+    options = {"page_size": 10, "concurrency": 3, "max_retries": 3, "backoff": 0}
+    options.update(kwargs)
+    return AvitoSync(client, interval=60, **options)
+
+
+@pytest.mark.anyio
+async def test_fetch_reads_all_pages_of_one_snapshot():
+    app = create_avito_stub_app(_feed(25))
+    sync = _sync(app)
+
+    delta = await sync.fetch()
+
+    assert [item["id"] for item in delta.items] == [f"r{n}" for n in range(1, 26)]
+    assert delta.pages == 3 and delta.cursor == "25"
+    # Страницы 2..N запрошены по срезу первой
+    assert {r.get("until") for r in app.state.requests[1:]} == {"25"}
+    await sync.client.aclose()
+
+
+@pytest.mark.anyio
+async def test_next_poll_sends_only_new_items_or_gets_304():
+    app = create_avito_stub_app(_feed(12))
+    sync = _sync(app)
+    first = await sync.fetch()
+
+    idle = await sync.fetch(first.cursor, first.etag)
+    app.state.responses.extend(_feed(14)[12:])
+    fresh = await sync.fetch(first.cursor, first.etag)
+
+    assert idle.not_modified and idle.cursor == "12"
+    assert [item["id"] for item in fresh.items] == ["r13", "r14"]
+    assert fresh.cursor == "14"
+    await sync.client.aclose()
+
+
+@pytest.mark.anyio
+async def test_throttled_feed_is_retried_then_given_up():
+    app = create_avito_stub_app(_feed(3), throttle=2)
+    sync = _sync(app)
+
+    delta = await sync.fetch()
+
+    assert len(delta.items) == 3 and sync.retries == 2
+    app.state.throttle = 10
+    with pytest.raises(AvitoFeedError):
+        await sync.fetch()
+    await sync.client.aclose()
+
+
+class _LockConn:
+    def __init__(self, free):
+        self.free = free
+        self.unlocked = self.closed = False
+
+    async def execution_options(self, **kwargs):
+        return self
+
+    async def scalar(self, statement, params):
+        return self.free
+
+    async def execute(self, statement, params):
+        self.unlocked = True
+
+    async def close(self):
+        self.closed = True
+
+
+class _Engine:
+    def __init__(self, free=True):
+        self.conn = _LockConn(free)
+
+    async def connect(self):
+        return self.conn
+
+
+@pytest.mark.anyio
+async def test_sync_writes_page_by_page_and_moves_cursor_last(
+    monkeypatch, fake_session
+):
+    fake_session.rows[avito_sync._UPSERT_SQL] = lambda params: [
+        (n, True) for n, _ in enumerate(params["ids"])
+    ]
+    engine = _Engine()
+    monkeypatch.setattr(avito_sync, "SessionLocal", fake_session)
+    monkeypatch.setattr(avito_sync, "engine", engine)
+    sync = _sync(create_avito_stub_app(_feed(25)))
+
+    delta = await sync.sync_once()
+
+    writes = [sql for sql, _ in fake_session.executed]
+    upserts = fake_session.params(avito_sync._UPSERT_SQL)
+    assert [len(rows["ids"]) for rows in upserts] == [10, 10, 5]
+    assert writes[-1] is avito_sync._SAVE_CURSOR_SQL
+    assert delta.cursor == "25" and sync.inserted == 25
+    assert engine.conn.unlocked and engine.conn.closed
+    await sync.client.aclose()
+
+
+@pytest.mark.anyio
+async def test_sync_is_skipped_while_another_replica_holds_the_lock(
+    monkeypatch, fake_session
+):
+    app = create_avito_stub_app(_feed(3))
+    engine = _Engine(free=False)
+    monkeypatch.setattr(avito_sync, "SessionLocal", fake_session)
+    monkeypatch.setattr(avito_sync, "engine", engine)
+    sync = _sync(app)
+
+    assert await sync.sync_once() is None
+
+    assert sync.skipped == 1 and not app.state.requests
+    assert fake_session.executed == [] and engine.conn.closed
+    await sync.client.aclose()
+
+
+def test_candidate_rows_keep_last_version_of_each_response():
+    rows = candidate_rows(
+        [
+            {"id": "r1", "name": "Старое имя"},
+            {"id": "r2", "vacancy": "Курьер", "message": "Здравствуйте"},
+            {"id": "r1", "name": "Иван", "email": "ivan@example.com"},
+        ]
+    )
+
+    assert rows["ids"] == ["r1", "r2"]
+    assert rows["names"] == ["Иван", "Avito r2"]
+    assert rows["emails"] == ["ivan@example.com", None]
+    assert rows["notes"] == [None, "Курьер\nЗдравствуйте"]
+
+
+def test_candidate_rows_skip_ids_the_column_cannot_hold():
+    rows = candidate_rows(
+        [{"id": "r1"}, {"id": "x" * 65}, {"id": "  "}, {"id": 42, "name": "Ольга"}]
+    )
+
+    assert rows["ids"] == ["r1", "42"]
+    assert rows["names"] == ["Avito r1", "Ольга"]
@@ -0,0 +1,35 @@
+import time
+
+from app.core.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+def test_opens_after_consecutive_failures_and_probes_after_recovery(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=2, recovery_time=30)
+
+    breaker.record_failure()
+    breaker.record_success()  # успех обнуляет серию
+    breaker.record_failure()
+    assert breaker.allow() and breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow()
+
+    now[0] += 30
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # одна проба за раз
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.retry_after() == 30
+
+    now[0] += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow()
+
+
+def test_disabled_breaker_never_rejects():
+    breaker = CircuitBreaker(failure_threshold=0, recovery_time=30)
+    for _ in range(10):
+        breaker.record_failure()
+    assert breaker.allow() and breaker.state == CLOSED
@@ -0,0 +1,21 @@
+from app.core.chunking import split_text
+
+
+def test_short_text_is_one_part():
+    assert split_text("Привет", 10) == ["Привет"]
+
+
+def test_prefers_paragraph_then_sentence_boundaries():
+    text = "Первый абзац.\n\nВторой абзац. Ещё одно предложение."
+    assert split_text(text, 30) == [
+        "Первый абзац.",
+        "Второй абзац.",
+        "Ещё одно предложение.",
+    ]
+
+
+def test_hard_cut_when_no_boundary_and_text_is_kept():
+    text = "а" * 25
+    parts = split_text(text, 10)
+    assert parts == ["а" * 10, "а" * 10, "а" * 5]
+    assert "".join(parts) == text
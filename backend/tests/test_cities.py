@@ -0,0 +1,27 @@
+from app.hr.cities import CityIndex, get_city_index
+from app.tools.router import CreateCandidatePayload
+
+
+def test_aliases_inflections_and_typos_resolve_to_canonical_city():
+    index = get_city_index()
+
+    for spelling in ["Питер", "спб", "С-Петербург", "санкт петербург", "Петербурге"]:
+        assert index.lookup(spelling) == "Санкт-Петербург"
+    assert index.lookup("масква") == "Москва"
+    assert index.lookup("Мосвка") == "Москва"
+    assert index.lookup("Казани") == "Казань"
+    assert index.find("я живу в Новосибирске") == "Новосибирск"
+
+
+def test_unknown_and_short_names_are_not_guessed():
+    index = CityIndex(["Казань", "Москва"], {"Мск": "Москва"})
+
+    assert index.lookup("Рязань") is None
+    assert index.lookup("нск") is None
+    assert index.find("есть 18, смартфон есть") is None
+
+
+def test_candidate_payload_gets_canonical_city():
+    payload = CreateCandidatePayload(full_name="Иван", city=" спб ")
+    assert payload.city == "Санкт-Петербург"
+    assert CreateCandidatePayload(full_name="Иван", city="Тула").city == "Тула"
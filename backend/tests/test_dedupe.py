@@ -0,0 +1,135 @@
+import pytest
+
+from app.hr import dedupe
+from app.hr.dedupe import Registration, contact_hashes, normalize_email, normalize_phone
+from app.hr.models import Source
+
+PHONE_HASH, EMAIL_HASH = contact_hashes("+79123456789", "ivan@example.com")
+OTHER_PHONE_HASH, _ = contact_hashes("+79990000000", None)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def test_phones_normalize_to_e164():
+    for raw in ("8 (912) 345-67-89", "+7 912 345 67 89", "9123456789", "79123456789"):
+        assert normalize_phone(raw) == "+79123456789"
+    assert normalize_phone("+7 912 345-67-89 доб. 12") == "+79123456789"
+    assert normalize_phone("0049 30 1234567") == "+49301234567"
+    assert normalize_phone("+375 29 123-45-67") == "+375291234567"
+
+
+def test_garbage_phones_are_dropped():
+    for raw in (None, "", "нет", "123", "0123456789"):
+        assert normalize_phone(raw) is None
+
+
+def test_emails_are_trimmed_and_casefolded():
+    assert normalize_email("  Ivan.Petrov@Example.COM ") == "ivan.petrov@example.com"
+    assert normalize_email("mailto:HR@example.com") == "hr@example.com"
+    assert normalize_email("not-an-email") is None
+
+
+def test_same_contact_in_any_spelling_gets_one_key():
+    assert contact_hashes("8 912 345 67 89", "IVAN@example.com") == contact_hashes(
+        "+79123456789", "ivan@example.com"
+    )
+    phone_hash, email_hash = contact_hashes("+79123456789", None)
+    assert len(phone_hash) == 64 and email_hash is None
+
+
+@pytest.mark.anyio
+async def test_nothing_is_hashed_without_a_key(monkeypatch, fake_session):
+    monkeypatch.setattr(dedupe.settings, "dedupe_hash_key", "")
+    monkeypatch.setattr(dedupe, "SessionLocal", fake_session)
+
+    assert contact_hashes("+79123456789", "ivan@example.com") == (None, None)
+    # Пересчёт без ключа стёр бы все хеши
+    with pytest.raises(RuntimeError):
+        await dedupe.backfill_contact_hashes()
+    assert fake_session.executed == []
+
+
+async def _register(session, phone="8 912 345 67 89", email="ivan@example.com"):
+    return await dedupe.register_candidate(
+        session(), "Иван", phone, email, Source.AVITO
+    )
+
+
+@pytest.mark.anyio
+async def test_new_contact_is_inserted_without_a_primary(fake_session):
+    fake_session.rows[dedupe._INSERT_SQL] = [(5,)]
+
+    assert await _register(fake_session) == Registration(5)
+
+    [insert] = fake_session.params(dedupe._INSERT_SQL)
+    assert insert["phone"] == "+79123456789" and insert["source"] == "AVITO"
+    assert insert["phone_hash"] == PHONE_HASH and insert["duplicate_of_id"] is None
+
+
+@pytest.mark.anyio
+async def test_matching_contact_fills_gaps_of_the_existing_record(fake_session):
+    # Найден по телефону, почты у него ещё нет — сливаем
+    fake_session.rows[dedupe._FIND_PRIMARY_SQL] = [(3, None, PHONE_HASH, None)]
+
+    registration = await _register(fake_session)
+
+    assert registration == Registration(3, duplicate_of=3, merged=True)
+    [merge] = fake_session.params(dedupe._MERGE_SQL)
+    assert merge["id"] == 3 and merge["email_hash"] == EMAIL_HASH
+    assert merge["note"] == "Повторный отклик (avito): Иван"
+    assert fake_session.params(dedupe._INSERT_SQL) == []
+
+
+@pytest.mark.anyio
+async def test_conflicting_contact_is_inserted_and_linked_to_the_primary(
+    fake_session,
+):
+    # Почта совпала с дублем #4 основной записи #3, а телефон у него другой
+    fake_session.rows[dedupe._FIND_PRIMARY_SQL] = [(4, 3, OTHER_PHONE_HASH, EMAIL_HASH)]
+    fake_session.rows[dedupe._INSERT_SQL] = [(6,)]
+
+    assert await _register(fake_session) == Registration(6, duplicate_of=3)
+
+    assert fake_session.params(dedupe._MERGE_SQL) == []
+    [insert] = fake_session.params(dedupe._INSERT_SQL)
+    assert insert["duplicate_of_id"] == 3
+
+
+@pytest.mark.anyio
+async def test_link_duplicates_counts_relinked_rows(fake_session):
+    fake_session.rows[dedupe._LINK_SQL] = [(7,), (9,)]
+
+    assert await dedupe.link_duplicates(fake_session(), []) == 0
+    assert await dedupe.link_duplicates(fake_session(), [7, 8, 9]) == 2
+    assert fake_session.params(dedupe._LINK_SQL) == [{"ids": [7, 8, 9]}]
+
+
+@pytest.mark.anyio
+async def test_backfill_rehashes_stale_rows_and_links_every_page(
+    monkeypatch, fake_session
+):
+    pages = {
+        0: [
+            (1, "8 912 345 67 89", "IVAN@example.com", None, None),
+            (2, "+79123456789", "ivan@example.com", PHONE_HASH, EMAIL_HASH),
+        ],
+        2: [(3, "не помню", None, "stale", None)],
+    }
+    fake_session.rows[dedupe._BACKFILL_PAGE_SQL] = lambda p: pages[p["after_id"]]
+    fake_session.rows[dedupe._LINK_SQL] = lambda p: [(2,)] if 2 in p["ids"] else []
+    monkeypatch.setattr(dedupe, "SessionLocal", fake_session)
+
+    stats = await dedupe.backfill_contact_hashes(batch_size=2)
+
+    first, second = fake_session.params(dedupe._BACKFILL_UPDATE_SQL)
+    assert first == {
+        "ids": [1],
+        "phone_hashes": [PHONE_HASH],
+        "email_hashes": [EMAIL_HASH],
+    }
+    assert second == {"ids": [3], "phone_hashes": [None], "email_hashes": [None]}
+    assert [p["ids"] for p in fake_session.params(dedupe._LINK_SQL)] == [[1, 2], [3]]
+    assert (stats.scanned, stats.hashed, stats.linked, stats.batches) == (3, 2, 1, 2)
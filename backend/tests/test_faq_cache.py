@@ -0,0 +1,37 @@
+from app.hr.faq import FaqCache, question_key
+
+
+def test_question_key_normalizes_wording_and_skips_personal_messages():
+    assert question_key("Сколько платят?") == question_key("а сколько у вас платят")
+    assert question_key("Какой график?") != question_key("Сколько платят?")
+    assert question_key("Мне 19, сколько платят?") is None
+    assert question_key("Я из Москвы, смартфон есть") is None
+    # Адрес зависит от города кандидата, а его в ключе нет
+    assert question_key("Где находится склад?") is None
+
+
+def test_question_key_needs_a_full_topic_stem():
+    assert question_key("Сколько часов смена?") is not None
+    assert question_key("Сколько в час?") is not None
+    assert question_key("Какая у вас платформа?") is None
+    assert question_key("Можно сменить вакансию?") is None
+    assert question_key("Часто пишете?") is None
+
+
+def test_cache_is_scoped_by_vacancy_and_dropped_on_policy_change():
+    version = ["v1"]
+    cache = FaqCache(max_size=2, ttl=60, version_check=0, version=lambda: version[0])
+
+    key = cache.key("courier_walk_bike", "Сколько платят?")
+    assert cache.get(key) is None
+    cache.set(key, "от 3000 ₽ в день")
+    assert cache.get(cache.key("courier_walk_bike", "а сколько платят")) == (
+        "от 3000 ₽ в день"
+    )
+    assert cache.get(cache.key("courier_auto", "Сколько платят?")) is None
+    assert cache.key(None, "Сколько платят?") is None
+
+    version[0] = "v2"
+    assert cache.get(cache.key("courier_walk_bike", "Сколько платят?")) is None
+    assert cache.stats()["invalidations"] == 1
+    assert cache.stats()["hits"] == 1
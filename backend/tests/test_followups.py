@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.hr import followups
+from app.hr.followups import DueTask, load_plans, plan_step
+from app.hr.models import CandidateStatus
+from app.hr.policy import get_policy_spec
+
+plans = load_plans(get_policy_spec())
+plan = plans["waiting_docs_24h"]
+now = datetime(2026, 10, 17, 12, 0)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def _task(attempts=0, status="DOCS_PENDING", chat_id=42):
+    return DueTask(1, 10, chat_id, plan.plan_id, attempts, now, status)
+
+
+def test_plan_is_read_from_the_spec():
+    assert plan.status == CandidateStatus.DOCS_PENDING
+    assert plan.max_attempts == 3 and plan.after_hours == 24
+    assert plan.exhausted_status == CandidateStatus.ESCALATED
+
+
+def test_sends_next_template_and_reschedules():
+    step = plan_step(_task(attempts=1), plan, now)
+    assert step.send == plan.templates[1]
+    assert step.attempts == 2
+    assert step.due_at == now + timedelta(hours=24)
+    assert step.complete_note is None
+
+
+def test_exhausted_task_closes_and_escalates():
+    step = plan_step(_task(attempts=3), plan, now)
+    assert step.send is None
+    assert step.new_status == CandidateStatus.ESCALATED
+    assert step.complete_note == "Нет ответа на 3 follow-up попытки"
+
+
+def test_candidate_outside_plan_status_or_without_chat_is_closed_quietly():
+    for task in (_task(status="HIRED"), _task(chat_id=None)):
+        step = plan_step(task, plan, now)
+        assert step.send is None and step.new_status is None
+        assert step.complete_note
+
+
+def test_duplicate_task_moves_to_the_primary_record():
+    task = DueTask(1, 11, 42, plan.plan_id, 1, now, "DOCS_PENDING", duplicate_of=10)
+
+    step = plan_step(task, plan, now)
+
+    assert step.repoint_to == 10
+    assert step.send is None and step.complete_note is None
+
+
+def test_duplicate_task_closes_when_the_primary_already_has_one():
+    task = DueTask(
+        1, 11, 42, plan.plan_id, 0, now, "DOCS_PENDING", 10, primary_covered=True
+    )
+
+    step = plan_step(task, plan, now)
+
+    assert step.send is None and step.repoint_to is None
+    assert "#10" in step.complete_note
+
+
+def test_transition_outside_status_flow_is_dropped():
+    spec = get_policy_spec()
+    broken = {
+        **spec,
+        "global": {**spec["global"], "status_flow": {"waiting_docs": ["rejected"]}},
+    }
+    assert load_plans(broken)["waiting_docs_24h"].exhausted_status is None
+
+
+@pytest.mark.anyio
+async def test_direct_send_happens_after_commit_and_failure_restores_task(
+    monkeypatch, fake_session
+):
+    events = []
+
+    class _Session(fake_session):
+        async def __aexit__(self, *exc):
+            events.append("commit")
+            return False
+
+    async def _send_direct(token, messages):
+        events.append(("send", [sql for sql, _ in _Session.executed]))
+        return [False]
+
+    due = now - timedelta(hours=1)
+    _Session.rows[followups._DUE_SQL] = [
+        (1, 10, 42, plan.plan_id, 0, due, "DOCS_PENDING", None, False)
+    ]
+    monkeypatch.setattr(followups.settings, "outbox_enabled", False)
+    monkeypatch.setattr(followups, "SessionLocal", _Session)
+    monkeypatch.setattr(followups, "_send_direct", _send_direct)
+
+    stats = await followups.run_due_followups(now=now, batch_size=10)
+
+    assert events[:2] == ["commit", "commit"]
+    assert events[2] == ("send", [followups._DUE_SQL, followups._RESCHEDULE_SQL])
+    [restore] = _Session.params(followups._RESTORE_SQL)
+    assert restore["ids"] == [1] and restore["attempts"] == [0]
+    assert restore["claimed"] == [1] and restore["due"] == [due]
+    assert stats.sent == 0 and stats.send_failed == 1
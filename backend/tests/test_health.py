@@ -11,6 +11,16 @@ async def test_health_returns_minimal_fields(monkeypatch):
 
     monkeypatch.setattr(main, "check_database", _no_check)
     monkeypatch.setattr(main, "ensure_telegram_tables", _no_check)
+
+    async def _backlog():
+        return {"pending": 0, "oldest_s": 0.0}
+
+    monkeypatch.setattr(main, "outbox_backlog", _backlog)
+
+    async def _crm_backlog():
+        return {}
+
+    monkeypatch.setattr(main, "crm_backlog", _crm_backlog)
     class _DummyEngine:
         async def dispose(self):
             return None
@@ -26,3 +36,10 @@ async def test_health_returns_minimal_fields(monkeypatch):
     for key in ["ok", "env", "public_url", "commit_sha", "db_ok"]:
         assert key in body
     assert isinstance(body["db_ok"], bool)
+    pipeline = body["agent_pipeline"]
+    assert {"in_flight", "queue_depth"} <= pipeline.keys()
+    assert "in_flight" in pipeline["openai"]
+    assert {"sent", "lag_ms_avg", "pending"} <= body["outbox"].keys()
+    assert body["followup_scheduler"]["leader"] is False
+    assert body["avito_sync"]["enabled"] is False
+    assert {"sent", "lag_ms_avg", "backlog"} <= body["crm_outbox"].keys()
@@ -0,0 +1,310 @@
+import time
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+
+from app.integrations.base import ProviderClient, fan_out, overall_status
+from app.hr.dedupe import Registration
+from app.integrations import crm_outbox as crm_outbox_module
+from app.integrations.crm_outbox import CrmOperation, CrmOutboxFlusher, StatusFlowError
+from app.integrations.stub_server import create_stub_app
+from app.tools import router as tools_router
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def _provider(name, timeout=1.0, **stub):
+    app = create_stub_app(**stub)
+    client = ProviderClient(
+        name,
+        base_url="http://stub",
+        timeout=timeout,
+        transport=httpx.ASGITransport(app=app),
+    )
+    return client, app
+
+
+@pytest.mark.anyio
+async def test_fan_out_runs_providers_concurrently():
+    providers = [_provider(name, delay=0.2)[0] for name in ("a", "b", "c")]
+
+    started = time.perf_counter()
+    results = await fan_out(
+        "attach_note",
+        [
+            (p, p.call("attach_note", "/leads/7/notes", {"text": "hi"}, local={}))
+            for p in providers
+        ],
+    )
+    elapsed = time.perf_counter() - started
+
+    assert [r["provider"] for r in results] == ["a", "b", "c"]
+    assert all(r["response"] == {"ok": True, "lead_id": 7} for r in results)
+    assert elapsed < 0.5  # не сумма трёх задержек
+    for p in providers:
+        await p.aclose()
+
+
+@pytest.mark.anyio
+async def test_slow_or_failing_provider_is_reported_not_raised():
+    fast, _ = _provider("fast")
+    slow, _ = _provider("slow", timeout=0.05, delay=1.0)
+    broken, _ = _provider("broken", fail_status=502)
+
+    results = await fan_out(
+        "create_lead_from_candidate",
+        [
+            (p, p.call("create_lead_from_candidate", "/leads", {}, local={}))
+            for p in (fast, slow, broken)
+        ],
+    )
+
+    assert [r["status"] for r in results] == ["ok", "timeout", "error"]
+    assert "502" in results[2]["error"]
+    assert overall_status(results) == "partial"
+    for p in (fast, slow, broken):
+        await p.aclose()
+
+
+@pytest.mark.anyio
+async def test_tools_without_provider_urls_answer_locally():
+    payload = tools_router.EscalateToHumanPayload(candidate_id=5, reason="VIP")
+
+    body = await tools_router.escalate_to_human(payload)
+
+    assert body["status"] == "ok"
+    assert [r["provider"] for r in body["results"]] == [
+        "seller_gpt",
+        "amocrm",
+        "avito",
+    ]
+    assert body["results"][1]["text"] == "Escalation (normal): VIP"
+
+
+@pytest.mark.anyio
+async def test_batch_reports_rejected_items_by_idempotency_key():
+    def handler(request):
+        return httpx.Response(
+            200,
+            json={
+                "results": [
+                    {"idempotency_key": "k1", "ok": True},
+                    {"idempotency_key": "k2", "ok": False, "error": "bad phone"},
+                ]
+            },
+        )
+
+    client = ProviderClient(
+        "amocrm", base_url="http://crm", transport=httpx.MockTransport(handler)
+    )
+    items = [{"idempotency_key": key} for key in ("k1", "k2")]
+
+    assert await client.call_batch(items) == {"k2": "bad phone"}
+    await client.aclose()
+
+
+@pytest.mark.anyio
+async def test_configured_providers_are_queued_not_called(monkeypatch, fake_session):
+    queued = []
+
+    async def _enqueue(session, candidate_id, status, providers):
+        queued.append(
+            ("update_lead_status", {"status": status}, candidate_id, providers)
+        )
+        return "queued"
+
+    monkeypatch.setattr(tools_router, "enabled_providers", lambda: ["amocrm"])
+    monkeypatch.setattr(tools_router, "enqueue_status", _enqueue)
+    monkeypatch.setattr(tools_router, "SessionLocal", fake_session)
+    payload = tools_router.UpdateCandidateStatusPayload(
+        candidate_id=9, status="escalated"
+    )
+
+    body = await tools_router.update_candidate_status(payload)
+
+    assert queued == [("update_lead_status", {"status": "escalated"}, 9, ["amocrm"])]
+    assert [r["status"] for r in body["results"]] == ["ok", "queued", "ok"]
+    assert body["status"] == "ok"
+
+
+@pytest.mark.anyio
+async def test_status_hop_outside_status_flow_is_rejected(monkeypatch, fake_session):
+    async def _enqueue(session, candidate_id, status, providers):
+        raise StatusFlowError("rejected -> qualified is not in status_flow")
+
+    monkeypatch.setattr(tools_router, "enabled_providers", lambda: ["amocrm"])
+    monkeypatch.setattr(tools_router, "enqueue_status", _enqueue)
+    monkeypatch.setattr(tools_router, "SessionLocal", fake_session)
+    payload = tools_router.UpdateCandidateStatusPayload(
+        candidate_id=9, status="qualified"
+    )
+
+    body = await tools_router.update_candidate_status(payload)
+
+    assert body["status"] == "rejected"
+    assert "status_flow" in body["reason"]
+
+
+@pytest.mark.anyio
+async def test_status_flow_is_checked_without_providers(monkeypatch, fake_session):
+    monkeypatch.setattr(tools_router, "enabled_providers", lambda: [])
+    monkeypatch.setattr(tools_router, "SessionLocal", fake_session)
+    fake_session.rows[crm_outbox_module._CANDIDATE_STATUS_SQL] = [("REJECTED",)]
+
+    rejected = await tools_router.update_candidate_status(
+        tools_router.UpdateCandidateStatusPayload(candidate_id=9, status="qualified")
+    )
+    assert rejected["status"] == "rejected"
+    assert fake_session.params(crm_outbox_module._SET_CANDIDATE_STATUS_SQL) == []
+
+    fake_session.rows[crm_outbox_module._CANDIDATE_STATUS_SQL] = [("SCREENING",)]
+    body = await tools_router.update_candidate_status(
+        tools_router.UpdateCandidateStatusPayload(candidate_id=9, status="qualified")
+    )
+    assert body["status"] == "ok"
+    assert fake_session.params(crm_outbox_module._SET_CANDIDATE_STATUS_SQL) == [
+        {"id": 9, "status": "QUALIFIED"}
+    ]
+
+
+@pytest.mark.anyio
+async def test_repeat_candidate_becomes_a_note_on_the_existing_lead(
+    monkeypatch, fake_session
+):
+    async def _register(session, full_name, phone, email, source, **kwargs):
+        return Registration(candidate_id=7, duplicate_of=7, merged=True)
+
+    monkeypatch.setattr(tools_router, "register_candidate", _register)
+    monkeypatch.setattr(tools_router, "SessionLocal", fake_session)
+    payload = tools_router.CreateCandidatePayload(
+        full_name="Иван", phone="8 912 345 67 89", source="avito"
+    )
+
+    body = await tools_router.create_candidate_in_crm(payload)
+
+    assert body["duplicate_of"] == 7
+    assert {r["action"] for r in body["results"]} == {"attach_note"}
+    assert body["results"][1]["text"] == "Повторный отклик (avito): Иван"
+
+
+def _operation(row_id, attempts=1):
+    return CrmOperation(
+        row_id,
+        "update_lead_status",
+        9,
+        f"k{row_id}",
+        {"status": "qualified"},
+        attempts,
+        datetime.now(timezone.utc),
+    )
+
+
+@pytest.mark.anyio
+async def test_retry_backs_off_and_parks_exhausted_rows(monkeypatch, fake_session):
+    monkeypatch.setattr(crm_outbox_module, "SessionLocal", fake_session)
+    flusher = CrmOutboxFlusher(max_attempts=3, poll_interval=1, lock_timeout=60)
+
+    await flusher._retry(
+        [_operation(1, attempts=1), _operation(2, attempts=3)], "502", True
+    )
+    await flusher._retry([_operation(3, attempts=1)], "400", False)
+
+    first, second = fake_session.params(crm_outbox_module._RETRY_SQL)
+    assert first["statuses"] == ["pending", "failed"]
+    assert first["delays"] == [2.0, 8.0]
+    assert second["statuses"] == ["failed"]  # 4xx не повторяем
+    assert (flusher.retried, flusher.failed) == (1, 2)
+
+
+class _Provider:
+    name = "amocrm"
+    batch_size = 10
+    timeout = 1.0
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.batches = []
+
+    async def call_batch(self, items):
+        self.batches.append([item["idempotency_key"] for item in items])
+        if isinstance(self.answer, Exception):
+            raise self.answer
+        return self.answer
+
+
+@pytest.mark.anyio
+async def test_flush_marks_sent_rows_and_retries_rejected_ones(
+    monkeypatch, fake_session
+):
+    monkeypatch.setattr(crm_outbox_module, "SessionLocal", fake_session)
+    claimed = [_operation(2), _operation(1)]
+    fake_session.rows[crm_outbox_module._CLAIM_SQL] = [
+        tuple(row.__dict__.values()) for row in claimed
+    ]
+    flusher = CrmOutboxFlusher(max_attempts=3, poll_interval=1, lock_timeout=60)
+    provider = _Provider({"k2": "bad phone"})
+
+    assert await flusher.flush(provider) == 1
+
+    assert provider.batches == [["k1", "k2"]]  # по порядку id
+    assert fake_session.params(crm_outbox_module._MARK_SENT_SQL) == [{"ids": [1]}]
+    [retry] = fake_session.params(crm_outbox_module._RETRY_SQL)
+    assert retry["ids"] == [2] and retry["errors"] == ["bad phone"]
+    assert retry["statuses"] == ["pending"]
+    assert (flusher.sent, flusher.retried, flusher.batches) == (1, 1, 1)
+
+
+@pytest.mark.anyio
+async def test_flush_parks_a_batch_the_provider_refuses(monkeypatch, fake_session):
+    monkeypatch.setattr(crm_outbox_module, "SessionLocal", fake_session)
+    fake_session.rows[crm_outbox_module._CLAIM_SQL] = [
+        tuple(_operation(1).__dict__.values())
+    ]
+    request = httpx.Request("POST", "http://crm/batch")
+    refused = httpx.HTTPStatusError(
+        "400", request=request, response=httpx.Response(400, request=request)
+    )
+    flusher = CrmOutboxFlusher(max_attempts=3, poll_interval=1, lock_timeout=60)
+
+    assert await flusher.flush(_Provider(refused)) == 0
+
+    [retry] = fake_session.params(crm_outbox_module._RETRY_SQL)
+    assert retry["statuses"] == ["failed"]
+    assert fake_session.params(crm_outbox_module._MARK_SENT_SQL) == []
+
+
+@pytest.mark.anyio
+async def test_candidate_and_its_crm_write_share_one_transaction(
+    monkeypatch, fake_session
+):
+    sessions = []
+
+    async def _register(session, full_name, phone, email, source, **kwargs):
+        sessions.append(session)
+        return Registration(candidate_id=8)
+
+    async def _enqueue(session, operation, payload, candidate_id, providers):
+        sessions.append(session)
+        assert (operation, candidate_id, providers) == (
+            "create_lead_from_candidate",
+            8,
+            ["amocrm"],
+        )
+
+    monkeypatch.setattr(tools_router, "enabled_providers", lambda: ["amocrm"])
+    monkeypatch.setattr(tools_router, "register_candidate", _register)
+    monkeypatch.setattr(tools_router, "enqueue_crm", _enqueue)
+    monkeypatch.setattr(tools_router, "SessionLocal", fake_session)
+    payload = tools_router.CreateCandidatePayload(
+        full_name="Иван", phone="+79123456789"
+    )
+
+    body = await tools_router.create_candidate_in_crm(payload)
+
+    assert len(sessions) == 2 and sessions[0] is sessions[1]
+    assert body["candidate_id"] == 8 and body["duplicate_of"] is None
+    assert [r["status"] for r in body["results"]] == ["ok", "queued", "ok"]
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from app.core.limiter import AimdLimiter
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def test_rate_limit_halves_once_per_cooldown_and_success_grows_back():
+    limiter = AimdLimiter(min_limit=2, max_limit=16, cooldown=60)
+
+    limiter.on_rate_limited()
+    limiter.on_rate_limited()  # та же волна 429 — второе снижение не применяется
+    assert limiter.stats()["limit"] == 8
+    assert limiter.rate_limited == 2
+
+    for _ in range(9):  # ~+1 за окно из limit успешных запусков
+        limiter.on_success()
+    assert limiter.stats()["limit"] == 9
+
+
+@pytest.mark.anyio
+async def test_waiters_get_slots_in_order_and_cancelled_waiter_frees_its_place():
+    limiter = AimdLimiter(min_limit=1, max_limit=1)
+    order = []
+
+    async def _run(name):
+        async with limiter.slot():
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    await limiter.acquire()
+    tasks = [asyncio.create_task(_run(name)) for name in ("a", "b", "c")]
+    await asyncio.sleep(0)
+    assert limiter.waiting == 3
+
+    tasks[1].cancel()
+    limiter.release()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert order == ["a", "c"]
+    assert limiter.in_flight == 0 and limiter.waiting == 0
+
+
+@pytest.mark.anyio
+async def test_leaving_a_slot_does_not_grow_the_limit():
+    limiter = AimdLimiter(min_limit=2, max_limit=16, cooldown=60)
+    limiter.on_rate_limited()
+
+    for _ in range(20):  # таймауты и failed-запуски тоже просто выходят из слота
+        async with limiter.slot():
+            pass
+    with pytest.raises(RuntimeError):
+        async with limiter.slot():
+            raise RuntimeError("run failed")
+
+    assert limiter.stats()["limit"] == 8
+    assert limiter.in_flight == 0
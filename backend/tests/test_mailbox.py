@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from app.core.mailbox import ChatDispatcher
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.mark.anyio
+async def test_same_chat_runs_in_order_and_chats_run_in_parallel():
+    dispatcher = ChatDispatcher(max_concurrency=10)
+    events: list[str] = []
+
+    def job(name: str, delay: float):
+        async def _run() -> str:
+            events.append(f"start:{name}")
+            await asyncio.sleep(delay)
+            events.append(f"end:{name}")
+            return name
+
+        return _run
+
+    results = await asyncio.gather(
+        dispatcher.submit(1, job("a1", 0.02)),
+        dispatcher.submit(1, job("a2", 0.0)),
+        dispatcher.submit(2, job("b1", 0.0)),
+    )
+
+    assert results == ["a1", "a2", "b1"]
+    assert events.index("end:a1") < events.index("start:a2")
+    # чат 2 не ждёт медленный чат 1
+    assert events.index("end:b1") < events.index("end:a1")
+    assert dispatcher.stats() == {"mailboxes": 0, "queued": 0, "in_flight": 0}
+
+
+@pytest.mark.anyio
+async def test_global_concurrency_limit():
+    dispatcher = ChatDispatcher(max_concurrency=2)
+    running = 0
+    peak = 0
+
+    async def _run() -> None:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    await asyncio.gather(*(dispatcher.submit(chat, _run) for chat in range(20)))
+
+    assert peak == 2
+
+
+@pytest.mark.anyio
+async def test_cancelled_caller_drops_job():
+    dispatcher = ChatDispatcher(max_concurrency=1)
+    started: list[int] = []
+
+    def job(n: int):
+        async def _run() -> None:
+            started.append(n)
+            await asyncio.sleep(0.05)
+
+        return _run
+
+    first = asyncio.create_task(dispatcher.submit(1, job(1)))
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(dispatcher.submit(1, job(2)), timeout=0.01)
+    await first
+
+    assert started == [1]
@@ -0,0 +1,27 @@
+import pytest
+
+from app.core import openai_client
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.mark.anyio
+async def test_client_is_shared_and_closed(monkeypatch):
+    monkeypatch.setattr(openai_client.settings, "openai_api_key", "sk-test")
+    monkeypatch.setattr(openai_client.settings, "openai_max_connections", 7)
+
+    first = openai_client.get_openai_client()
+    assert openai_client.get_openai_client() is first
+
+    stats = openai_client.pool_stats()
+    assert stats["initialized"] is True
+    assert stats["max_connections"] == 7
+    assert stats["connections"] == 0
+
+    await openai_client.close_openai_client()
+    assert openai_client.pool_stats()["initialized"] is False
+    assert openai_client.get_openai_client() is not first
+    await openai_client.close_openai_client()
@@ -0,0 +1,84 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.core import outbox as outbox_module
+from app.core.outbox import OutboxMessage, OutboxSender, _retry_delay
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def test_retry_delay_honours_retry_after_and_gives_up_on_client_errors():
+    assert _retry_delay({"error_code": 429, "parameters": {"retry_after": 17}}, 1) == 17
+    assert _retry_delay({"error_code": 502}, 3) == 8
+    assert _retry_delay({"description": "timeout"}, 20) == 300
+    assert _retry_delay({"error_code": 403}, 1) is None
+
+
+@pytest.mark.anyio
+async def test_failed_message_holds_back_the_rest_of_its_chat(monkeypatch):
+    sent_texts, retried = [], []
+
+    async def _send_message(token, chat_id, text):
+        sent_texts.append(text)
+        if text == "2":
+            return {"ok": False, "error_code": 429, "parameters": {"retry_after": 5}}
+        return {"ok": True, "result": {"message_id": 100 + int(text)}}
+
+    async def _retry(message, data, delay):
+        retried.append((message.id, delay))
+
+    monkeypatch.setattr(outbox_module.telegram, "send_message", _send_message)
+    sender = OutboxSender(
+        batch_size=10, max_attempts=3, poll_interval=1, lock_timeout=60
+    )
+    monkeypatch.setattr(sender, "_retry", _retry)
+    now = datetime.now(timezone.utc)
+    messages = [OutboxMessage(i, 7, str(i), 1, now) for i in (1, 2, 3)]
+
+    sent, released = await sender._send_chat("token", messages)
+
+    assert sent == {1: 101}
+    assert retried == [(2, 5.0)]
+    assert released == [3] and sent_texts == ["1", "2"]
+
+
+@pytest.mark.anyio
+async def test_flush_claims_only_chats_it_could_lock(monkeypatch):
+    calls = []
+
+    class _Result:
+        def __init__(self, rows):
+            self.rows = rows
+
+        def scalars(self):
+            return iter(self.rows)
+
+        def __iter__(self):
+            return iter(self.rows)
+
+    class _Session:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        def begin(self):
+            return self
+
+        async def execute(self, statement, params=None):
+            calls.append((statement, params))
+            # Все готовые чаты сейчас захватывает соседняя реплика
+            return _Result([])
+
+    monkeypatch.setattr(outbox_module, "SessionLocal", _Session)
+    sender = OutboxSender(
+        batch_size=10, max_attempts=3, poll_interval=1, lock_timeout=60
+    )
+
+    assert await sender.flush("token") == {}
+    assert [statement for statement, _ in calls] == [outbox_module._LOCK_CHATS_SQL]
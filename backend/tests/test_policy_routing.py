@@ -0,0 +1,59 @@
+from app.hr.policy import (
+    candidate_message,
+    get_policy_spec,
+    status_transition_allowed,
+)
+from app.hr.routing import KeywordAutomaton, PolicyRouter, normalize
+
+
+def test_keywords_match_word_starts_and_russian_endings():
+    automaton = KeywordAutomaton(["суд", "угроза", "проблемы устрою"])
+
+    assert automaton.find(normalize("Подам в СУД!")) == ["суд"]
+    assert automaton.find(normalize("это угрозой звучит")) == ["угроза"]
+    assert automaton.find(normalize("Проблемы  устрою, поняли?")) == ["проблемы устрою"]
+    assert automaton.find(normalize("посуда, судебный пристав")) == []
+    assert automaton.find(normalize("Судя по описанию, подходит")) == []
+
+
+def test_spec_rules_pick_most_urgent_escalation():
+    router = PolicyRouter(get_policy_spec()["routing"])
+
+    vip = router.route("Я директор, обсудим объёмы")
+    assert vip.rule_id == "route_vip"
+    assert vip.priority == "high"
+    assert vip.keywords == ("директор", "объемы")
+
+    abuse = router.route("Директор, вызову полицию")
+    assert abuse.rule_id == "route_abuse"
+    assert abuse.priority == "urgent"
+
+    assert router.route("Москва, есть 18, смартфон есть") is None
+    assert router.route("Контрактом доволен") is not None
+
+    urgent_vip = router.route("Срочно, я директор")
+    assert urgent_vip.rule_id == "route_vip"
+    assert urgent_vip.keywords == ("срочно", "директор")
+
+
+def test_ordinary_candidate_messages_do_not_escalate():
+    router = PolicyRouter(get_policy_spec()["routing"])
+
+    for message in (
+        "Судя по описанию, подходит",
+        "Контрактная работа?",
+        "срочно ищу работу",
+        "Полицейский участок рядом?",
+    ):
+        assert router.route(message) is None, message
+    assert candidate_message("vip_or_risk").startswith("Понял. Передам")
+
+
+def test_status_flow_accepts_enum_names_of_spec_statuses():
+    assert status_transition_allowed("screening", "qualified")
+    assert status_transition_allowed("qualified", "interview_scheduled")
+    assert status_transition_allowed("waiting_docs", "qualified")
+    assert not status_transition_allowed("rejected", "screening")
+    assert not status_transition_allowed("new", "qualified")
+    # Статусы вне спецификации не ограничиваем
+    assert status_transition_allowed("hired", "screening")
@@ -0,0 +1,569 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.assistant_runs import RunResult
+from app.core.breaker import CircuitBreaker
+from app.core.coalescer import BurstCoalescer
+from app.core.update_queue import UpdateDeferred
+from app.hr.faq import FaqCache
+from app.tools import telegram_webhook
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.mark.anyio
+async def test_thread_from_dedupe_query_is_reused(monkeypatch):
+    settings = telegram_webhook.settings
+    monkeypatch.setattr(settings, "openai_api_key", "sk-test")
+    monkeypatch.setattr(settings, "telegram_bot_token", "123:abc")
+    monkeypatch.setattr(settings, "telegram_progressive_replies", False)
+    seen = {}
+
+    async def _mark(update_id, chat_id=None):
+        seen["mark"] = (update_id, chat_id)
+        return True, "thread_1", False
+
+    async def _no_lookup(*args, **kwargs):
+        raise AssertionError("thread already known from the dedupe query")
+
+    async def _agent(client, chat_id, text_msg, on_delta=None, thread_id=None, **_):
+        seen["thread_id"] = thread_id
+        return "ответ"
+
+    async def _send(token, chat_id, text_msg):
+        seen["reply"] = text_msg
+
+    monkeypatch.setattr(telegram_webhook, "_mark_processed", _mark)
+    monkeypatch.setattr(telegram_webhook, "_get_or_create_thread", _no_lookup)
+    monkeypatch.setattr(telegram_webhook, "send_to_agent", _agent)
+    monkeypatch.setattr(telegram_webhook, "send_telegram_message", _send)
+
+    await telegram_webhook.process_update(
+        {"update_id": 5, "message": {"chat": {"id": 42}, "text": "Привет"}}
+    )
+
+    assert seen == {"mark": (5, 42), "thread_id": "thread_1", "reply": "ответ"}
+
+
+@pytest.mark.anyio
+async def test_thread_lost_to_a_concurrent_claim_is_deleted(monkeypatch, fake_session):
+    deleted = []
+
+    async def _create():
+        return SimpleNamespace(id="thread_mine")
+
+    async def _delete(thread_id):
+        deleted.append(thread_id)
+
+    client = SimpleNamespace(
+        beta=SimpleNamespace(threads=SimpleNamespace(create=_create, delete=_delete))
+    )
+    fake_session.rows[telegram_webhook._CLAIM_THREAD_SQL] = [("thread_theirs",)]
+    monkeypatch.setattr(telegram_webhook, "SessionLocal", fake_session)
+
+    assert await telegram_webhook._load_thread(client, 42) == "thread_theirs"
+    await asyncio.sleep(0)
+
+    assert deleted == ["thread_mine"]
+
+
+@pytest.mark.anyio
+async def test_burst_of_messages_becomes_one_agent_turn(monkeypatch):
+    settings = telegram_webhook.settings
+    monkeypatch.setattr(settings, "openai_api_key", "sk-test")
+    monkeypatch.setattr(settings, "telegram_bot_token", "123:abc")
+    monkeypatch.setattr(settings, "telegram_progressive_replies", False)
+    monkeypatch.setattr(
+        telegram_webhook,
+        "chat_coalescer",
+        BurstCoalescer(window=0.05, max_wait=1.0, max_chars=4000),
+    )
+    turns, replies = [], []
+
+    async def _mark(update_id, chat_id=None):
+        return True, "thread_1", False
+
+    async def _agent(client, chat_id, text_msg, on_delta=None, thread_id=None, **_):
+        turns.append(text_msg)
+        return "ответ"
+
+    async def _send(token, chat_id, text_msg):
+        replies.append(text_msg)
+
+    monkeypatch.setattr(telegram_webhook, "_mark_processed", _mark)
+    monkeypatch.setattr(telegram_webhook, "send_to_agent", _agent)
+    monkeypatch.setattr(telegram_webhook, "send_telegram_message", _send)
+
+    async def _message(update_id, text, delay):
+        await asyncio.sleep(delay)
+        await telegram_webhook.process_update(
+            {"update_id": update_id, "message": {"chat": {"id": 7}, "text": text}}
+        )
+
+    await asyncio.gather(
+        _message(1, "Москва", 0),
+        _message(2, "есть 18", 0.01),
+        _message(3, "смартфон есть", 0.02),
+    )
+
+    assert turns == ["Москва\nесть 18\nсмартфон есть"]
+    assert replies == ["ответ"]
+
+
+@pytest.mark.anyio
+async def test_queue_workers_do_not_wait_out_the_burst_window(monkeypatch):
+    settings = telegram_webhook.settings
+    monkeypatch.setattr(settings, "openai_api_key", "sk-test")
+    monkeypatch.setattr(settings, "telegram_bot_token", "123:abc")
+    monkeypatch.setattr(settings, "telegram_progressive_replies", False)
+    monkeypatch.setattr(
+        telegram_webhook,
+        "chat_coalescer",
+        BurstCoalescer(window=5.0, max_wait=10.0, max_chars=4000),
+    )
+    turns = []
+
+    async def _agent(client, chat_id, text_msg, on_delta=None, thread_id=None, **_):
+        turns.append(text_msg)
+        return "ответ"
+
+    async def _thread(client, chat_id):
+        return "thread_1"
+
+    async def _send(token, chat_id, text_msg):
+        return None
+
+    monkeypatch.setattr(telegram_webhook, "send_to_agent", _agent)
+    monkeypatch.setattr(telegram_webhook, "_get_or_create_thread", _thread)
+    monkeypatch.setattr(telegram_webhook, "send_telegram_message", _send)
+
+    started = time.monotonic()
+    await telegram_webhook.process_update(
+        {"update_id": 1, "message": {"chat": {"id": 7}, "text": "Москва"}},
+        dedupe=False,
+    )
+
+    assert turns == ["Москва"]
+    assert time.monotonic() - started < 1.0
+
+
+@pytest.mark.anyio
+async def test_screening_note_is_synced_only_after_the_agent_run(monkeypatch):
+    settings = telegram_webhook.settings
+    monkeypatch.setattr(settings, "openai_api_key", "sk-test")
+    monkeypatch.setattr(settings, "telegram_bot_token", "123:abc")
+    monkeypatch.setattr(settings, "telegram_progressive_replies", False)
+    monkeypatch.setattr(settings, "screening_enabled", True)
+    engine = telegram_webhook.screening_engine
+    turn = engine.start("курьер пеший")
+    for answer in ("Питер", "есть 18", "да"):
+        turn = engine.step(turn.state, answer)
+    stored = {7: turn.state}
+    notes = []
+
+    async def _mark(update_id, chat_id=None):
+        return True, "thread_1", False
+
+    async def _load(chat_id):
+        return stored.get(chat_id)
+
+    async def _save(chat_id, state):
+        stored[chat_id] = state
+
+    async def _agent(client, chat_id, text_msg, context_note=None, **_):
+        notes.append(context_note)
+        if len(notes) == 1:
+            raise RuntimeError("run failed")
+        return "ответ"
+
+    async def _send(token, chat_id, text_msg):
+        return None
+
+    monkeypatch.setattr(telegram_webhook, "_mark_processed", _mark)
+    monkeypatch.setattr(telegram_webhook, "load_screening_state", _load)
+    monkeypatch.setattr(telegram_webhook, "save_screening_state", _save)
+    monkeypatch.setattr(telegram_webhook, "send_to_agent", _agent)
+    monkeypatch.setattr(telegram_webhook, "send_telegram_message", _send)
+
+    for update_id in (1, 2):
+        await telegram_webhook.process_update(
+            {"update_id": update_id, "message": {"chat": {"id": 7}, "text": "да"}}
+        )
+        if update_id == 1:
+            assert stored[7].synced != stored[7].answered
+
+    # Итоги не потерялись после сбоя и ушли ассистенту повторно
+    assert notes[0] is not None and notes[1] == notes[0]
+    assert stored[7].synced == stored[7].answered
+
+
+@pytest.mark.anyio
+async def test_policy_hit_escalates_without_agent_run(monkeypatch):
+    settings = telegram_webhook.settings
+    monkeypatch.setattr(settings, "openai_api_key", "sk-test")
+    monkeypatch.setattr(settings, "telegram_bot_token", "123:abc")
+    monkeypatch.setattr(settings, "telegram_admin_chat_id", "-100")
+    sent, notes = [], []
+
+    async def _mark(update_id, chat_id=None):
+        return True, None, False
+
+    async def _agent(*args, **kwargs):
+        raise AssertionError("policy hits must not reach the assistant")
+
+    async def _send(token, chat_id, text_msg):
+        sent.append((chat_id, text_msg))
+
+    async def _candidate(chat_id):
+        return {42: 17}.get(chat_id)
+
+    async def _escalate(payload):
+        notes.append((payload.candidate_id, payload.reason))
+
+    monkeypatch.setattr(telegram_webhook, "_mark_processed", _mark)
+    monkeypatch.setattr(telegram_webhook, "send_to_agent", _agent)
+    monkeypatch.setattr(telegram_webhook, "send_telegram_message", _send)
+    monkeypatch.setattr(telegram_webhook, "_candidate_for_chat", _candidate)
+    monkeypatch.setattr(telegram_webhook, "escalate_to_human", _escalate)
+
+    await telegram_webhook.process_update(
+        {"update_id": 9, "message": {"chat": {"id": 42}, "text": "Подам в суд!"}}
+    )
+    await telegram_webhook.process_update(
+        {"update_id": 10, "message": {"chat": {"id": 43}, "text": "Подам в суд!"}}
+    )
+
+    # Без кандидата в CRM заметку не пишем, но админ узнаёт о чате
+    assert notes == [(17, "conflict_or_abuse (Telegram chat 42)")]
+    assert [chat for chat, _ in sent] == ["-100", 42, "-100", 43]
+    assert "route_abuse" in sent[0][1]
+    assert "кандидат CRM: 17" in sent[0][1]
+    assert "кандидат CRM: не найден" in sent[2][1]
+    assert sent[1][1].startswith("Понял. Передам ваш кейс")
+
+
+@pytest.mark.anyio
+async def test_policy_reply_is_mirrored_through_the_chat_queue(monkeypatch):
+    settings = telegram_webhook.settings
+    monkeypatch.setattr(settings, "openai_api_key", "sk-test")
+    monkeypatch.setattr(settings, "telegram_bot_token", "123:abc")
+    monkeypatch.setattr(settings, "telegram_admin_chat_id", None)
+    mirrored = []
+
+    async def _mark(update_id, chat_id=None):
+        return True, "thread_1", False
+
+    async def _send(token, chat_id, text_msg):
+        return None
+
+    async def _direct(*args):
+        raise AssertionError("must not write to a thread that may have a run")
+
+    monkeypatch.setattr(telegram_webhook, "_mark_processed", _mark)
+    monkeypatch.setattr(telegram_webhook, "send_telegram_message", _send)
+    monkeypatch.setattr(telegram_webhook, "_record_local_turn", _direct)
+    monkeypatch.setattr(
+        telegram_webhook, "_mirror_turn_later", lambda *args: mirrored.append(args)
+    )
+
+    await telegram_webhook.process_update(
+        {"update_id": 10, "message": {"chat": {"id": 42}, "text": "Подам в суд!"}}
+    )
+
+    assert [args[1:4] for args in mirrored] == [(42, "thread_1", "Подам в суд!")]
+
+
+@pytest.mark.anyio
+async def test_repeated_vacancy_question_is_served_from_faq_cache(monkeypatch):
+    settings = telegram_webhook.settings
+    monkeypatch.setattr(settings, "openai_api_key", "sk-test")
+    monkeypatch.setattr(settings, "telegram_bot_token", "123:abc")
+    monkeypatch.setattr(settings, "telegram_progressive_replies", False)
+    cache = FaqCache(max_size=10, ttl=60, version=lambda: "v1")
+    question = "Сколько платят пешему курьеру?"
+    cache.set(cache.key("courier_walk_bike", question), "от 3000 ₽ в день")
+    monkeypatch.setattr(telegram_webhook, "faq_cache", cache)
+    sent, mirrored = [], []
+
+    async def _mark(update_id, chat_id=None):
+        return True, "thread_1", False
+
+    async def _agent(*args, **kwargs):
+        raise AssertionError("cached FAQ answers must not start a run")
+
+    async def _send(token, chat_id, text_msg):
+        sent.append(text_msg)
+
+    monkeypatch.setattr(telegram_webhook, "_mark_processed", _mark)
+    monkeypatch.setattr(telegram_webhook, "send_to_agent", _agent)
+    monkeypatch.setattr(telegram_webhook, "send_telegram_message", _send)
+    monkeypatch.setattr(
+        telegram_webhook, "_mirror_turn_later", lambda *args: mirrored.append(args)
+    )
+
+    repeat = "а сколько платят пешему курьеру"
+    await telegram_webhook.process_update(
+        {"update_id": 11, "message": {"chat": {"id": 42}, "text": repeat}}
+    )
+
+    assert sent == ["от 3000 ₽ в день"]
+    assert mirrored[0][2:] == ("thread_1", repeat, "от 3000 ₽ в день")
+
+
+@pytest.mark.anyio
+async def test_faq_miss_is_answered_outside_the_candidate_thread(monkeypatch):
+    settings = telegram_webhook.settings
+    monkeypatch.setattr(settings, "openai_api_key", "sk-test")
+    monkeypatch.setattr(settings, "telegram_bot_token", "123:abc")
+    monkeypatch.setattr(settings, "telegram_progressive_replies", False)
+    monkeypatch.setattr(settings, "hr_agent_id", "asst_1")
+    cache = FaqCache(max_size=10, ttl=60, version=lambda: "v1")
+    monkeypatch.setattr(telegram_webhook, "faq_cache", cache)
+    threads, runs, sent, mirrored = [], [], [], []
+
+    class _Threads:
+        async def create(self, messages):
+            threads.append(messages)
+            return SimpleNamespace(id="thread_faq")
+
+        async def delete(self, thread_id):
+            threads.append(("deleted", thread_id))
+
+    client = SimpleNamespace(beta=SimpleNamespace(threads=_Threads()))
+
+    async def _run(client, thread_id, agent_id, **kwargs):
+        runs.append(thread_id)
+        return RunResult(status="completed", run_id="run_1", text="от 3000 ₽")
+
+    async def _mark(update_id, chat_id=None):
+        return True, "thread_1", False
+
+    async def _agent(*args, **kwargs):
+        raise AssertionError("FAQ questions must not run in the candidate thread")
+
+    async def _send(token, chat_id, text_msg):
+        sent.append(text_msg)
+
+    monkeypatch.setattr(telegram_webhook, "get_openai_client", lambda: client)
+    monkeypatch.setattr(telegram_webhook, "run_assistant", _run)
+    monkeypatch.setattr(telegram_webhook, "_mark_processed", _mark)
+    monkeypatch.setattr(telegram_webhook, "send_to_agent", _agent)
+    monkeypatch.setattr(telegram_webhook, "send_telegram_message", _send)
+    monkeypatch.setattr(
+        telegram_webhook, "_mirror_turn_later", lambda *args: mirrored.append(args)
+    )
+
+    question = "Сколько платят пешему курьеру?"
+    await telegram_webhook.process_update(
+        {"update_id": 12, "message": {"chat": {"id": 42}, "text": question}}
+    )
+    await asyncio.sleep(0)
+
+    assert runs == ["thread_faq"]
+    assert threads == [
+        [
+            {
+                "role": "assistant",
+                "content": "Кандидат спрашивает о вакансии "
+                "«Курьер (пеший/вело)» (courier_walk_bike).",
+            },
+            {"role": "user", "content": question},
+        ],
+        ("deleted", "thread_faq"),
+    ]
+    assert sent == ["от 3000 ₽"]
+    assert mirrored[0][2:] == ("thread_1", question, "от 3000 ₽")
+    assert cache.get(cache.key("courier_walk_bike", question)) == "от 3000 ₽"
+
+
+@pytest.mark.anyio
+async def test_long_message_reaches_the_agent_in_parts(monkeypatch):
+    settings = telegram_webhook.settings
+    monkeypatch.setattr(settings, "openai_api_key", "sk-test")
+    monkeypatch.setattr(settings, "telegram_bot_token", "123:abc")
+    monkeypatch.setattr(settings, "telegram_progressive_replies", False)
+    long_text = "\n\n".join(["Опыт работы. " * 200] * 2)
+    turns, replies = [], []
+
+    async def _mark(update_id, chat_id=None):
+        return True, "thread_1", False
+
+    async def _agent(client, chat_id, text_msg, on_delta=None, thread_id=None, **_):
+        turns.append(text_msg)
+        return "ответ"
+
+    async def _send(token, chat_id, text_msg):
+        replies.append(text_msg)
+
+    monkeypatch.setattr(telegram_webhook, "_mark_processed", _mark)
+    monkeypatch.setattr(telegram_webhook, "send_to_agent", _agent)
+    monkeypatch.setattr(telegram_webhook, "send_telegram_message", _send)
+
+    await telegram_webhook.process_update(
+        {"update_id": 11, "message": {"chat": {"id": 42}, "text": long_text}}
+    )
+
+    assert turns == [long_text] and replies == ["ответ"]
+    content = telegram_webhook._message_content(long_text)
+    assert [part["type"] for part in content] == ["text", "text"]
+    assert all(len(part["text"]) <= telegram_webhook.TEXT_LIMIT for part in content)
+
+
+@pytest.mark.anyio
+async def test_full_pipeline_sheds_with_a_cheap_reply(monkeypatch):
+    settings = telegram_webhook.settings
+    monkeypatch.setattr(settings, "openai_api_key", "sk-test")
+    monkeypatch.setattr(settings, "telegram_bot_token", "123:abc")
+    monkeypatch.setattr(settings, "agent_queue_max", 3)
+    monkeypatch.setattr(telegram_webhook, "pipeline_depth", lambda: 3)
+    replies = []
+
+    async def _mark(update_id, chat_id=None):
+        return True, "thread_1", False
+
+    async def _agent(*args, **kwargs):
+        raise AssertionError("shed turns must not reach the assistant")
+
+    async def _send(token, chat_id, text_msg):
+        replies.append(text_msg)
+
+    monkeypatch.setattr(telegram_webhook, "_mark_processed", _mark)
+    monkeypatch.setattr(telegram_webhook, "send_to_agent", _agent)
+    monkeypatch.setattr(telegram_webhook, "send_telegram_message", _send)
+
+    await telegram_webhook.process_update(
+        {"update_id": 12, "message": {"chat": {"id": 42}, "text": "Здравствуйте"}}
+    )
+
+    assert replies == [telegram_webhook.PIPELINE_FULL_REPLY]
+
+
+@pytest.mark.anyio
+async def test_open_circuit_replies_from_template_and_defers_the_turn(monkeypatch):
+    settings = telegram_webhook.settings
+    monkeypatch.setattr(settings, "openai_api_key", "sk-test")
+    monkeypatch.setattr(settings, "telegram_bot_token", "123:abc")
+    monkeypatch.setattr(settings, "telegram_progressive_replies", False)
+    breaker = CircuitBreaker(failure_threshold=1, recovery_time=30)
+    breaker.record_failure()
+    monkeypatch.setattr(telegram_webhook, "openai_breaker", breaker)
+    replies, deferred = [], []
+
+    async def _mark(update_id, chat_id=None):
+        return True, "thread_1", False
+
+    async def _agent(*args, **kwargs):
+        raise AssertionError("open circuit must not call the assistant")
+
+    async def _send(token, chat_id, text_msg):
+        replies.append(text_msg)
+
+    async def _defer(update_id, chat_id, payload, delay):
+        deferred.append((update_id, payload, delay))
+
+    monkeypatch.setattr(telegram_webhook, "_mark_processed", _mark)
+    monkeypatch.setattr(telegram_webhook, "send_to_agent", _agent)
+    monkeypatch.setattr(telegram_webhook, "send_telegram_message", _send)
+    monkeypatch.setattr(telegram_webhook, "defer_update", _defer)
+
+    update = {"update_id": 13, "message": {"chat": {"id": 42}, "text": "Есть места?"}}
+    await telegram_webhook.process_update(update)
+
+    assert replies == [telegram_webhook.candidate_message("openai_error")]
+    [(update_id, payload, delay)] = deferred
+    assert update_id == 13 and 0 < delay <= 30
+    assert payload[telegram_webhook.REPLAY_MARK] == 1
+
+    # Повтор из очереди при всё ещё разомкнутой цепи: молча откладываем снова
+    with pytest.raises(UpdateDeferred) as exc:
+        await telegram_webhook.process_update(payload, dedupe=False)
+    assert exc.value.payload[telegram_webhook.REPLAY_MARK] == 2
+    assert len(replies) == 1
+
+
+@pytest.mark.anyio
+async def test_replay_gives_up_after_max_attempts(monkeypatch):
+    settings = telegram_webhook.settings
+    monkeypatch.setattr(settings, "openai_api_key", "sk-test")
+    monkeypatch.setattr(settings, "telegram_bot_token", "123:abc")
+    monkeypatch.setattr(settings, "telegram_progressive_replies", False)
+    monkeypatch.setattr(settings, "openai_replay_max_attempts", 3)
+    breaker = CircuitBreaker(failure_threshold=1, recovery_time=30)
+    breaker.record_failure()
+    monkeypatch.setattr(telegram_webhook, "openai_breaker", breaker)
+    replies = []
+
+    async def _send(token, chat_id, text_msg):
+        replies.append(text_msg)
+
+    monkeypatch.setattr(telegram_webhook, "send_telegram_message", _send)
+
+    update = {
+        "update_id": 14,
+        "message": {"chat": {"id": 42}, "text": "Есть места?"},
+        telegram_webhook.REPLAY_MARK: 3,
+        telegram_webhook.REPLAY_SINCE: time.time(),
+    }
+    await telegram_webhook.process_update(update, dedupe=False)
+    assert replies == [telegram_webhook.REPLAY_GIVE_UP_REPLY]
+
+    # Слишком старый ход тоже не откладываем бесконечно
+    update[telegram_webhook.REPLAY_MARK] = 1
+    update[telegram_webhook.REPLAY_SINCE] = time.time() - 2 * 3600
+    await telegram_webhook.process_update(update, dedupe=False)
+    assert len(replies) == 2
+
+
+@pytest.mark.anyio
+async def test_update_waits_behind_a_deferred_turn_of_its_chat(monkeypatch):
+    settings = telegram_webhook.settings
+    monkeypatch.setattr(settings, "openai_api_key", "sk-test")
+    monkeypatch.setattr(settings, "telegram_bot_token", "123:abc")
+    deferred = []
+
+    async def _mark(update_id, chat_id=None):
+        return True, "thread_1", True
+
+    async def _agent(*args, **kwargs):
+        raise AssertionError("must not overtake the deferred turn")
+
+    async def _defer(update_id, chat_id, payload, delay):
+        deferred.append((update_id, chat_id, delay))
+
+    monkeypatch.setattr(telegram_webhook, "_mark_processed", _mark)
+    monkeypatch.setattr(telegram_webhook, "send_to_agent", _agent)
+    monkeypatch.setattr(telegram_webhook, "defer_update", _defer)
+
+    await telegram_webhook.process_update(
+        {"update_id": 15, "message": {"chat": {"id": 42}, "text": "Алло?"}}
+    )
+
+    assert deferred == [(15, 42, 0)]
+
+
+@pytest.mark.anyio
+async def test_cancelled_run_is_not_an_openai_failure(monkeypatch):
+    monkeypatch.setattr(telegram_webhook.settings, "hr_agent_id", "asst_1")
+    breaker = CircuitBreaker(failure_threshold=1, recovery_time=30)
+    monkeypatch.setattr(telegram_webhook, "openai_breaker", breaker)
+
+    async def _create(**kwargs):
+        return None
+
+    async def _run(*args, **kwargs):
+        raise asyncio.CancelledError
+
+    threads = SimpleNamespace(messages=SimpleNamespace(create=_create))
+    client = SimpleNamespace(beta=SimpleNamespace(threads=threads))
+    monkeypatch.setattr(telegram_webhook, "run_assistant", _run)
+
+    with pytest.raises(asyncio.CancelledError):
+        await telegram_webhook.send_to_agent(client, 42, "Привет", thread_id="t1")
+
+    assert breaker.allow()
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from app.tools import telegram_webhook
+from app.tools.telegram_webhook import ProgressiveReply
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def bot_api(monkeypatch):
+    calls: list[tuple[str, str]] = []
+
+    async def _send(token, chat_id, text_msg, **_):
+        calls.append(("send", text_msg))
+        return 100
+
+    async def _edit(token, chat_id, message_id, text_msg):
+        assert message_id == 100
+        calls.append(("edit", text_msg))
+        return True
+
+    monkeypatch.setattr(telegram_webhook, "send_telegram_message", _send)
+    monkeypatch.setattr(telegram_webhook, "edit_telegram_message", _edit)
+    return calls
+
+
+@pytest.mark.anyio
+async def test_placeholder_then_throttled_edits_then_final_text(bot_api):
+    reply = ProgressiveReply("token", 1, interval=3600)
+    await reply.start()
+    for delta in ["Добрый ", "день", "!"]:
+        await reply.on_delta(delta)
+    await reply.finish("Добрый день!")
+
+    assert bot_api == [("send", ProgressiveReply.PLACEHOLDER), ("edit", "Добрый день!")]
+    assert reply.first_visible_ms is not None
+
+
+@pytest.mark.anyio
+async def test_intermediate_edits_show_partial_text(bot_api):
+    reply = ProgressiveReply("token", 1, interval=0)
+    await reply.start()
+    await reply.on_delta("Добрый ")
+    await asyncio.sleep(0)
+    await reply.finish("Добрый день!")
+
+    assert ("edit", "Добрый " + ProgressiveReply.CURSOR) in bot_api
+    assert bot_api[-1] == ("edit", "Добрый день!")
+
+
+@pytest.mark.anyio
+async def test_overlong_final_text_continues_after_placeholder(bot_api, monkeypatch):
+    reply = ProgressiveReply("token", 1, interval=3600)
+    await reply.start()
+    sent = []
+
+    async def _send(token, chat_id, text_msg, edit_message_id=None):
+        sent.append((text_msg, edit_message_id))
+
+    monkeypatch.setattr(telegram_webhook, "send_telegram_message", _send)
+    await reply.finish("а" * 5000)
+
+    # Telegram-клиент сам режет текст и кладёт первую часть в плейсхолдер
+    assert sent == [("а" * 5000, 100)]
@@ -0,0 +1,13 @@
+from app.core.recent_ids import RecentIdFilter
+
+
+def test_recent_ids_forget_oldest_beyond_capacity():
+    recent = RecentIdFilter(capacity=2)
+    for update_id in (1, 2, 3):
+        recent.add(update_id)
+
+    assert not recent.seen(1)
+    assert recent.seen(2)
+    assert recent.seen(3)
+    assert len(recent) == 2
+    assert recent.hits == 2
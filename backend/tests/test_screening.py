@@ -0,0 +1,56 @@
+from app.hr.policy import get_policy_spec
+from app.hr.screening import PASSED, REJECTED, ScreeningEngine
+
+engine = ScreeningEngine(get_policy_spec())
+
+
+def test_walks_knockout_questions_and_hands_off_to_assistant():
+    turn = engine.start("Здравствуйте, интересует вакансия пешего курьера")
+    assert turn.reply == "Отлично, вакансия «Курьер (пеший/вело)». Ваш город?"
+
+    replies = []
+    for answer in ["Питер", "есть 18", "да", "Документы есть"]:
+        turn = engine.step(turn.state, answer)
+        replies.append(turn.reply)
+
+    assert replies[:3] == [
+        "Принял. Вам есть 18?",
+        "Принял. Смартфон Android/iOS есть?",
+        "Принял. Документы для работы в РФ есть?",
+    ]
+    assert replies[3] is None  # дальше — ассистент
+    assert turn.state.status == PASSED
+    assert turn.note.startswith("[Скрининг] Вакансия: Курьер (пеший/вело)")
+    assert engine.step(engine.synced(turn.state), "а сколько платят?").note is None
+
+
+def test_burst_answers_and_rejection_template():
+    state = engine.start("оператор колл-центра").state
+    turn = engine.step(state, "Казань\nноутбук есть\nинтернет нет")
+
+    assert turn.state.status == REJECTED
+    assert "нужен обязательный опыт: стабильный интернет" in turn.reply
+
+
+def test_free_form_message_falls_back_to_assistant():
+    state = engine.start("курьер пеший").state
+
+    turn = engine.step(state, "а какая зарплата у вас в среднем по городу?")
+
+    assert turn.reply is None
+    assert turn.state == state
+    assert engine.start("привет, какие есть вакансии?") is None
+
+
+def test_negation_binds_to_the_next_word_only():
+    state = engine.step(engine.start("курьер пеший").state, "Питер").state
+
+    mixed = engine.step(state, "да не вопрос")
+    assert mixed.reply is None and mixed.state == state  # решает ассистент
+
+    agreed = engine.step(state, "не против")
+    assert agreed.state.status != REJECTED
+    assert agreed.reply == "Принял. Смартфон Android/iOS есть?"
+
+    refused = engine.step(state, "не исполнилось")
+    assert refused.state.status == REJECTED
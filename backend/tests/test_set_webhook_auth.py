@@ -50,7 +50,7 @@ async def test_set_webhook_with_token_and_mocked_telegram(monkeypatch):
         kwargs["transport"] = transport_mock
         return original_async_client(*args, **kwargs)
 
-    monkeypatch.setattr("app.tools.telegram_webhook.httpx.AsyncClient", _client_factory)
+    monkeypatch.setattr("app.core.telegram_client.httpx.AsyncClient", _client_factory)
 
     transport = httpx.ASGITransport(app=main.app)
     async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
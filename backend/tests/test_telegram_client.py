@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.core.telegram_client import TelegramClient
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+def test_per_chat_spacing_and_global_bucket():
+    client = TelegramClient(global_rate=2, per_chat_interval=1.0, max_connections=1)
+
+    assert client._reserve(1) == 0
+    assert client._reserve(1) == pytest.approx(1.0, abs=0.05)
+    # другой чат не ждёт чужой интервал, но упирается в глобальный лимит 2/с
+    assert client._reserve(2) == pytest.approx(0.5, abs=0.05)
+
+
+@pytest.mark.anyio
+async def test_retries_on_429_using_retry_after():
+    calls = 0
+
+    def _handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            return httpx.Response(
+                429,
+                json={"ok": False, "error_code": 429, "parameters": {"retry_after": 0}},
+            )
+        return httpx.Response(200, json={"ok": True, "result": {"message_id": 7}})
+
+    client = TelegramClient(global_rate=100, per_chat_interval=0, max_connections=1)
+    client._http = httpx.AsyncClient(transport=httpx.MockTransport(_handler))
+
+    data = await client.send_message("token", 1, "hi")
+    await client.aclose()
+
+    assert calls == 2
+    assert data["result"]["message_id"] == 7
+
+
+def _recording_client(sent: list) -> TelegramClient:
+    def _handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        sent.append((request.url.path.rsplit("/", 1)[-1], body["text"]))
+        return httpx.Response(200, json={"ok": True, "result": {"message_id": 1}})
+
+    client = TelegramClient(global_rate=1000, per_chat_interval=0, max_connections=1)
+    client._http = httpx.AsyncClient(transport=httpx.MockTransport(_handler))
+    return client
+
+
+@pytest.mark.anyio
+async def test_long_text_is_sent_as_ordered_parts_without_interleaving():
+    sent: list[tuple[str, str]] = []
+    client = _recording_client(sent)
+    long_text = "\n\n".join(["а" * 3000, "б" * 3000, "в" * 100])
+
+    await asyncio.gather(
+        client.send_message("token", 1, long_text, edit_message_id=5),
+        client.send_message("token", 1, "следующий ход"),
+    )
+    await client.aclose()
+
+    assert sent == [
+        ("editMessageText", "а" * 3000),
+        ("sendMessage", "б" * 3000 + "\n\n" + "в" * 100),
+        ("sendMessage", "следующий ход"),
+    ]
+    assert client._chat_locks == {}
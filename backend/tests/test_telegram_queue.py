@@ -0,0 +1,52 @@
+import httpx
+import pytest
+
+from app import main
+from app.core.recent_ids import RecentIdFilter
+from app.tools import telegram_webhook
+
+
+@pytest.mark.anyio
+async def test_webhook_in_queue_mode_only_enqueues(monkeypatch):
+    monkeypatch.setattr(main.settings, "telegram_update_mode", "queue")
+    enqueued = []
+
+    async def _enqueue(update_id, chat_id, payload):
+        enqueued.append((update_id, chat_id))
+        return True
+
+    async def _process(*args, **kwargs):
+        raise AssertionError("must not process inline in queue mode")
+
+    monkeypatch.setattr(telegram_webhook, "enqueue_update", _enqueue)
+    monkeypatch.setattr(telegram_webhook, "process_update", _process)
+    monkeypatch.setattr(telegram_webhook, "recent_updates", RecentIdFilter(100))
+
+    update = {"update_id": 10, "message": {"chat": {"id": 42}, "text": "Привет"}}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        resp = await client.post("/telegram/webhook", json=update)
+        # Повторная доставка отсекается в памяти, без запроса в БД
+        repeat = await client.post("/telegram/webhook", json=update)
+
+    assert resp.status_code == 200
+    assert resp.json() == {"ok": True}
+    assert repeat.status_code == 200
+    assert enqueued == [(10, 42)]
+
+
+@pytest.mark.anyio
+async def test_webhook_in_queue_mode_asks_for_redelivery_when_db_down(monkeypatch):
+    monkeypatch.setattr(main.settings, "telegram_update_mode", "queue")
+
+    async def _enqueue(update_id, chat_id, payload):
+        raise RuntimeError("connection refused")
+
+    monkeypatch.setattr(telegram_webhook, "enqueue_update", _enqueue)
+    monkeypatch.setattr(telegram_webhook, "recent_updates", RecentIdFilter(100))
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        resp = await client.post("/telegram/webhook", json={"update_id": 11})
+
+    assert resp.status_code == 503
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from app.core.thread_cache import ThreadCache
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.mark.anyio
+async def test_concurrent_misses_share_one_load():
+    cache = ThreadCache(max_size=10, ttl=60)
+    loads = 0
+
+    async def loader() -> str:
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0.01)
+        return "thread_1"
+
+    results = await asyncio.gather(*(cache.get_or_load(1, loader) for _ in range(5)))
+
+    assert results == ["thread_1"] * 5
+    assert loads == 1
+    assert cache.get(1) == "thread_1"
+
+
+def test_lru_eviction_and_ttl():
+    cache = ThreadCache(max_size=2, ttl=60)
+    cache.warm([(3, "t3"), (2, "t2"), (1, "t1")])  # самые активные первыми
+
+    assert len(cache) == 2
+    assert cache.get(1) is None
+    assert cache.get(3) == "t3"
+
+    cache.set(4, "t4")
+    assert cache.get(2) is None  # 3 был прочитан недавно, вытеснен 2
+
+    expired = ThreadCache(max_size=2, ttl=-1)
+    expired.set(1, "t1")
+    assert expired.get(1) is None
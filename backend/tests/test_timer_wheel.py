@@ -0,0 +1,27 @@
+from app.core.timer_wheel import TimerWheel
+
+
+def test_fires_each_timer_once_on_its_tick():
+    wheel = TimerWheel(tick=1.0, slots=60, now=1000.0)
+    assert wheel.schedule("a", 1002.5)
+    assert wheel.schedule("b", 1005.0)
+    assert wheel.schedule("late", 990.0)  # просроченный — на ближайшем тике
+
+    assert wheel.advance(1001.0) == [("late", 990.0)]
+    assert wheel.advance(1002.9) == []
+    assert wheel.advance(1003.0) == [("a", 1002.5)]
+    assert wheel.advance(1010.0) == [("b", 1005.0)]
+    assert len(wheel) == 0
+
+
+def test_cancel_reschedule_and_horizon():
+    wheel = TimerWheel(tick=1.0, slots=10, now=0.0)
+    assert wheel.schedule("a", 5.0)
+    assert wheel.schedule("a", 7.0)  # перенос заменяет прежний таймер
+    assert wheel.cancel("a") and not wheel.cancel("a")
+    assert not wheel.schedule("far", 11.0)
+    assert wheel.horizon == 10.0
+
+    assert wheel.advance(8.0) == []
+    assert wheel.schedule("far", 11.0)  # горизонт сдвинулся вместе с колесом
+    assert wheel.advance(100.0) == [("far", 11.0)]
@@ -0,0 +1,201 @@
+"""Assistant run engine: streaming first, adaptive polling as a fallback.
+
+The module only depends on the OpenAI SDK. This file is the source;
+bot/assistant_runs.py is an identical copy for the standalone bot image
+(``make sync-bot``), tests/test_assistant_runs.py checks they match.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+OnDelta = Callable[[str], Awaitable[None]]
+
+TERMINAL_STATUSES = {"completed", "failed", "cancelled", "expired", "incomplete"}
+ACTIVE_STATUSES = {"queued", "in_progress", "requires_action"}
+_TERMINAL_EVENTS = {f"thread.run.{status}" for status in TERMINAL_STATUSES}
+
+POLL_INITIAL_DELAY = 0.2
+POLL_MAX_DELAY = 2.0
+POLL_BACKOFF = 1.5
+
+# Ссылки на фоновые отмены, чтобы задачи не собрал GC
+_background: set[asyncio.Task] = set()
+
+
+@dataclass
+class RunResult:
+    # completed | failed | cancelled | expired | incomplete | requires_action | timeout
+    status: str
+    text: Optional[str] = None
+    run_id: Optional[str] = None
+
+
+def _message_text(message: Any) -> str:
+    parts = []
+    for part in message.content or []:
+        if getattr(part, "text", None) and part.text.value:
+            parts.append(part.text.value)
+    return "\n".join(parts)
+
+
+async def _cancel_quietly(client: AsyncOpenAI, thread_id: str, run_id: str) -> None:
+    try:
+        await client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+    except Exception as exc:  # pragma: no cover - run may be finished already
+        logger.info("Run cancel skipped: %s", exc)
+
+
+async def fetch_run_text(client: AsyncOpenAI, thread_id: str, run_id: str) -> str:
+    """Return the text of the assistant messages produced by exactly this run."""
+    messages = await client.beta.threads.messages.list(
+        thread_id=thread_id, run_id=run_id, order="asc"
+    )
+    texts = [_message_text(m) for m in messages.data if m.role == "assistant"]
+    return "\n".join(t for t in texts if t)
+
+
+async def _active_run_id(client: AsyncOpenAI, thread_id: str) -> Optional[str]:
+    """Id of the latest run on the thread if it is still active."""
+    try:
+        runs = await client.beta.threads.runs.list(thread_id=thread_id, limit=1)
+    except Exception as exc:  # pragma: no cover - fall back to a new run
+        logger.info("Active run lookup failed: %s", exc)
+        return None
+    for run in runs.data:
+        if run.status in ACTIVE_STATUSES:
+            return run.id
+    return None
+
+
+class _RunState:
+    def __init__(self) -> None:
+        self.run_id: Optional[str] = None
+        self.texts: list[str] = []
+
+
+async def _stream_run(
+    client: AsyncOpenAI,
+    thread_id: str,
+    assistant_id: str,
+    state: _RunState,
+    on_delta: Optional[OnDelta],
+) -> RunResult:
+    async with client.beta.threads.runs.stream(
+        thread_id=thread_id, assistant_id=assistant_id
+    ) as stream:
+        async for event in stream:
+            kind = event.event
+            if kind == "thread.run.created":
+                state.run_id = event.data.id
+            elif kind == "thread.message.delta" and on_delta is not None:
+                for part in event.data.delta.content or []:
+                    value = getattr(getattr(part, "text", None), "value", None)
+                    if value:
+                        await on_delta(value)
+            elif kind == "thread.message.completed":
+                text = _message_text(event.data)
+                if text:
+                    state.texts.append(text)
+            elif kind == "thread.run.requires_action":
+                await _cancel_quietly(client, thread_id, event.data.id)
+                return RunResult("requires_action", run_id=event.data.id)
+            elif kind in _TERMINAL_EVENTS:
+                return RunResult(
+                    event.data.status,
+                    text="\n".join(state.texts) or None,
+                    run_id=event.data.id,
+                )
+    raise RuntimeError("assistant stream ended without a terminal run event")
+
+
+async def _poll_run(
+    client: AsyncOpenAI,
+    thread_id: str,
+    assistant_id: str,
+    state: _RunState,
+    deadline: float,
+) -> RunResult:
+    loop = asyncio.get_running_loop()
+    if state.run_id is None:
+        run = await client.beta.threads.runs.create(
+            thread_id=thread_id, assistant_id=assistant_id
+        )
+        state.run_id = run.id
+
+    delay = POLL_INITIAL_DELAY
+    while True:
+        run = await client.beta.threads.runs.retrieve(
+            thread_id=thread_id, run_id=state.run_id
+        )
+        if run.status == "completed":
+            text = await fetch_run_text(client, thread_id, run.id)
+            return RunResult("completed", text=text or None, run_id=run.id)
+        if run.status in TERMINAL_STATUSES:
+            return RunResult(run.status, run_id=run.id)
+        if run.status == "requires_action":
+            await _cancel_quietly(client, thread_id, run.id)
+            return RunResult("requires_action", run_id=run.id)
+
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            await _cancel_quietly(client, thread_id, run.id)
+            return RunResult("timeout", run_id=run.id)
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * POLL_BACKOFF, POLL_MAX_DELAY)
+
+
+async def run_assistant(
+    client: AsyncOpenAI,
+    thread_id: str,
+    assistant_id: str,
+    *,
+    timeout: float,
+    on_delta: Optional[OnDelta] = None,
+    stream: bool = True,
+) -> RunResult:
+    """Run the assistant on a thread and return the reply produced by that run.
+
+    Streams the run when possible and falls back to polling with adaptive
+    backoff if the stream breaks. A cancelled or timed-out caller cancels the
+    OpenAI run so the thread is free for the next message.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    state = _RunState()
+
+    try:
+        if stream:
+            try:
+                async with asyncio.timeout(timeout):
+                    return await _stream_run(
+                        client, thread_id, assistant_id, state, on_delta
+                    )
+            except TimeoutError:
+                if state.run_id:
+                    await _cancel_quietly(client, thread_id, state.run_id)
+                return RunResult("timeout", run_id=state.run_id)
+            except Exception as exc:
+                logger.warning(
+                    "Assistant stream failed, falling back to polling: %s",
+                    exc,
+                    extra={"thread_id": thread_id, "run_id": state.run_id},
+                )
+                if state.run_id is None:
+                    # Поток мог оборваться после создания run, но до события
+                    # thread.run.created: второй run на треде не запускаем
+                    state.run_id = await _active_run_id(client, thread_id)
+        return await _poll_run(client, thread_id, assistant_id, state, deadline)
+    except asyncio.CancelledError:
+        if state.run_id:
+            task = asyncio.ensure_future(
+                _cancel_quietly(client, thread_id, state.run_id)
+            )
+            _background.add(task)
+            task.add_done_callback(_background.discard)
+        raise
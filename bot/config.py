@@ -16,6 +16,7 @@ class Settings(BaseSettings):
     openai_api_key: str = Field(..., alias="OPENAI_API_KEY")
     hr_agent_id: str = Field(..., alias="HR_AGENT_ID")
     backend_url: str = Field(..., alias="BACKEND_URL")
+    assistant_run_timeout: float = Field(default=60.0, alias="ASSISTANT_RUN_TIMEOUT")
     app_env: str = Field(default="local", alias="APP_ENV")
     log_level: str = Field(default="INFO", alias="LOG_LEVEL")
     app_version: str | None = Field(default=None, alias="APP_VERSION")
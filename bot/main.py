@@ -2,12 +2,12 @@ import asyncio
 import logging
 from typing import Dict
 
-import httpx
 from aiogram import Bot, Dispatcher
 from aiogram.filters import CommandStart
 from aiogram.types import Message
 from openai import AsyncOpenAI
 
+from assistant_runs import run_assistant
 from config import settings
 
 logging.basicConfig(level=getattr(logging, settings.log_level.upper(), logging.INFO))
@@ -35,10 +35,9 @@ async def handle_message(message: Message):
     await message.answer(reply)
 
 
-async def send_startup_notify() -> None:
-    token = settings.telegram_token
+async def send_startup_notify(bot: Bot) -> None:
     chat_id = settings.telegram_admin_chat_id
-    if not token or not chat_id:
+    if not chat_id:
         logger.info("Startup notify skipped: TELEGRAM_ADMIN_CHAT_ID not set")
         return
 
@@ -51,11 +50,8 @@ async def send_startup_notify() -> None:
     )
 
     try:
-        async with httpx.AsyncClient(timeout=10) as client_http:
-            await client_http.post(
-                f"https://api.telegram.org/bot{token}/sendMessage",
-                json={"chat_id": chat_id, "text": text},
-            )
+        # Через сессию aiogram: то же пуловое соединение, что и у polling
+        await bot.send_message(chat_id, text)
     except Exception as exc:  # pragma: no cover - notification failure should not crash
         logger.warning("Bot startup notify failed: %s", exc)
 
@@ -68,14 +64,11 @@ async def main():
         )
         await asyncio.Event().wait()
 
-    await send_startup_notify()
     bot_instance = Bot(token=settings.telegram_token)
+    await send_startup_notify(bot_instance)
     await dp.start_polling(bot_instance)
 
 
-if __name__ == "__main__":
-    asyncio.run(main())
-
 # In-memory mapping user -> OpenAI thread id
 user_threads: Dict[int, str] = {}
 
@@ -98,31 +91,17 @@ async def send_to_agent(user_id: int, text: str) -> str:
         content=text,
     )
 
-    run = await client.beta.threads.runs.create(
-        thread_id=thread_id,
-        assistant_id=settings.hr_agent_id,
+    result = await run_assistant(
+        client,
+        thread_id,
+        settings.hr_agent_id,
+        timeout=settings.assistant_run_timeout,
     )
 
-    while True:
-        run = await client.beta.threads.runs.retrieve(
-            thread_id=thread_id, run_id=run.id
-        )
-        if run.status in {"completed", "failed", "cancelled", "expired"}:
-            break
-        await asyncio.sleep(0.5)
-
-    if run.status != "completed":
+    if result.status != "completed":
         return "⚠️ Не удалось получить ответ от агента. Попробуйте позже."
+    return result.text or "⚠️ Агент не вернул текст ответа."
 
-    messages = await client.beta.threads.messages.list(
-        thread_id=thread_id, order="desc", limit=5
-    )
-    for msg in messages.data:
-        if msg.role == "assistant" and msg.content:
-            parts = []
-            for part in msg.content:
-                if hasattr(part, "text") and part.text:
-                    parts.append(part.text.value)
-            if parts:
-                return "\n".join(parts)
-    return "⚠️ Агент не вернул текст ответа."
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Benchmark CRM tool latency: providers one after another vs. fan-out.
+
+Each provider is a local stub (app.integrations.stub_server) with its own
+delay, mounted in-process, so only the call pattern is measured.
+
+Usage:
+    PYTHONPATH=backend python scripts/bench_integrations.py [calls] [delays]
+
+``delays`` is a comma-separated list of per-provider delays in seconds
+(default ``0.05,0.08,0.12``).
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+import httpx
+from app.integrations.base import ProviderClient, fan_out
+from app.integrations.stub_server import create_stub_app
+
+
+def make_providers(delays: list[float]) -> list[ProviderClient]:
+    return [
+        ProviderClient(
+            f"stub{n}",
+            base_url="http://stub",
+            timeout=5.0,
+            transport=httpx.ASGITransport(app=create_stub_app(delay=delay)),
+        )
+        for n, delay in enumerate(delays)
+    ]
+
+
+def note(provider: ProviderClient, n: int):
+    return provider.call("attach_note", f"/leads/{n}/notes", {"text": "bench"}, {})
+
+
+async def sequential(providers: list[ProviderClient], n: int) -> None:
+    for provider in providers:
+        await note(provider, n)
+
+
+async def concurrent(providers: list[ProviderClient], n: int) -> None:
+    await fan_out("attach_note", [(p, note(p, n)) for p in providers])
+
+
+async def measure(name: str, path, providers: list[ProviderClient], calls: int):
+    timings = []
+    for n in range(calls):
+        started = time.perf_counter()
+        await path(providers, n)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    p95 = timings[max(int(len(timings) * 0.95) - 1, 0)]
+    print(
+        f"{name:>10}: mean {statistics.mean(timings):.1f} ms, "
+        f"p50 {statistics.median(timings):.1f} ms, p95 {p95:.1f} ms"
+    )
+
+
+async def main() -> None:
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    delays = [
+        float(d)
+        for d in (sys.argv[2] if len(sys.argv) > 2 else "0.05,0.08,0.12").split(",")
+    ]
+    providers = make_providers(delays)
+    try:
+        await measure("sequential", sequential, providers, calls)
+        await measure("fan-out", concurrent, providers, calls)
+    finally:
+        for provider in providers:
+            await provider.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Benchmark per-update DB time of the Telegram webhook.
+
+Compares the old pipeline (dedupe insert, then two thread lookups, each in
+its own transaction) with the combined dedupe + thread lookup statement.
+
+Usage:
+    DATABASE_URL=postgresql+asyncpg://... PYTHONPATH=backend \\
+        python scripts/bench_update_db.py [updates]
+
+Writes into processed_updates/telegram_users and cleans up after itself.
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from app.core.db import SessionLocal, engine, ensure_telegram_tables
+from app.tools.telegram_webhook import _MARK_AND_LOOKUP_SQL
+from sqlalchemy import text
+
+BASE_UPDATE_ID = 9_000_000_000
+CHAT_ID = -9_000_000_001
+
+MARK_SQL = text("""
+    INSERT INTO processed_updates (update_id)
+    VALUES (:uid)
+    ON CONFLICT DO NOTHING
+    RETURNING update_id
+    """)
+LOOKUP_SQL = text("SELECT thread_id FROM telegram_users WHERE chat_id = :cid")
+
+
+async def old_path(update_id: int) -> None:
+    async with SessionLocal() as session, session.begin():
+        await session.execute(MARK_SQL, {"uid": update_id})
+    for _ in range(2):
+        async with SessionLocal() as session:
+            await session.execute(LOOKUP_SQL, {"cid": CHAT_ID})
+
+
+async def new_path(update_id: int) -> None:
+    async with SessionLocal() as session, session.begin():
+        await session.execute(_MARK_AND_LOOKUP_SQL, {"uid": update_id, "cid": CHAT_ID})
+
+
+async def measure(name: str, path, offset: int, updates: int) -> None:
+    timings = []
+    for n in range(updates):
+        started = time.perf_counter()
+        await path(BASE_UPDATE_ID + offset + n)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(
+        f"{name:>4}: mean {statistics.mean(timings):.2f} ms, "
+        f"p50 {statistics.median(timings):.2f} ms, p95 {p95:.2f} ms"
+    )
+
+
+async def cleanup() -> None:
+    async with SessionLocal() as session, session.begin():
+        await session.execute(
+            text("DELETE FROM processed_updates WHERE update_id >= :uid"),
+            {"uid": BASE_UPDATE_ID},
+        )
+        await session.execute(
+            text("DELETE FROM telegram_users WHERE chat_id = :cid"), {"cid": CHAT_ID}
+        )
+
+
+async def main() -> None:
+    updates = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    await ensure_telegram_tables()
+    await cleanup()
+    async with SessionLocal() as session, session.begin():
+        await session.execute(
+            text(
+                "INSERT INTO telegram_users (chat_id, thread_id) "
+                "VALUES (:cid, 'bench')"
+            ),
+            {"cid": CHAT_ID},
+        )
+    try:
+        # Прогрев пула соединений
+        await new_path(BASE_UPDATE_ID - 1)
+        await measure("old", old_path, 0, updates)
+        await measure("new", new_path, updates, updates)
+    finally:
+        await cleanup()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())